@@ -0,0 +1,62 @@
+# benchmarks/batch_search_benchmark.py
+# Амортизированная задержка на запрос: N вызовов search_similar, один search_similar_batch (UNION ALL)
+# и вариант с ARRAY JOIN по массиву векторов и LIMIT BY.
+# Нужен запущенный ClickHouse (см. README); синтетический корпус генерируется на стороне сервера.
+# Запуск: python -m benchmarks.batch_search_benchmark
+import time
+
+import numpy as np
+
+from benchmarks.vector_index_benchmark import fill_corpus
+from src.clickhouse_service import ClickHouseVectorStore
+
+CORPUS_SIZE = 100_000
+EMBEDDING_DIM = 256
+BATCH_SIZES = (1, 10, 100)
+TOP_K = 3
+REPEATS = 3
+
+
+def search_array_join(store: ClickHouseVectorStore, query_embeddings: list, limit: int) -> list:
+    """Альтернатива UNION ALL: векторы разворачиваются ARRAY JOIN, limit лучших на вектор — LIMIT BY."""
+    return store.client.query("""
+        WITH {queries:Array(Array(Float32))} AS queries
+        SELECT query_index, chunk_id, cosineDistance(embedding, queries[query_index]) AS dist
+        FROM {table:Identifier}
+        ARRAY JOIN arrayEnumerate(queries) AS query_index
+        ORDER BY query_index, dist ASC
+        LIMIT {limit:UInt32} BY query_index
+    """, parameters={"queries": query_embeddings, "table": store.table_name, "limit": limit}).result_rows
+
+
+def best_time(run) -> float:
+    """Лучшее время из REPEATS прогонов, секунды."""
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+if __name__ == "__main__":
+    store = ClickHouseVectorStore(table_name=f"bench_batch_{CORPUS_SIZE}", embedding_dim=EMBEDDING_DIM)
+    store.create_table()
+    fill_corpus(store, CORPUS_SIZE)
+
+    rng = np.random.default_rng(0)
+    queries = [rng.standard_normal(EMBEDDING_DIM).tolist() for _ in range(max(BATCH_SIZES))]
+
+    # Прогрев соединения
+    store.search_similar(queries[0], limit=TOP_K, exact=True)
+
+    print(f"⏱️ Корпус {CORPUS_SIZE} векторов, размерность {EMBEDDING_DIM}, top-{TOP_K}, точный поиск\n")
+    print(f"{'N':>5} | {'по одному':>10} | {'UNION ALL':>10} | {'ARRAY JOIN':>10} | мс на запрос")
+    for n in BATCH_SIZES:
+        batch = queries[:n]
+        single = best_time(lambda: [store.search_similar(q, limit=TOP_K, exact=True) for q in batch])
+        batched = best_time(lambda: store.search_similar_batch(batch, limit=TOP_K, exact=True))
+        array_join = best_time(lambda: search_array_join(store, batch, TOP_K))
+        print(f"{n:>5} | {single / n * 1000:>10.2f} | {batched / n * 1000:>10.2f} | {array_join / n * 1000:>10.2f} |")
+
+    store.client.command(f"DROP TABLE IF EXISTS {store.table_name}")
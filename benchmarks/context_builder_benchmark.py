@@ -0,0 +1,68 @@
+# benchmarks/context_builder_benchmark.py
+# Токены контекста промпта на запрос: прежний format_context (все чанки целиком) против ContextBuilder
+# с разными бюджетами, на размеченных запросах к задачам из tasks/. В корпус добавлены клоны задач
+# (копия с другим номером и припиской) — так в выдаче появляются почти одинаковые фрагменты.
+# Запуск: python -m benchmarks.context_builder_benchmark
+import statistics
+import time
+
+from benchmarks.hybrid_search_benchmark import LABELLED_QUERIES
+from benchmarks.stubs import StubEmbeddingService, StubVectorStore
+from src.context_builder import ContextBuilder, estimate_tokens
+from src.rag_service import RAGService
+from src.task_loader import iter_markdown_tasks
+
+TOP_K = 6
+BUDGETS = (2000, 1000, 500)
+CLONE_OFFSET = 1_000_000
+
+
+def corpus_with_clones() -> list:
+    """Задачи из tasks/ и их клоны: тот же текст с припиской, как у скопированных в трекере задач."""
+    tasks = list(iter_markdown_tasks("tasks"))
+    clones = [
+        {**task, "id": task["id"] + CLONE_OFFSET, "search": task["search"] + "\n\nКлон задачи для второго релиза."}
+        for task in tasks
+    ]
+    return tasks + clones
+
+
+def legacy_context(relevant_docs: list) -> str:
+    return "\n\n".join([doc["text"] for doc in relevant_docs])
+
+
+if __name__ == "__main__":
+    embedding_service = StubEmbeddingService()
+    rag_service = RAGService(embedding_service=embedding_service, vector_store=StubVectorStore(),
+                             collapse="none", search_mode="hybrid")
+    rag_service.vector_store.add_documents([
+        {**chunk, "embedding": embedding_service.embed_text(chunk["text"])}
+        for chunk in rag_service.iter_chunks(corpus_with_clones())
+    ])
+    results = [rag_service.search_relevant_documents(query, top_k=TOP_K) for query, _ in LABELLED_QUERIES]
+
+    legacy_tokens = [estimate_tokens(legacy_context(docs)) for docs in results]
+    print(f"⏱️ {len(results)} запросов, top-{TOP_K} чанков, корпус с клонами задач\n")
+    print(f"{'Контекст':<26} | {'токенов, среднее':>16} | {'макс':>5} | {'дубликатов':>10} | {'мкс на сборку':>13}")
+    print(f"{'все чанки целиком':<26} | {statistics.mean(legacy_tokens):>16.0f} | {max(legacy_tokens):>5} | {'':>10} |")
+
+    for budget in BUDGETS:
+        builder = ContextBuilder(max_tokens=budget)
+        builder.build(results[0])  # прогрев кэша оценки токенов
+        tokens, duplicates, times = [], 0, []
+        for docs in results:
+            start = time.perf_counter()
+            context, stats = builder.build(docs)
+            times.append((time.perf_counter() - start) * 1_000_000)
+            tokens.append(estimate_tokens(context))
+            duplicates += stats["duplicates"]
+        print(f"{'ContextBuilder, ' + str(budget):<26} | {statistics.mean(tokens):>16.0f} | {max(tokens):>5} | "
+              f"{duplicates:>10} | {statistics.median(times):>13.0f}")
+
+    estimate_tokens.cache_clear()
+    builder = ContextBuilder(max_tokens=BUDGETS[0])
+    start = time.perf_counter()
+    for docs in results:
+        builder.build(docs)
+    cold = (time.perf_counter() - start) / len(results) * 1_000_000
+    print(f"\nСборка без кэша оценки токенов: {cold:.0f} мкс на запрос")
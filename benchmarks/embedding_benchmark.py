@@ -0,0 +1,119 @@
+# benchmarks/embedding_benchmark.py
+# Пропускная способность векторизации (чанков/с): по одному чанку против embed_texts.
+# Yandex Cloud ML заменён локальным HTTP-сервером с задержкой и периодическими ответами 429.
+# Запуск: python -m benchmarks.embedding_benchmark
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from benchmarks.stubs import stub_embedding
+from src.embedding_service import YandexEmbeddingService
+
+CHUNKS = 200
+SERVER_LATENCY = 0.05  # время ответа модели, секунды
+RATE_LIMIT_EVERY = 25  # каждый N-й запрос получает 429
+
+
+class StubEmbeddingServer:
+    """Локальный сервер эмбеддингов: задержка ответа и 429 на каждый RATE_LIMIT_EVERY-й запрос."""
+
+    def __init__(self):
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def serve(self) -> ThreadingHTTPServer:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                text = self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8")
+                with stub.lock:
+                    stub.requests += 1
+                    rate_limited = stub.requests % RATE_LIMIT_EVERY == 0
+
+                time.sleep(SERVER_LATENCY)
+                if rate_limited:
+                    self.send_response(429)
+                    self.end_headers()
+                    return
+
+                body = json.dumps({"embedding": stub_embedding(text)}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+class HTTPEmbeddingModel:
+    """Модель с интерфейсом SDK (run(text).embedding), обращающаяся к локальному серверу."""
+
+    class Result:
+        def __init__(self, embedding):
+            self.embedding = embedding
+
+    def __init__(self, url: str):
+        self.url = url
+        self.local = threading.local()
+
+    def run(self, text: str):
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = self.local.session = requests.Session()
+        response = session.post(self.url, data=text.encode("utf-8"))
+        response.raise_for_status()
+        return self.Result(response.json()["embedding"])
+
+
+def make_service(url: str, max_workers: int) -> YandexEmbeddingService:
+    service = YandexEmbeddingService(folder_id="benchmark", iam_token="benchmark",
+                                     max_workers=max_workers, retry_backoff=0.05, use_cache=False)
+    service.doc_model = HTTPEmbeddingModel(url)
+    return service
+
+
+def sequential(service: YandexEmbeddingService, texts: list) -> list:
+    """Прежний prepare_documents: embed_text по одному чанку (повтор при 429 — вручную)."""
+    embeddings = []
+    for text in texts:
+        while True:
+            try:
+                embeddings.append(service.embed_text(text))
+                break
+            except requests.HTTPError:
+                time.sleep(0.05)
+    return embeddings
+
+
+def run_case(name: str, embed, *args):
+    server = StubEmbeddingServer().serve()
+    url = f"http://127.0.0.1:{server.server_address[1]}/embed"
+    texts = [f"Чанк задачи номер {i}" for i in range(CHUNKS)]
+    try:
+        start = time.perf_counter()
+        embeddings = embed(url, texts, *args)
+        elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+
+    assert embeddings == [stub_embedding(text) for text in texts], "нарушен порядок эмбеддингов"
+    print(f"{name:<26} {elapsed:7.2f} с   {CHUNKS / elapsed:8.1f} чанков/с")
+
+
+if __name__ == "__main__":
+    print(f"⏱️ {CHUNKS} чанков, задержка сервера {SERVER_LATENCY * 1000:.0f} мс, "
+          f"каждый {RATE_LIMIT_EVERY}-й запрос — 429\n")
+    run_case("По одному (embed_text)", lambda url, texts: sequential(make_service(url, 1), texts))
+    for workers in (4, 8, 16):
+        run_case(f"embed_texts x{workers}", lambda url, texts, w: make_service(url, w).embed_texts(texts), workers)
@@ -0,0 +1,78 @@
+# benchmarks/embedding_cache_benchmark.py
+# Сколько обращений к API эмбеддингов экономит кэш на воспроизведённом журнале запросов.
+# Запуск: python -m benchmarks.embedding_cache_benchmark
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.stubs import stub_embedding, load_task_documents
+from src.cache_service import DiskLRUCache
+from src.embedding_service import YandexEmbeddingService
+
+LOG_SIZE = 1000
+DISTINCT_QUERIES = 150
+ZIPF_EXPONENT = 1.3
+
+
+class CountingModel:
+    """Модель с интерфейсом SDK без сети (обращения считает сам сервис в api_calls)."""
+
+    class Result:
+        def __init__(self, embedding):
+            self.embedding = embedding
+
+    def __init__(self, uri: str):
+        self.uri = uri
+
+    def run(self, text: str):
+        return self.Result(stub_embedding(text))
+
+
+def make_service(cache: DiskLRUCache = None) -> YandexEmbeddingService:
+    service = YandexEmbeddingService(folder_id="benchmark", iam_token="benchmark",
+                                     cache=cache, use_cache=cache is not None)
+    service.doc_model = CountingModel("emb://benchmark/text-search-doc/latest")
+    service.query_model = CountingModel("emb://benchmark/text-search-query/latest")
+    return service
+
+
+def query_log() -> list:
+    """Журнал вопросов: популярные вопросы повторяются (распределение Ципфа)."""
+    rng = np.random.default_rng(7)
+    ranks = np.minimum(rng.zipf(ZIPF_EXPONENT, LOG_SIZE), DISTINCT_QUERIES)
+    return [f"Вопрос пользователя номер {rank}" for rank in ranks]
+
+
+def replay(service: YandexEmbeddingService, queries: list, chunks: list):
+    """Переиндексация корпуса, ответы на вопросы журнала и оценка покрытия по найденным чанкам."""
+    service.embed_texts(chunks)
+    for i, query in enumerate(queries):
+        service.embed_query(query)
+        service.embed_text(chunks[i % len(chunks)])
+
+
+if __name__ == "__main__":
+    chunks = [doc["text"] for doc in load_task_documents()]
+    queries = query_log()
+    print(f"⏱️ Журнал: {len(queries)} вопросов ({len(set(queries))} различных), корпус: {len(chunks)} чанков\n")
+
+    service = make_service()
+    replay(service, queries, chunks)
+    print(f"Без кэша:                    {service.api_calls:6d} обращений к API")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "embeddings.sqlite"
+
+        service = make_service(DiskLRUCache(str(path), memory_entries=100))
+        replay(service, queries, chunks)
+        stats = service.cache.stats()
+        print(f"С кэшем:                     {service.api_calls:6d} обращений к API   "
+              f"hit ratio={stats['hit_ratio']:.2f} (память {stats['memory_hits']}, диск {stats['disk_hits']})")
+
+        # Перезапуск процесса: память пуста, записи читаются с диска
+        service = make_service(DiskLRUCache(str(path), memory_entries=100))
+        replay(service, queries, chunks)
+        stats = service.cache.stats()
+        print(f"С кэшем после перезапуска:   {service.api_calls:6d} обращений к API   "
+              f"hit ratio={stats['hit_ratio']:.2f} (память {stats['memory_hits']}, диск {stats['disk_hits']})")
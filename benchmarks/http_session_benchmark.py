@@ -0,0 +1,151 @@
+# benchmarks/http_session_benchmark.py
+# Задержка одного вызова: голый requests.post (новое соединение на каждый запрос) против общего HTTPClient
+# (пул keep-alive соединений), по HTTP и по HTTPS. Отдельно — доля ошибок при периодических ответах 503.
+# OCR и Bot API заменены локальным сервером; для HTTPS нужен openssl (самоподписанный сертификат).
+# Запуск: python -m benchmarks.http_session_benchmark
+import json
+import shutil
+import ssl
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+
+from src.http_service import HTTPClient
+
+CALLS = 200
+SERVER_LATENCY = 0.002  # время обработки запроса сервером, секунды
+UNAVAILABLE_EVERY = 10  # в сценарии с ошибками каждый N-й запрос получает 503
+PAYLOAD = {"mimeType": "image", "languageCodes": ["ru", "en"], "content": "A" * 20_000}
+
+
+class StubServer:
+    """Локальный сервер OCR: JSON-ответ после небольшой задержки, HTTP/1.1 с keep-alive."""
+
+    def __init__(self, unavailable_every: int = 0):
+        self.unavailable_every = unavailable_every
+        self.requests = 0
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    def serve(self, certfile: str = None) -> ThreadingHTTPServer:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Заголовки и тело уходят разными пакетами: без TCP_NODELAY keep-alive упирается в delayed ACK (~40 мс)
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with stub.lock:
+                    stub.connections += 1
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                with stub.lock:
+                    stub.requests += 1
+                    unavailable = stub.unavailable_every and stub.requests % stub.unavailable_every == 0
+
+                time.sleep(SERVER_LATENCY)
+                if unavailable:
+                    self.send_response(503)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                body = json.dumps({"result": {"textAnnotation": {"blocks": []}}}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        server.daemon_threads = True
+        if certfile:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile)
+            server.socket = context.wrap_socket(server.socket, server_side=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+def self_signed_cert(directory: str):
+    """Самоподписанный сертификат для 127.0.0.1 (ключ и сертификат в одном PEM-файле) или None без openssl."""
+    if shutil.which("openssl") is None:
+        return None
+    key, cert = Path(directory) / "key.pem", Path(directory) / "cert.pem"
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=127.0.0.1",
+         "-addext", "subjectAltName=IP:127.0.0.1", "-keyout", str(key), "-out", str(cert)],
+        check=True, capture_output=True,
+    )
+    bundle = Path(directory) / "bundle.pem"
+    bundle.write_text(key.read_text() + cert.read_text())
+    return str(bundle), str(cert)
+
+
+def bare_post(url: str, verify) -> int:
+    """Прежний OCRService: requests.post без сессии и таймаута."""
+    return requests.post(url, json=PAYLOAD, verify=verify).status_code
+
+
+def measure(call, url: str) -> tuple:
+    latencies, failures = [], 0
+    for _ in range(CALLS):
+        start = time.perf_counter()
+        failures += call(url) != 200
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies, failures
+
+
+def report(name: str, stub: StubServer, latencies: list, failures: int):
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"  {name:<22} p50={statistics.median(latencies):6.2f} мс   p95={p95:6.2f} мс   "
+          f"соединений: {stub.connections:>3}   ошибок: {failures}")
+
+
+def run_case(name: str, scheme: str, certfile: str = None, verify=True, unavailable_every: int = 0):
+    print(f"\n🔌 {name}")
+    for client_name in ("requests.post", "HTTPClient (пул)"):
+        stub = StubServer(unavailable_every)
+        server = stub.serve(certfile)
+        url = f"{scheme}://127.0.0.1:{server.server_address[1]}/ocr/v1/recognizeText"
+        client = None
+        try:
+            if client_name == "requests.post":
+                call = lambda u: bare_post(u, verify)
+            else:
+                client = HTTPClient(retry_backoff=0.01, max_retry_backoff=0.05)
+                call = lambda u: client.post(u, json=PAYLOAD, verify=verify).status_code
+            latencies, failures = measure(call, url)
+        finally:
+            if client is not None:
+                client.close()
+            server.shutdown()
+        report(client_name, stub, latencies, failures)
+
+
+if __name__ == "__main__":
+    print(f"⏱️ {CALLS} последовательных вызовов, задержка сервера {SERVER_LATENCY * 1000:.0f} мс, "
+          f"тело запроса {len(PAYLOAD['content']) // 1000} КБ")
+    run_case("HTTP", "http")
+
+    with tempfile.TemporaryDirectory() as directory:
+        cert = self_signed_cert(directory)
+        if cert is None:
+            print("\n⚠️ openssl не найден, сценарий HTTPS пропущен")
+        else:
+            run_case("HTTPS (TLS-рукопожатие на каждом новом соединении)", "https", certfile=cert[0], verify=cert[1])
+
+    run_case(f"HTTP, каждый {UNAVAILABLE_EVERY}-й ответ — 503", "http", unavailable_every=UNAVAILABLE_EVERY)
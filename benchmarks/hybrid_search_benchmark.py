@@ -0,0 +1,80 @@
+# benchmarks/hybrid_search_benchmark.py
+# Recall@k и задержка: векторный поиск против гибридного (вектор + hasToken, слияние RRF) на размеченных запросах.
+# Нужен запущенный ClickHouse с заполненной таблицей (rag_create.py) и доступ к Yandex Cloud (эмбеддинги запросов).
+# Запуск: python -m benchmarks.hybrid_search_benchmark
+import statistics
+import time
+
+from src.clickhouse_service import ClickHouseVectorStore
+from src.embedding_service import YandexEmbeddingService
+
+TOP_K = (1, 3)
+REPEATS = 5
+
+# Размеченные запросы: текст → задача, которая должна быть найдена
+LABELLED_QUERIES = [
+    # Номера задач и идентификаторы
+    ("196677", 196677),
+    ("что по задаче 187834", 187834),
+    ("задача 151543", 151543),
+    ("166213 оценка", 166213),
+    ("пользователь ID 2321", 196677),
+    ("ид 1518", 184464),
+    # Названия полей, статусов и разделов
+    ("Модератор мероприятий внешний", 190897),
+    ("поле Дата окончания активности", 151543),
+    ("Трекшн-карты по всем командам", 181744),
+    ("статус Отклонена", 196677),
+    ("Выберете, от кого подать заявку", 184464),
+    ("Чек-бокс Добавить видеозапись", 187834),
+    ("Программа Преакселератора", 181744),
+    ("Мои заявки и колокольчик", 196677),
+    ("формат xls", 166213),
+    ("ООО Ромашка", 184464),
+    # Вопросы своими словами
+    ("Как выгрузить отчёты в excel вместо веб-страницы?", 166213),
+    ("Где посмотреть список акселераторов?", 151543),
+    ("Почему пользователю не приходят уведомления о смене статуса заявки?", 196677),
+    ("Какие права у менеджера акселератора партнёра?", 181744),
+    ("Как ограничить выбор внешних модераторов?", 190897),
+    ("Сотрудник не может подать заявку от второго бизнеса", 184464),
+    ("Как прикрепить запись трансляции к мероприятию?", 187834),
+    ("Кнопка Акселерация в бизнес-компетенциях", 151543),
+]
+
+
+def vector_search(store: ClickHouseVectorStore, query: str, query_embedding: list, limit: int) -> list:
+    return store.search_similar(query_embedding, limit=limit, collapse="best")
+
+
+def hybrid_search(store: ClickHouseVectorStore, query: str, query_embedding: list, limit: int) -> list:
+    return store.search_hybrid(query_embedding, query, limit=limit, collapse="best")
+
+
+def measure(store: ClickHouseVectorStore, search, query_embeddings: list, limit: int) -> tuple:
+    hits, latencies = 0, []
+    for (query, task_id), query_embedding in zip(LABELLED_QUERIES, query_embeddings):
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            found = search(store, query, query_embedding, limit)
+            latencies.append((time.perf_counter() - start) * 1000)
+        hits += task_id in {doc["task_id"] for doc in found}
+    return hits / len(LABELLED_QUERIES), latencies
+
+
+if __name__ == "__main__":
+    store = ClickHouseVectorStore()
+    query_embeddings = YandexEmbeddingService().embed_texts([query for query, _ in LABELLED_QUERIES], query=True)
+
+    # Прогрев соединения
+    vector_search(store, "", query_embeddings[0], 1)
+
+    print(f"⏱️ {len(LABELLED_QUERIES)} размеченных запросов к {store.table_name}, по {REPEATS} повторов\n")
+    for limit in TOP_K:
+        for name, search in (("Векторный", vector_search), ("Гибридный (RRF)", hybrid_search)):
+            recall, latencies = measure(store, search, query_embeddings, limit)
+            latencies.sort()
+            p95 = latencies[int(len(latencies) * 0.95) - 1]
+            print(f"{name:<16} recall@{limit}={recall:.2f}   "
+                  f"p50={statistics.median(latencies):6.1f} мс   p95={p95:6.1f} мс")
+        print()
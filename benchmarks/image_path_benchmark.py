@@ -0,0 +1,119 @@
+# benchmarks/image_path_benchmark.py
+# Память и CPU на пути изображения от скачивания до запроса к OCR и сборка текста ответа:
+# прежний путь (base64-строка в состоянии графа, data URL, split, json.dumps, text +=) против байтов
+# с однократным кодированием при отправке и сборки текста через join.
+# Предобработка и сеть исключены: изображение — случайные байты, OCR — готовый ответ в памяти.
+# Запуск: python -m benchmarks.image_path_benchmark
+import base64
+import json
+import os
+import time
+import tracemalloc
+
+from benchmarks.ocr_preprocessing_benchmark import PassThroughPreprocessor
+from src.ocr_service import OCRService
+
+IMAGE_SIZES_MB = (2, 5, 10)
+WORD_COUNTS = (1_000, 10_000, 50_000)
+WORDS_PER_LINE = 10
+LINES_PER_BLOCK = 20
+REPEATS = 5
+
+
+def ocr_response(words: int) -> dict:
+    """Ответ OCR с заданным числом слов, разбитых на строки и блоки."""
+    lines = [
+        {"words": [{"text": f"слово{i + j}"} for j in range(min(WORDS_PER_LINE, words - i))]}
+        for i in range(0, words, WORDS_PER_LINE)
+    ]
+    blocks = [{"lines": lines[i:i + LINES_PER_BLOCK]} for i in range(0, len(lines), LINES_PER_BLOCK)]
+    return {"result": {"textAnnotation": {"blocks": blocks}}}
+
+
+class FakeResponse:
+    def __init__(self, result: dict):
+        self.result = result
+
+    def raise_for_status(self):
+        pass
+
+    def json(self) -> dict:
+        return self.result
+
+
+class FakeHTTPClient:
+    """HTTP-клиент без сети: тело запроса собирается, как его собрал бы requests, и отбрасывается."""
+
+    def __init__(self, result: dict):
+        self.result = result
+
+    def post(self, url: str, headers: dict = None, json: dict = None, data: bytes = None):
+        if json is not None:
+            data = _json_body(json)  # так requests кодирует параметр json=
+        return FakeResponse(self.result)
+
+
+def _json_body(payload: dict) -> bytes:
+    return json.dumps(payload, allow_nan=False).encode("utf-8")
+
+
+def legacy_upload(downloaded_file: bytes) -> bytes:
+    """Прежний путь: base64 в main.handler, data URL в состоянии, split в ocr_image_node,
+    декодирование и повторное кодирование в OCRService, json.dumps в requests."""
+    image_data = base64.b64encode(downloaded_file).decode("utf-8")
+    state_image_data = f"data:image/png;base64,{image_data}"
+    base64_data = state_image_data.split(",")[1]
+    data = base64.b64decode(base64_data)
+    content = base64.b64encode(data).decode("ascii")
+    return _json_body({"mimeType": "PNG", "languageCodes": ["ru", "en"], "model": "page", "content": content})
+
+
+def legacy_text(result: dict) -> str:
+    """Прежняя сборка текста: text += в тройном цикле, границы блоков теряются."""
+    text = ""
+    for block in result.get("result", {}).get("textAnnotation", {}).get("blocks", []):
+        for line in block.get("lines", []):
+            for word in line.get("words", []):
+                text += word.get("text", "") + " "
+            text += "\n"
+    return text.strip()
+
+
+def measure(run) -> tuple:
+    """Лучшее время из REPEATS прогонов (мс) и пиковая дополнительная память (МБ)."""
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        run()
+        times.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak / 1024 / 1024
+
+
+def make_service(result: dict) -> OCRService:
+    return OCRService(folder_id="benchmark", iam_token="benchmark", http_client=FakeHTTPClient(result),
+                      preprocessor=PassThroughPreprocessor(), use_cache=False)
+
+
+if __name__ == "__main__":
+    empty = ocr_response(0)
+    print("📤 Путь изображения до запроса к OCR (без предобработки и сети)\n")
+    print(f"{'Изображение':>11} | {'прежний, мс':>11} | {'МБ':>6} | {'байты, мс':>9} | {'МБ':>6}")
+    for size_mb in IMAGE_SIZES_MB:
+        downloaded_file = b"\x89PNG\r\n\x1a\n" + os.urandom(size_mb * 1024 * 1024)
+        service = make_service(empty)
+        legacy_ms, legacy_mb = measure(lambda: legacy_upload(downloaded_file))
+        new_ms, new_mb = measure(lambda: service.analyze_image(downloaded_file))
+        print(f"{size_mb:>8} МБ | {legacy_ms:>11.1f} | {legacy_mb:>6.1f} | {new_ms:>9.1f} | {new_mb:>6.1f}")
+
+    print("\n📝 Сборка текста ответа OCR\n")
+    print(f"{'Слов':>7} | {'text +=, мс':>11} | {'МБ':>6} | {'join, мс':>9} | {'МБ':>6}")
+    for words in WORD_COUNTS:
+        result = ocr_response(words)
+        legacy_ms, legacy_mb = measure(lambda: legacy_text(result))
+        new_ms, new_mb = measure(lambda: OCRService.format_text(OCRService.parse_blocks(result)))
+        print(f"{words:>7} | {legacy_ms:>11.1f} | {legacy_mb:>6.2f} | {new_ms:>9.1f} | {new_mb:>6.2f}")
@@ -0,0 +1,116 @@
+# benchmarks/ingestion_benchmark.py
+# Пиковая память и скорость индексации: DataFrame целиком против потокового конвейера.
+# Запуск: python -m benchmarks.ingestion_benchmark
+import random
+import time
+import tracemalloc
+from typing import Dict, Iterable, Iterator, List, Set
+
+import pandas as pd
+from langchain_community.document_loaders import DataFrameLoader
+
+from benchmarks.stubs import StubEmbeddingService
+from src.clickhouse_service import COLUMNS, content_hash
+from src.rag_service import RAGService
+
+CORPUS_SIZES = (10_000, 25_000, 100_000)
+LEGACY_MAX_SIZE = 25_000  # прежний путь держит все эмбеддинги в памяти — на 100k это гигабайты
+BATCH_SIZE = 256
+BLOCK_SIZE = 10_000
+EMBEDDING_DIM = 256
+
+WORDS = ("акселератор", "заявка", "статус", "модератор", "кабинет", "права", "рассылка",
+         "мероприятие", "шаблон", "excel", "файл", "роль", "партнёр", "страница", "список")
+
+
+def synthetic_tasks(count: int) -> Iterator[Dict]:
+    """Синтетические задачи по ~1500 символов (два чанка по 1000), генерируются по одной."""
+    rng = random.Random(42)
+    for task_id in range(count):
+        title = f"Задача {task_id}: {' '.join(rng.choices(WORDS, k=5))}"
+        context = " ".join(rng.choices(WORDS, k=170))
+        yield {"id": task_id, "title": title, "url": f"https://example.local/tasks/{task_id}/",
+               "search": f"{title} {context}"}
+
+
+class NullVectorStore:
+    """
+    Заглушка ClickHouseVectorStore для замера памяти: хранилище пустое (каждый чанк новый),
+    вставка превращает документы в строки, как clickhouse_connect, и отбрасывает их.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.inserts = 0
+
+    def get_embeddings_by_hash(self, hashes: List[str], batch_size: int = 1000) -> Dict[str, List[float]]:
+        return {}
+
+    def get_unchanged_chunk_ids(self, chunks: List[Dict]) -> Set[str]:
+        return set()
+
+    def add_documents(self, documents: List[Dict], table_name: str = None):
+        rows = [tuple(doc.get(column) for column in COLUMNS) for doc in documents]
+        self.rows += len(rows)
+        self.inserts += 1
+
+    def replace_documents(self, documents: Iterable[Dict], vector_index: bool = False, block_size: int = 10_000):
+        block = []
+        for document in documents:
+            block.append(document)
+            if len(block) >= block_size:
+                self.add_documents(block)
+                block = []
+        if block:
+            self.add_documents(block)
+
+
+def ingest_legacy(service: RAGService, count: int):
+    """Прежний ingest: DataFrame → DataFrameLoader → все чанки и эмбеддинги списком → одна вставка."""
+    df = pd.DataFrame(list(synthetic_tasks(count)))
+    docs = DataFrameLoader(df, page_content_column="search").load()
+    texts = service.text_splitter.split_documents(docs)
+    embeddings_data = []
+    for chunk_index, doc in enumerate(texts):
+        embeddings_data.append({
+            "task_id": doc.metadata.get("id"),
+            "chunk_index": chunk_index,
+            "title": doc.metadata.get("title"),
+            "url": doc.metadata.get("url"),
+            "text": doc.page_content,
+            "content_hash": content_hash(doc.page_content),
+            "embedding": service.embedding_service.embed_text(doc.page_content),
+        })
+    service.vector_store.add_documents(embeddings_data)
+
+
+def ingest_streaming(service: RAGService, count: int):
+    chunks = service.iter_embedded_chunks(synthetic_tasks(count), batch_size=BATCH_SIZE)
+    service.vector_store.replace_documents(chunks, block_size=BLOCK_SIZE)
+
+
+def measure(ingest, count: int) -> tuple:
+    store = NullVectorStore()
+    service = RAGService(chunk_size=1000, chunk_overlap=0,
+                         embedding_service=StubEmbeddingService(dim=EMBEDDING_DIM), vector_store=store)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    ingest(service, count)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 2 ** 20, store.rows / elapsed, store.rows, store.inserts
+
+
+if __name__ == "__main__":
+    print(f"⏱️ Синтетический корпус, пачка эмбеддингов {BATCH_SIZE}, блок вставки {BLOCK_SIZE}, "
+          f"размерность {EMBEDDING_DIM} (скорость занижена tracemalloc)\n")
+    print(f"{'Документов':>10} | {'Вариант':<10} | {'Пик памяти, МБ':>14} | {'Чанков/с':>9} | {'Чанков':>7} | {'Вставок':>7}")
+    for count in CORPUS_SIZES:
+        cases = [("поток", ingest_streaming)]
+        if count <= LEGACY_MAX_SIZE:
+            cases.insert(0, ("DataFrame", ingest_legacy))
+        for name, ingest in cases:
+            peak, throughput, rows, inserts = measure(ingest, count)
+            print(f"{count:>10} | {name:<10} | {peak:>14.1f} | {throughput:>9.0f} | {rows:>7} | {inserts:>7}")
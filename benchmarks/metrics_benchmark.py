@@ -0,0 +1,81 @@
+# benchmarks/metrics_benchmark.py
+# Накладные расходы метрик на вызов (функция без декоратора, @timed и metrics.timer при выключенных
+# и включённых метриках) и сводка p50/p95/p99 по узлам графа и вызовам сервисов на заглушках,
+# выгруженная через эндпоинт /metrics и файл, вместе со счётчиками и текущими значениями сервисов.
+# Запуск: python -m benchmarks.metrics_benchmark
+import contextlib
+import io
+import socket
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+from benchmarks.service_container_benchmark import build_container, make_inputs
+from src.graph_service import GraphService
+from src.metrics_service import metrics, timed
+
+CALLS = 200_000
+REQUESTS = 30
+
+
+def plain(x):
+    return x
+
+
+@timed("benchmark.decorated")
+def decorated(x):
+    return x
+
+
+def with_timer(x):
+    with metrics.timer("benchmark.timer"):
+        return x
+
+
+def per_call_ns(func) -> float:
+    start = time.perf_counter()
+    for i in range(CALLS):
+        func(i)
+    return (time.perf_counter() - start) / CALLS * 1e9
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+if __name__ == "__main__":
+    print(f"⏱️ Накладные расходы на вызов, {CALLS} вызовов\n")
+    print(f"{'Вызов':<26} | {'выключены, нс':>13} | {'включены, нс':>12}")
+    baseline = per_call_ns(plain)
+    print(f"{'без замера':<26} | {baseline:>13.0f} | {baseline:>12.0f}")
+    for name, func in (("@timed", decorated), ("with metrics.timer()", with_timer)):
+        metrics.enabled = False
+        disabled = per_call_ns(func)
+        metrics.enabled = True
+        enabled = per_call_ns(func)
+        print(f"{name:<26} | {disabled:>13.0f} | {enabled:>12.0f}")
+
+    metrics.reset()
+    graph_service = GraphService(build_container())
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(REQUESTS):
+            graph_service.invoke(make_inputs())
+
+    print(f"\n📈 Сводка после {REQUESTS} запросов к графу на заглушках (мс)\n")
+    print(f"{'Операция':<32} | {'вызовов':>7} | {'ошибок':>6} | {'p50':>6} | {'p95':>6} | {'p99':>6}")
+    for name, stats in metrics.snapshot().items():
+        print(f"{name:<32} | {stats['count']:>7} | {stats['errors']:>6} | {stats['p50'] * 1000:>6.2f} | "
+              f"{stats['p95'] * 1000:>6.2f} | {stats['p99'] * 1000:>6.2f}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        port, path = free_port(), Path(directory) / "rag.prom"
+        metrics.start(port=port, path=str(path), interval=0.1)
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            body = response.read().decode("utf-8")
+        metrics.stop()
+        print(f"\nGET /metrics: {len(body.splitlines())} строк, файл {path.name}: {len(path.read_text().splitlines())} строк")
+        print("\n".join(line for line in body.splitlines() if 'operation="graph"' in line))
+        print("\n".join(line for line in body.splitlines() if line.startswith(("rag_events_total", "rag_gauge"))))
@@ -0,0 +1,74 @@
+# benchmarks/ocr_cache_benchmark.py
+# Задержка обработки изображения и доля попаданий: OCR без кэша против OCRCache на потоке сообщений с повторами.
+# Поток моделирует бота: один и тот же файл пересылается повторно (тот же file_unique_id),
+# одинаковые скриншоты присылают разные пользователи (новый file_unique_id, те же байты).
+# Скачивание из Telegram и Yandex Cloud OCR заменены задержками и локальным сервером.
+# Запуск: python -m benchmarks.ocr_cache_benchmark
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.ocr_preprocessing_benchmark import StubOCRServer, sample_images
+from src.http_service import HTTPClient
+from src.ocr_cache_service import OCRCache
+from src.ocr_service import OCRService
+
+MESSAGES = 60
+DOWNLOAD_LATENCY = 0.15  # скачивание фото из Telegram (get_file + download_file), секунды
+RESENT_SHARE = 0.3  # доля пересланных файлов (тот же file_unique_id)
+DUPLICATE_SHARE = 0.2  # доля тех же изображений, присланных заново (новый file_unique_id)
+
+
+def message_stream(images: list) -> list:
+    """Сообщения (file_unique_id, байты): новые изображения, пересылки и повторные загрузки."""
+    rng = random.Random(0)
+    sent, messages = [], []
+    for i in range(MESSAGES):
+        roll = rng.random()
+        if sent and roll < RESENT_SHARE:
+            messages.append(rng.choice(sent))
+        elif sent and roll < RESENT_SHARE + DUPLICATE_SHARE:
+            messages.append((f"upload-{i}", rng.choice(sent)[1]))
+        else:
+            # Новое изображение: байты после конца PNG/JPEG декодеры игнорируют, а sha256 меняется
+            message = (f"upload-{i}", images[len(sent) % len(images)] + str(i).encode())
+            sent.append(message)
+            messages.append(message)
+    return messages
+
+
+def handle(service: OCRService, file_unique_id: str, data: bytes) -> str:
+    """Как main.handler и ocr_image_node: кэш по file_unique_id, иначе скачивание и OCR."""
+    text = service.get_cached_text(file_unique_id)
+    if text:
+        return text
+    time.sleep(DOWNLOAD_LATENCY)
+    return service.analyze_image(data, image_id=file_unique_id)
+
+
+if __name__ == "__main__":
+    stub = StubOCRServer()
+    server = stub.serve()
+    url = f"http://127.0.0.1:{server.server_address[1]}/ocr/v1/recognizeText"
+    # Разные изображения: уникальные байты для каждой картинки из img/ и её JPEG-версии
+    messages = message_stream([data for _, data in sample_images()])
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, cache in (("Без кэша", None), ("OCRCache", OCRCache(str(Path(directory) / "ocr.sqlite")))):
+            service = OCRService(folder_id="benchmark", iam_token="benchmark", http_client=HTTPClient(),
+                                 cache=cache, use_cache=cache is not None)
+            service.vision_url = url
+            requests_before = len(stub.models)
+            start = time.perf_counter()
+            for file_unique_id, data in messages:
+                handle(service, file_unique_id, data)
+            elapsed = time.perf_counter() - start
+
+            print(f"\n{name}: {elapsed / MESSAGES * 1000:.0f} мс на изображение, "
+                  f"запросов к OCR: {len(stub.models) - requests_before} из {MESSAGES}")
+            if cache is not None:
+                stats = cache.stats()
+                print(f"  попаданий {stats['hit_ratio']:.0%} (file_unique_id: {stats['file_hits']}, "
+                      f"содержимое: {stats['content_hits']}), сэкономлено OCR {stats['saved_seconds']:.1f} с")
+    server.shutdown()
@@ -0,0 +1,134 @@
+# benchmarks/ocr_preprocessing_benchmark.py
+# Объём отправки и задержка OCR на изображение: исходный файл против ImagePreprocessor на картинках из img/.
+# Каждая картинка проверяется как есть (PNG) и в виде, в котором её присылает Telegram (JPEG).
+# Yandex Cloud OCR заменён локальным сервером: передача тела по каналу UPLINK_MBIT плюс распознавание, время
+# которого зависит от модели и числа мегапикселей присланного изображения (RECOGNITION_SECONDS — допущение
+# бенчмарка: печатная модель page быстрее рукописной handwritten). Отдельно выводится время предобработки.
+# Запуск: python -m benchmarks.ocr_preprocessing_benchmark
+import base64
+import io
+import json
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from PIL import Image
+
+from src.http_service import HTTPClient
+from src.image_service import ImagePreprocessor
+from src.ocr_service import OCRService
+
+IMAGES_DIR = Path(__file__).parent.parent / "img"
+# Время распознавания: (постоянная часть, секунды на мегапиксель) по моделям
+RECOGNITION_SECONDS = {"page": (0.10, 0.03), "handwritten": (0.20, 0.06)}
+UPLINK_MBIT = 20  # пропускная способность канала до OCR, Мбит/с
+TELEGRAM_JPEG_QUALITY = 87
+
+
+class StubOCRServer:
+    """Локальный OCR: время ответа — передача тела по каналу UPLINK_MBIT и распознавание (RECOGNITION_SECONDS)."""
+
+    def __init__(self):
+        self.models = []
+
+    def serve(self) -> ThreadingHTTPServer:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                request = json.loads(body)
+                stub.models.append(request["model"])
+                time.sleep(len(body) * 8 / (UPLINK_MBIT * 1_000_000) + recognition_seconds(request))
+
+                answer = {"result": {"textAnnotation": {"blocks": [
+                    {"lines": [{"words": [{"text": "Пользователи"}, {"text": "128"}]}]}
+                ]}}}
+                response = json.dumps(answer).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+def recognition_seconds(request: dict) -> float:
+    """Время распознавания по модели и размеру изображения в пикселях."""
+    width, height = Image.open(io.BytesIO(base64.b64decode(request["content"]))).size
+    fixed, per_megapixel = RECOGNITION_SECONDS[request["model"]]
+    return fixed + per_megapixel * width * height / 1_000_000
+
+
+class PassThroughPreprocessor(ImagePreprocessor):
+    """Прежнее поведение: файл отправляется как есть, модель — рукописная."""
+
+    def prepare(self, data: bytes) -> dict:
+        return {"data": data, "mime_type": "image", "screenshot": False, "perceptual_hash": None,
+                "original_size": len(data), "size": len(data)}
+
+
+def sample_images():
+    """Картинки из img/ как есть и пересжатые в JPEG, как их присылает Telegram."""
+    for path in sorted(IMAGES_DIR.glob("*.png")):
+        data = path.read_bytes()
+        yield path.name, data
+
+        buffer = io.BytesIO()
+        Image.open(io.BytesIO(data)).convert("RGB").save(buffer, "JPEG", quality=TELEGRAM_JPEG_QUALITY)
+        yield path.with_suffix(".jpg").name, buffer.getvalue()
+
+
+def make_service(url: str, preprocessor: ImagePreprocessor) -> OCRService:
+    service = OCRService(folder_id="benchmark", iam_token="benchmark", http_client=HTTPClient(),
+                         preprocessor=preprocessor, use_cache=False)
+    service.vision_url = url
+    return service
+
+
+if __name__ == "__main__":
+    stub = StubOCRServer()
+    server = stub.serve()
+    url = f"http://127.0.0.1:{server.server_address[1]}/ocr/v1/recognizeText"
+    legacy = make_service(url, PassThroughPreprocessor())
+    prepared = make_service(url, ImagePreprocessor())
+
+    rows = []
+    for name, data in sample_images():
+        start = time.perf_counter()
+        prepared.preprocessor.prepare(data)
+        row = [name, (time.perf_counter() - start) * 1000]
+        for service in (legacy, prepared):
+            uploaded = service.uploaded_bytes
+            start = time.perf_counter()
+            service.analyze_image(data)
+            row += [(service.uploaded_bytes - uploaded) / 1024, (time.perf_counter() - start) * 1000]
+        rows.append(row + [stub.models[-1]])
+    server.shutdown()
+
+    recognition = ", ".join(f"{model} {fixed * 1000:.0f} мс + {per_mp * 1000:.0f} мс/Мп"
+                            for model, (fixed, per_mp) in RECOGNITION_SECONDS.items())
+    print(f"\n⏱️ Канал {UPLINK_MBIT} Мбит/с, распознавание: {recognition}\n")
+    print(f"{'Изображение':<22} | {'исходно, КБ':>11} | {'мс':>6} | {'после, КБ':>9} | {'мс':>6} | "
+          f"{'подготовка, мс':>14} | модель")
+    for row in rows:
+        print(f"{row[0]:<22} | {row[2]:>11.0f} | {row[3]:>6.0f} | {row[4]:>9.0f} | {row[5]:>6.0f} | "
+              f"{row[1]:>14.0f} | {row[6]}")
+
+    for name, service in (("Без предобработки", legacy), ("ImagePreprocessor", prepared)):
+        stats = service.stats()
+        print(f"{name:<18} в среднем {stats['avg_uploaded_bytes'] / 1024:7.0f} КБ и {stats['avg_seconds'] * 1000:5.0f} мс на изображение")
+    print(f"Предобработка: медиана {statistics.median(row[1] for row in rows):.0f} мс, "
+          f"максимум {max(row[1] for row in rows):.0f} мс на изображение")
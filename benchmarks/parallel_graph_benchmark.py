@@ -0,0 +1,165 @@
+# benchmarks/parallel_graph_benchmark.py
+# Время обработки запроса: прежний последовательный граф (ocr → cache_lookup → retrieve → init_prompt → generate)
+# против GraphService с параллельными ветвями (подготовка промпта одновременно с OCR и поиском,
+# эмбеддинг запроса одновременно с проверкой версии корпуса). Узлы одни и те же — различается только топология.
+# Сценарии: первый запрос процесса (LLM-клиент создаётся в ветви init_prompt), запрос, на котором
+# истекла проверка версии корпуса, и обычный запрос; текст и изображение.
+# Запуск: python -m benchmarks.parallel_graph_benchmark
+import asyncio
+import contextlib
+import io
+import statistics
+import time
+from functools import partial
+
+from langgraph.graph import StateGraph, END
+
+from benchmarks.stubs import (
+    StubEmbeddingService, StubVectorStore, StubLLMService, StubOCRService, load_task_documents
+)
+from src.answer_cache_service import AnswerCache
+from src.graph_service import (
+    GraphService, GraphState, cache_store_node, decide_to_retrieve, generate_node, get_template_version,
+    init_prompt_template_node, ocr_image_node, retrieve_rag_node, timed_node
+)
+from src.rag_service import RAGService
+from src.service_container import ServiceContainer
+
+REQUESTS = 5
+
+# Примерная стоимость вызовов, секунды
+EMBEDDING_CALL = 0.06
+VECTOR_STORE_CALL = 0.02
+CORPUS_VERSION_CALL = 0.02  # SELECT версии корпуса из ClickHouse
+LLM_SETUP = 0.3  # создание клиентов YandexGPT и Langfuse
+LLM_CALL = 0.8
+OCR_CALL = 0.4
+
+DOCUMENTS = load_task_documents()
+
+
+class VersionedStubVectorStore(StubVectorStore):
+    """Заглушка хранилища, у которой запрос версии корпуса занимает время, как в ClickHouse."""
+
+    def get_corpus_version(self) -> str:
+        time.sleep(CORPUS_VERSION_CALL)
+        return super().get_corpus_version()
+
+
+def build_container() -> ServiceContainer:
+    embedding_service = StubEmbeddingService(call_delay=EMBEDDING_CALL)
+    vector_store = VersionedStubVectorStore(DOCUMENTS, call_delay=VECTOR_STORE_CALL)
+    container = ServiceContainer(
+        embedding_service=embedding_service,
+        vector_store=vector_store,
+        rag_service=RAGService(embedding_service=embedding_service, vector_store=vector_store),
+        ocr_service=StubOCRService(call_delay=OCR_CALL),
+        # Порог выше 1 отключает попадания: каждый запрос проходит весь граф
+        answer_cache=AnswerCache(similarity_threshold=2.0, corpus_version_provider=vector_store.get_corpus_version),
+    )
+    # LLM-сервис создаётся лениво, при первом обращении, как в боте
+    container._services["llm_service"] = None
+    container._get_or_create = partial(_create_llm_stub, container._get_or_create)
+    return container
+
+
+def _create_llm_stub(get_or_create, name, factory):
+    if name == "llm_service":
+        factory = partial(StubLLMService, setup_delay=LLM_SETUP, call_delay=LLM_CALL)
+    return get_or_create(name, factory)
+
+
+@timed_node("cache_lookup")
+async def sequential_cache_lookup_node(state: GraphState, container: ServiceContainer) -> dict:
+    """Прежний cache_lookup: эмбеддинг запроса, затем поиск в кэше (с проверкой версии корпуса)."""
+    if state["response"] or not state["query"]:
+        return {}
+    query_embedding = container.embedding_service.embed_query(state["query"])
+    response = container.answer_cache.lookup(query_embedding, get_template_version(state, container), state["query"])
+    if response is not None:
+        return {"response": response, "query_embedding": query_embedding}
+    return {"query_embedding": query_embedding, "started_at": time.time()}
+
+
+def sequential_graph(container: ServiceContainer):
+    """Прежняя топология: все узлы по очереди."""
+    workflow = StateGraph(GraphState)
+    for name, node in (("ocr", ocr_image_node), ("cache_lookup", sequential_cache_lookup_node),
+                       ("retrieve", retrieve_rag_node), ("init_prompt", init_prompt_template_node),
+                       ("generate", generate_node), ("cache_store", cache_store_node)):
+        workflow.add_node(name, partial(node, container=container))
+    workflow.set_conditional_entry_point(lambda state: "ocr" if state["image_data"] else "cache_lookup",
+                                         {"ocr": "ocr", "cache_lookup": "cache_lookup"})
+    workflow.add_edge("ocr", "cache_lookup")
+    workflow.add_conditional_edges("cache_lookup", decide_to_retrieve, {"retrieve": "retrieve", "end": END})
+    workflow.add_edge("retrieve", "init_prompt")
+    workflow.add_edge("init_prompt", "generate")
+    workflow.add_edge("generate", "cache_store")
+    workflow.add_edge("cache_store", END)
+    return workflow.compile()
+
+
+def make_inputs(image: bool) -> GraphState:
+    return {
+        "query": "" if image else "Что нужно сделать с акселераторами?",
+        "relevants": [],
+        "context": "",
+        "response": "",
+        "image_data": b"\x89PNG\r\n\x1a\n" if image else b"",
+        "image_id": "",
+        "prompt_template": None,
+    }
+
+
+async def run(app, inputs: GraphState) -> tuple:
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = await app.ainvoke(inputs)
+    return time.perf_counter() - start, result["timings"]
+
+
+async def scenario(name: str, image: bool, cold: bool, version_check: bool):
+    results = {}
+    for topology in ("последовательно", "параллельно"):
+        walls, node_sums = [], []
+        for _ in range(REQUESTS if not cold else 3):
+            container = build_container()
+            app = sequential_graph(container) if topology == "последовательно" else GraphService(container).app
+            if not cold:
+                container.llm_service  # клиент уже создан предыдущими запросами
+                await run(app, make_inputs(image))
+            if version_check:
+                # Версия корпуса перепроверяется раз в corpus_version_ttl секунд — этот запрос попал на проверку
+                container.answer_cache._corpus_version_checked_at = 0.0
+            wall, timings = await run(app, make_inputs(image))
+            walls.append(wall)
+            node_sums.append(timings)
+        results[topology] = (statistics.median(walls), node_sums[-1])
+
+    sequential, parallel = results["последовательно"][0], results["параллельно"][0]
+    print(f"{name:<44} | {sequential * 1000:>9.0f} | {parallel * 1000:>9.0f} | {(sequential - parallel) * 1000:>10.0f}")
+    return results["параллельно"][1]
+
+
+async def main():
+    print(f"⏱️ Заглушки: OCR {OCR_CALL * 1000:.0f} мс, эмбеддинг {EMBEDDING_CALL * 1000:.0f} мс, "
+          f"поиск {VECTOR_STORE_CALL * 1000:.0f} мс, версия корпуса {CORPUS_VERSION_CALL * 1000:.0f} мс, "
+          f"создание LLM-клиента {LLM_SETUP * 1000:.0f} мс, генерация {LLM_CALL * 1000:.0f} мс\n")
+    print(f"{'Сценарий':<44} | {'послед., мс':>9} | {'паралл., мс':>9} | {'экономия, мс':>10}")
+    breakdowns = {}
+    for name, image, cold, version_check in (
+            ("текст, первый запрос процесса", False, True, False),
+            ("изображение, первый запрос процесса", True, True, False),
+            ("текст, проверка версии корпуса", False, False, True),
+            ("текст, обычный запрос", False, False, False),
+            ("изображение, обычный запрос", True, False, False),
+    ):
+        breakdowns[name] = await scenario(name, image, cold, version_check)
+
+    print("\nВремя узлов параллельного графа (мс):")
+    for name, timings in breakdowns.items():
+        print(f"  {name}: " + ", ".join(f"{node} {seconds * 1000:.0f}" for node, seconds in timings.items()))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,177 @@
+# benchmarks/polling_benchmark.py
+# Пропускная способность обработки сообщений: последовательный цикл против PollingService.
+# Telegram Bot API заменён локальным HTTP-сервером, обработчик — задержкой «генерации ответа».
+# Число запросов getUpdates показывает, что пока обработчики работают, цикл не крутится; отдельный сценарий —
+# одно сообщение с обработчиком на 2 с: пока оно обрабатывается, getUpdates ждёт новых сообщений (long-polling),
+# а само обновление лежит в журнале (будет обработано повторно после падения).
+# Запуск: python -m benchmarks.polling_benchmark
+import asyncio
+import json
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import requests
+
+from src.polling_service import PollingService
+
+UPDATES = 200
+CHATS = 20
+HANDLER_DELAY = 0.05  # «генерация ответа», секунды
+LEGACY_SLEEP = 2  # фиксированная пауза старого цикла main.run
+SLOW_HANDLER_DELAY = 2.0  # долгая генерация ответа
+
+
+class FakeTelegram:
+    """Очередь обновлений с семантикой getUpdates: offset подтверждает всё, что раньше него."""
+
+    def __init__(self, updates: int, chats: int):
+        self.updates = [
+            {
+                "update_id": 1000 + i,
+                "message": {"message_id": i, "chat": {"id": i % chats}, "text": f"Вопрос {i}"},
+            }
+            for i in range(updates)
+        ]
+        self.condition = threading.Condition()
+        self.calls = 0
+
+    def get_updates(self, offset: int, timeout: float, limit: int = 100) -> list:
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            self.calls += 1
+            if offset < 0:
+                self.updates = self.updates[offset:]
+            else:
+                self.updates = [u for u in self.updates if u["update_id"] >= offset]
+
+            while not self.updates and time.monotonic() < deadline:
+                self.condition.wait(deadline - time.monotonic())
+
+            return self.updates[:limit]
+
+    def serve(self) -> ThreadingHTTPServer:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                result = fake.get_updates(
+                    offset=int(query.get("offset", ["0"])[0]),
+                    timeout=float(query.get("timeout", ["0"])[0]),
+                )
+                body = json.dumps({"ok": True, "result": result}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+def legacy_run(api_url: str) -> float:
+    """Старый main.run: sleep(2), getUpdates без timeout, обработка каждого сообщения по очереди."""
+    url = f"{api_url}/botTOKEN/getUpdates"
+    handled = 0
+    update_id = 0
+    start = time.perf_counter()
+
+    while handled < UPDATES:
+        time.sleep(LEGACY_SLEEP)
+        messages = requests.get(url, params={"offset": update_id}).json()["result"]
+        for message in messages:
+            if update_id < message["update_id"]:
+                update_id = message["update_id"]
+                time.sleep(HANDLER_DELAY)
+                handled += 1
+
+    return time.perf_counter() - start
+
+
+def polling_run(api_url: str, max_concurrency: int) -> float:
+    """
+    PollingService: long-polling и параллельные обработчики с порядком внутри чата.
+    Время — до обработки последнего сообщения: остановка ждёт завершения текущего long-polling запроса.
+    """
+    last_seen = {}
+    finished_at = []
+    handled = []
+    done = threading.Event()
+
+    def handler(update: dict):
+        chat_id = update["message"]["chat"]["id"]
+        assert last_seen.get(chat_id, -1) < update["update_id"], "нарушен порядок внутри чата"
+        last_seen[chat_id] = update["update_id"]
+        time.sleep(HANDLER_DELAY)
+        handled.append(update["update_id"])
+        if len(handled) >= UPDATES:
+            finished_at.append(time.perf_counter())
+            done.set()
+
+    async def main():
+        task = asyncio.create_task(service.run())
+        await asyncio.get_running_loop().run_in_executor(None, done.wait)
+        service.stop()
+        await task
+
+    service = PollingService("TOKEN", handler, max_concurrency=max_concurrency,
+                             poll_timeout=1, skip_pending=False, api_url=api_url)
+    start = time.perf_counter()
+    asyncio.run(main())
+    return finished_at[0] - start
+
+
+def slow_handler_case():
+    """Одно сообщение, обработчик на SLOW_HANDLER_DELAY секунд: число getUpdates и журнал обновлений."""
+    fake = FakeTelegram(1, 1)
+    server = fake.serve()
+    journaled = []
+    journal_path = f"{tempfile.mkdtemp()}/updates.json"
+
+    def handler(update: dict):
+        time.sleep(SLOW_HANDLER_DELAY / 2)
+        # Обновление в журнале: при падении процесса сейчас оно будет обработано после перезапуска
+        with open(journal_path, encoding="utf-8") as journal:
+            journaled.append(any(u["update_id"] == update["update_id"] for u in json.load(journal)))
+        time.sleep(SLOW_HANDLER_DELAY / 2)
+        service.stop()
+
+    service = PollingService("TOKEN", handler, poll_timeout=5, skip_pending=False,
+                             api_url=f"http://127.0.0.1:{server.server_address[1]}", journal_path=journal_path)
+    try:
+        asyncio.run(service.run())
+    finally:
+        server.shutdown()
+    with open(journal_path, encoding="utf-8") as journal:
+        left = json.load(journal)
+    print(f"Обработчик {SLOW_HANDLER_DELAY:.0f} с: getUpdates {fake.calls}, "
+          f"обновление в журнале во время обработки: {journaled[0]}, "
+          f"журнал пуст после: {not left}, подтверждено после: {not fake.updates}")
+
+
+def run_case(name: str, runner, *args):
+    fake = FakeTelegram(UPDATES, CHATS)
+    server = fake.serve()
+    api_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        elapsed = runner(api_url, *args)
+    finally:
+        server.shutdown()
+    print(f"{name:<28} {elapsed:7.2f} с   {UPDATES / elapsed:8.1f} сообщений/с   getUpdates: {fake.calls}")
+
+
+if __name__ == "__main__":
+    print(f"⏱️ {UPDATES} сообщений из {CHATS} чатов, обработчик {HANDLER_DELAY * 1000:.0f} мс\n")
+    run_case("Последовательный цикл", legacy_run)
+    for concurrency in (1, 4, 16):
+        run_case(f"PollingService x{concurrency}", polling_run, concurrency)
+    print()
+    slow_handler_case()
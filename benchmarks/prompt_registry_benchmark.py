@@ -0,0 +1,75 @@
+# benchmarks/prompt_registry_benchmark.py
+# Подготовка промпта на запрос: чтение и разбор файла шаблона, сборка цепочки промпт → LLM и хэш версии
+# на каждый запрос против PromptRegistry (всё один раз, проверка mtime не чаще reload_interval).
+# Плюс проверка горячей перезагрузки: правка файла шаблона меняет версию без перезапуска.
+# LLM заменена RunnableLambda — измеряется только подготовка, не генерация.
+# Запуск: python -m benchmarks.prompt_registry_benchmark
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from langchain_core.runnables import RunnableLambda
+
+from src.prompt_service import PromptRegistry, PromptService, make_template_version
+
+REQUESTS = 2_000
+TEMPLATE_PATH = "prompts/answer_from_documents.txt"
+MODEL = "yandexgpt-lite"
+TEMPERATURE = 0.3
+
+llm = RunnableLambda(lambda prompt: "ответ")
+
+
+def legacy_prepare(template_path: str):
+    """Прежний путь: PromptService на запрос, новая цепочка и хэш версии для кэша ответов."""
+    prompt_template = PromptService(template_path=template_path).get_prompt_template()
+    version = make_template_version(template_path, prompt_template.template)
+    return prompt_template | llm, version
+
+
+def registry_prepare(registry: PromptRegistry, template_path: str):
+    prompt_template = registry.get(template_path)
+    version = registry.version(template_path)
+    return registry.get_chain(prompt_template, llm, MODEL, TEMPERATURE), version
+
+
+def measure(prepare) -> list:
+    times = []
+    for _ in range(REQUESTS):
+        start = time.perf_counter()
+        prepare()
+        times.append((time.perf_counter() - start) * 1_000_000)
+    return times
+
+
+if __name__ == "__main__":
+    registry = PromptRegistry()
+    print(f"⏱️ {REQUESTS} подготовок промпта {TEMPLATE_PATH}\n")
+    for name, prepare in (
+            ("PromptService на запрос", lambda: legacy_prepare(TEMPLATE_PATH)),
+            ("PromptRegistry", lambda: registry_prepare(registry, TEMPLATE_PATH)),
+    ):
+        times = measure(prepare)
+        times.sort()
+        print(f"{name:<24} p50={statistics.median(times):7.1f} мкс   p99={times[int(len(times) * 0.99) - 1]:7.1f} мкс")
+    print(f"Реестр: {registry.stats()}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        shutil.copy(TEMPLATE_PATH, directory)
+        template_path = (Path(directory) / Path(TEMPLATE_PATH).name).as_posix()
+        registry = PromptRegistry(directory=directory, reload_interval=0)
+        before = registry.version(template_path)
+        chain = registry.get_chain(registry.get(template_path), llm, MODEL, TEMPERATURE)
+
+        with open(template_path, "a", encoding="utf-8") as template_file:
+            template_file.write("\nОтвечай кратко.")
+        # Время модификации меняется и при правке в ту же долю секунды
+        os.utime(template_path, ns=(time.time_ns(), time.time_ns() + 1))
+
+        after = registry.version(template_path)
+        rebuilt = registry.get_chain(registry.get(template_path), llm, MODEL, TEMPERATURE) is not chain
+        print(f"\nГорячая перезагрузка: {before.split(':')[-1]} → {after.split(':')[-1]}, "
+              f"цепочка пересобрана: {rebuilt}")
@@ -0,0 +1,67 @@
+# benchmarks/query_binding_benchmark.py
+# Время поискового запроса на клиенте и на сервере: вектор литералом в тексте SQL против параметра Array(Float32).
+# Нужен запущенный ClickHouse с заполненной таблицей (rag_create.py).
+# Запуск: python -m benchmarks.query_binding_benchmark
+import statistics
+import time
+
+import numpy as np
+
+from src.clickhouse_service import ClickHouseVectorStore
+
+QUERIES = 200
+EMBEDDING_DIM = 256
+TOP_K = 3
+
+
+def search_literal(store: ClickHouseVectorStore, query_embedding: list):
+    """Прежний вариант: вектор форматируется в строку и вставляется в текст запроса."""
+    query_str = ",".join(map(str, query_embedding))
+    return store.client.query(f"""
+        SELECT chunk_id, title, url, text, cosineDistance(embedding, [{query_str}]) AS dist
+        FROM {store.table_name}
+        ORDER BY dist ASC
+        LIMIT {TOP_K}
+    """)
+
+
+def search_bound(store: ClickHouseVectorStore, query_embedding: list):
+    """Текущий вариант из ClickHouseVectorStore.search_similar — вектор связанным параметром."""
+    return store.client.query("""
+        SELECT chunk_id, title, url, text, cosineDistance(embedding, {query_embedding:Array(Float32)}) AS dist
+        FROM {table:Identifier}
+        ORDER BY dist ASC
+        LIMIT {limit:UInt32}
+    """, parameters={"query_embedding": query_embedding, "table": store.table_name, "limit": TOP_K})
+
+
+def measure(store: ClickHouseVectorStore, search, queries: list) -> tuple:
+    """Возвращает (полное время на клиенте, время выполнения на сервере) в миллисекундах."""
+    client_times, server_times = [], []
+    for query_embedding in queries:
+        start = time.perf_counter()
+        result = search(store, query_embedding)
+        client_times.append((time.perf_counter() - start) * 1000)
+
+        elapsed_ns = (result.summary or {}).get("elapsed_ns")
+        if elapsed_ns is not None:
+            server_times.append(int(elapsed_ns) / 1e6)
+    return client_times, server_times
+
+
+def report(name: str, client_times: list, server_times: list):
+    server = f"{statistics.median(server_times):7.2f} мс" if server_times else "   н/д"
+    print(f"{name:<24} клиент p50={statistics.median(client_times):7.2f} мс   сервер p50={server}")
+
+
+if __name__ == "__main__":
+    store = ClickHouseVectorStore()
+    rng = np.random.default_rng(0)
+    queries = [rng.standard_normal(EMBEDDING_DIM).tolist() for _ in range(QUERIES)]
+
+    # Прогрев соединения
+    search_bound(store, queries[0])
+
+    print(f"⏱️ {QUERIES} запросов к {store.table_name}, вектор из {EMBEDDING_DIM} чисел\n")
+    report("Литерал в тексте SQL", *measure(store, search_literal, queries))
+    report("Параметр Array(Float32)", *measure(store, search_bound, queries))
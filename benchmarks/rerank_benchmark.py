@@ -0,0 +1,70 @@
+# benchmarks/rerank_benchmark.py
+# Что попадает в генерацию (top-3 чанка): поиск без переранжирования против запроса 30 кандидатов
+# и Reranker (релевантность + совпадение слов + MMR), на размеченных запросах к задачам из tasks/ и их клонах.
+# Считаются recall@3, число различных задач среди выбранных чанков, токены контекста и время переранжирования.
+# Запуск: python -m benchmarks.rerank_benchmark
+import contextlib
+import io
+import statistics
+import time
+
+from benchmarks.context_builder_benchmark import CLONE_OFFSET, corpus_with_clones
+from benchmarks.hybrid_search_benchmark import LABELLED_QUERIES
+from benchmarks.stubs import StubEmbeddingService, StubVectorStore
+from src.context_builder import estimate_tokens
+from src.rag_service import RAGService
+from src.rerank_service import Reranker
+
+TOP_K = 3
+CANDIDATES = (0, 10, 30, 60)
+REPEATS = 20
+
+
+def percentile(values: list, share: float) -> float:
+    values = sorted(values)
+    return values[max(int(len(values) * share) - 1, 0)]
+
+
+if __name__ == "__main__":
+    embedding_service = StubEmbeddingService()
+    vector_store = StubVectorStore()
+    indexer = RAGService(embedding_service=embedding_service, vector_store=vector_store)
+    vector_store.add_documents([
+        {**chunk, "embedding": embedding_service.embed_text(chunk["text"])}
+        for chunk in indexer.iter_chunks(corpus_with_clones())
+    ])
+    query_embeddings = [embedding_service.embed_query(query) for query, _ in LABELLED_QUERIES]
+
+    print(f"⏱️ {len(LABELLED_QUERIES)} запросов, в генерацию — top-{TOP_K} чанков, корпус с клонами задач\n")
+    print(f"{'Кандидатов':<20} | {'recall@3':>8} | {'задач в top-3':>13} | {'токенов':>7} | "
+          f"{'rerank p50, мс':>14} | {'p95, мс':>7}")
+
+    for candidates in CANDIDATES:
+        reranker = Reranker()
+        rag_service = RAGService(embedding_service=embedding_service, vector_store=vector_store,
+                                 collapse="none", search_mode="hybrid",
+                                 reranker=reranker, rerank_candidates=candidates)
+        hits, distinct, tokens, latencies = 0, [], [], []
+        for (query, task_id), query_embedding in zip(LABELLED_QUERIES, query_embeddings):
+            with contextlib.redirect_stdout(io.StringIO()):
+                found = rag_service.search_relevant_documents(query, top_k=TOP_K, query_embedding=query_embedding)
+                context = rag_service.format_context(found)
+            tasks = {doc["task_id"] % CLONE_OFFSET for doc in found}
+            hits += task_id in tasks
+            distinct.append(len(tasks))
+            tokens.append(estimate_tokens(context))
+
+            if candidates > TOP_K:
+                pool = vector_store.search_hybrid(query_embedding, query, limit=candidates, with_embeddings=True)
+                for _ in range(REPEATS):
+                    start = time.perf_counter()
+                    reranker.rerank(query, query_embedding, pool, top_k=TOP_K)
+                    latencies.append((time.perf_counter() - start) * 1000)
+
+        name = "без переранжирования" if candidates <= TOP_K else str(candidates)
+        timing = (f"{statistics.median(latencies):>14.2f} | {percentile(latencies, 0.95):>7.2f}"
+                  if latencies else f"{'':>14} | {'':>7}")
+        print(f"{name:<20} | {hits / len(LABELLED_QUERIES):>8.2f} | {statistics.mean(distinct):>13.2f} | "
+              f"{statistics.mean(tokens):>7.0f} | {timing}")
+
+    print(f"\nБюджет переранжирования: {Reranker().budget_ms:.0f} мс (RERANK_BUDGET_MS)")
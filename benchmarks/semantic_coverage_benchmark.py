@@ -0,0 +1,48 @@
+# benchmarks/semantic_coverage_benchmark.py
+# Задержка оценки покрытия: векторизация каждого документа заново против сохранённых эмбеддингов.
+# Запуск: python -m benchmarks.semantic_coverage_benchmark
+import statistics
+import time
+
+import numpy as np
+
+from benchmarks.stubs import StubEmbeddingService, StubVectorStore, load_task_documents, stub_embedding
+from src.semantic_coverage_service import SemanticCoverageService
+
+REQUESTS = 20
+TOP_K = 3
+EMBEDDING_CALL = 0.05  # время ответа API эмбеддингов, секунды
+
+
+def calculate_legacy(service: SemanticCoverageService, response: str, relevant_docs: list) -> float:
+    """Прежний calculate: embed_text для каждого документа по очереди, затем ответ."""
+    doc_embeddings = [service.embedding_service.embed_text(doc["text"]) for doc in relevant_docs]
+    context_embedding = np.mean(np.array(doc_embeddings), axis=0)
+    response_embedding = np.array(service.embedding_service.embed_query(response))
+    return float(service._cosine_similarity(context_embedding, response_embedding))
+
+
+def measure(calculate, service: SemanticCoverageService, relevant_docs: list) -> tuple:
+    latencies = []
+    service.embedding_service.calls = 0
+    for i in range(REQUESTS):
+        start = time.perf_counter()
+        calculate(service, f"Ответ номер {i}", relevant_docs)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies, service.embedding_service.calls / REQUESTS
+
+
+if __name__ == "__main__":
+    store = StubVectorStore(load_task_documents())
+    query_embedding = stub_embedding("Что нужно сделать с акселераторами?")
+    service = SemanticCoverageService(embedding_service=StubEmbeddingService(call_delay=EMBEDDING_CALL))
+
+    print(f"⏱️ {REQUESTS} ответов по {TOP_K} документам, вызов API эмбеддингов {EMBEDDING_CALL * 1000:.0f} мс\n")
+
+    relevant_docs = store.search_similar(query_embedding, limit=TOP_K)
+    latencies, calls = measure(calculate_legacy, service, relevant_docs)
+    print(f"Векторизация документов   p50={statistics.median(latencies):7.1f} мс   вызовов API на ответ: {calls:.0f}")
+
+    relevant_docs = store.search_similar(query_embedding, limit=TOP_K, with_embeddings=True)
+    latencies, calls = measure(lambda s, r, d: s.calculate("", r, d), service, relevant_docs)
+    print(f"Сохранённые эмбеддинги    p50={statistics.median(latencies):7.1f} мс   вызовов API на ответ: {calls:.0f}")
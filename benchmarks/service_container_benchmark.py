@@ -0,0 +1,86 @@
+# benchmarks/service_container_benchmark.py
+# Задержка обработки запроса: сервисы на каждый запрос (как раньше) против общего контейнера.
+# Запуск: python -m benchmarks.service_container_benchmark
+import statistics
+import time
+
+from benchmarks.stubs import (
+    StubEmbeddingService, StubVectorStore, StubLLMService, StubOCRService, load_task_documents
+)
+from src.answer_cache_service import AnswerCache
+from src.graph_service import GraphService, GraphState
+from src.rag_service import RAGService
+from src.service_container import ServiceContainer
+
+REQUESTS = 30
+
+# Примерная стоимость создания клиентов (подключение, SDK, Langfuse) и вызовов, секунды
+EMBEDDING_SETUP, EMBEDDING_CALL = 0.05, 0.01
+VECTOR_STORE_SETUP, VECTOR_STORE_CALL = 0.03, 0.005
+LLM_SETUP, LLM_CALL = 0.08, 0.02
+OCR_SETUP = 0.001
+
+DOCUMENTS = load_task_documents()
+
+
+def build_container() -> ServiceContainer:
+    """Собирает контейнер на заглушках с задержками инициализации."""
+    embedding_service = StubEmbeddingService(setup_delay=EMBEDDING_SETUP, call_delay=EMBEDDING_CALL)
+    vector_store = StubVectorStore(DOCUMENTS, setup_delay=VECTOR_STORE_SETUP, call_delay=VECTOR_STORE_CALL)
+
+    return ServiceContainer(
+        embedding_service=embedding_service,
+        vector_store=vector_store,
+        rag_service=RAGService(embedding_service=embedding_service, vector_store=vector_store),
+        llm_service=StubLLMService(setup_delay=LLM_SETUP, call_delay=LLM_CALL),
+        ocr_service=StubOCRService(setup_delay=OCR_SETUP),
+        # Порог выше 1 отключает кэш ответов: повторяющийся вопрос должен проходить весь граф
+        answer_cache=AnswerCache(similarity_threshold=2.0),
+    )
+
+
+def make_inputs() -> GraphState:
+    return {
+        "query": "Что нужно сделать с акселераторами?",
+        "relevants": [],
+        "context": "",
+        "response": "",
+        "image_data": "",
+        "prompt_template": None,
+    }
+
+
+def per_request() -> list:
+    """Старое поведение: граф и все клиенты создаются заново для каждого сообщения."""
+    latencies = []
+    for _ in range(REQUESTS):
+        start = time.perf_counter()
+        GraphService(build_container()).invoke(make_inputs())
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def shared_container() -> list:
+    """Новое поведение: контейнер и граф создаются и прогреваются один раз при старте."""
+    container = build_container()
+    container.warm_up()
+    graph_service = GraphService(container)
+
+    latencies = []
+    for _ in range(REQUESTS):
+        start = time.perf_counter()
+        graph_service.invoke(make_inputs())
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(name: str, latencies: list):
+    latencies_ms = sorted(latency * 1000 for latency in latencies)
+    p95 = latencies_ms[int(len(latencies_ms) * 0.95) - 1]
+    print(f"{name:<20} p50={statistics.median(latencies_ms):8.1f} мс   p95={p95:8.1f} мс")
+
+
+if __name__ == "__main__":
+    print(f"⏱️ {REQUESTS} запросов, заглушки внешних сервисов\n")
+    report("Сервисы на запрос", per_request())
+    report("Общий контейнер", shared_container())
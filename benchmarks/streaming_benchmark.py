@@ -0,0 +1,44 @@
+# benchmarks/streaming_benchmark.py
+# Время до первого фрагмента ответа (TTFT) и полное время: invoke против GraphService.stream.
+# Запуск: python -m benchmarks.streaming_benchmark
+import statistics
+import time
+
+from benchmarks.service_container_benchmark import build_container, make_inputs
+from src.graph_service import GraphService
+
+REQUESTS = 10
+
+
+def measure_invoke(graph_service: GraphService) -> tuple:
+    """Без потоковой выдачи первый текст пользователь видит только вместе с полным ответом."""
+    start = time.perf_counter()
+    graph_service.invoke(make_inputs())
+    total = time.perf_counter() - start
+    return total, total
+
+
+def measure_stream(graph_service: GraphService) -> tuple:
+    start = time.perf_counter()
+    ttft = None
+    for kind, _ in graph_service.stream(make_inputs()):
+        if kind == "token" and ttft is None:
+            ttft = time.perf_counter() - start
+    total = time.perf_counter() - start
+    return ttft if ttft is not None else total, total
+
+
+def report(name: str, measurements: list):
+    ttft = statistics.median(m[0] for m in measurements) * 1000
+    total = statistics.median(m[1] for m in measurements) * 1000
+    print(f"{name:<10} TTFT p50={ttft:7.1f} мс   полное время p50={total:7.1f} мс")
+
+
+if __name__ == "__main__":
+    graph_service = GraphService(build_container())
+    invoke = [measure_invoke(graph_service) for _ in range(REQUESTS)]
+    stream = [measure_stream(graph_service) for _ in range(REQUESTS)]
+
+    print(f"\n⏱️ {REQUESTS} запросов, заглушки внешних сервисов\n")
+    report("invoke", invoke)
+    report("stream", stream)
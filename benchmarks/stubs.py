@@ -0,0 +1,198 @@
+# benchmarks/stubs.py
+# Заглушки внешних сервисов (Yandex Cloud, ClickHouse, YandexGPT) для бенчмарков без сети
+import asyncio
+import hashlib
+import time
+from pathlib import Path
+from typing import List, Dict
+
+import numpy as np
+
+from src.vector_store import TOKEN_PATTERN, lexical_tokens, make_chunk_id
+
+
+def stub_embedding(text: str, dim: int = 256) -> List[float]:
+    """Детерминированный нормированный псевдо-эмбеддинг текста."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def load_task_documents(tasks_dir: str = "tasks") -> List[Dict]:
+    """Читает задачи из tasks/*.md в формате строк векторного хранилища (без эмбеддингов)."""
+    documents = []
+    for path in sorted(Path(tasks_dir).glob("*.md")):
+        documents.append({
+            "id": int(path.stem),
+            "title": f"Задача {path.stem}",
+            "url": f"https://example.local/tasks/{path.stem}/",
+            "text": path.read_text(encoding="utf-8"),
+        })
+    return documents
+
+
+class StubEmbeddingService:
+    """Заглушка YandexEmbeddingService: задержка на создание клиента и на каждый вызов."""
+
+    def __init__(self, dim: int = 256, setup_delay: float = 0.0, call_delay: float = 0.0):
+        time.sleep(setup_delay)
+        self.dim = dim
+        self.call_delay = call_delay
+        self.calls = 0
+
+    def embed_text(self, text: str) -> List[float]:
+        self.calls += 1
+        time.sleep(self.call_delay)
+        return stub_embedding(text, self.dim)
+
+    def embed_query(self, query: str) -> List[float]:
+        return self.embed_text(query)
+
+    def embed_texts(self, texts: List[str], query: bool = False) -> List[List[float]]:
+        return [self.embed_text(text) for text in texts]
+
+
+class StubVectorStore:
+    """Заглушка ClickHouseVectorStore: точный поиск по косинусному расстоянию в памяти."""
+
+    def __init__(self, documents: List[Dict] = None, setup_delay: float = 0.0, call_delay: float = 0.0):
+        time.sleep(setup_delay)
+        self.call_delay = call_delay
+        self.documents = []
+        self.add_documents([
+            {
+                **doc,
+                "task_id": doc.get("task_id", doc.get("id")),
+                "chunk_index": doc.get("chunk_index", 0),
+                "embedding": doc.get("embedding") or stub_embedding(doc["text"]),
+            }
+            for doc in (documents or [])
+        ])
+
+    def add_documents(self, documents: List[Dict]):
+        for doc in documents:
+            doc.setdefault("chunk_id", make_chunk_id(doc["task_id"], doc["chunk_index"]))
+        self.documents.extend(documents)
+
+    def get_corpus_version(self) -> str:
+        return str(len(self.documents))
+
+    def _distances(self, query_embedding: List[float]) -> np.ndarray:
+        matrix = np.array([doc["embedding"] for doc in self.documents], dtype=np.float32)
+        query = np.array(query_embedding, dtype=np.float32)
+        return 1.0 - matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query))
+
+    def search_similar(self, query_embedding: List[float], limit: int = 2, exact: bool = False,
+                       with_embeddings: bool = False, collapse: str = "none",
+                       neighbours: int = 1, overfetch: int = 5) -> List[Dict]:
+        time.sleep(self.call_delay)
+        if not self.documents:
+            return []
+        distances = self._distances(query_embedding)
+        return self._collect(np.argsort(distances), distances, limit, with_embeddings, collapse, neighbours)
+
+    def search_hybrid(self, query_embedding: List[float], query_text: str, limit: int = 2,
+                      exact: bool = False, with_embeddings: bool = False, collapse: str = "none",
+                      neighbours: int = 1, overfetch: int = 5, rrf_k: int = 60) -> List[Dict]:
+        """Векторный и лексический списки по limit * overfetch кандидатов, объединённые RRF."""
+        time.sleep(self.call_delay)
+        if not self.documents:
+            return []
+        distances = self._distances(query_embedding)
+        candidates = limit * max(overfetch, 1)
+        tokens = lexical_tokens(query_text)
+
+        matches = np.array([
+            sum(
+                token in TOKEN_PATTERN.findall(f"{doc['title']} {doc['text']}".lower()) or token == str(doc["task_id"])
+                for token in tokens
+            )
+            for doc in self.documents
+        ])
+        vector_ranking = np.argsort(distances)[:candidates]
+        lexical_ranking = [i for i in np.lexsort((distances, -matches)) if matches[i] > 0][:candidates]
+
+        rrf = {}
+        for ranking in (vector_ranking, lexical_ranking):
+            for rank, i in enumerate(ranking, start=1):
+                rrf[i] = rrf.get(i, 0.0) + 1 / (rrf_k + rank)
+        order = sorted(rrf, key=lambda i: (-rrf[i], distances[i]))
+
+        return self._collect(order, distances, limit, with_embeddings, collapse, neighbours, rrf)
+
+    def _collect(self, order, distances: np.ndarray, limit: int, with_embeddings: bool,
+                 collapse: str, neighbours: int, rrf: Dict = None) -> List[Dict]:
+        documents, seen = [], set()
+        for i in order:
+            if len(documents) == limit:
+                break
+            chunk = self.documents[i]
+            if collapse != "none":
+                if chunk["task_id"] in seen:
+                    continue
+                seen.add(chunk["task_id"])
+
+            document = {
+                "chunk_id": chunk["chunk_id"],
+                "task_id": chunk["task_id"],
+                "chunk_index": chunk["chunk_index"],
+                "title": chunk["title"],
+                "url": chunk["url"],
+                "text": chunk["text"],
+                "score": float(distances[i]),
+            }
+            if collapse == "merge":
+                parts = sorted(
+                    (other["chunk_index"], other["text"]) for other in self.documents
+                    if other["task_id"] == chunk["task_id"]
+                    and abs(other["chunk_index"] - chunk["chunk_index"]) <= neighbours
+                )
+                document["chunk_indexes"] = [chunk_index for chunk_index, _ in parts]
+                document["text"] = "\n".join(text for _, text in parts)
+            if with_embeddings:
+                document["embedding"] = chunk["embedding"]
+            if rrf is not None:
+                document["rrf"] = rrf[i]
+            documents.append(document)
+        return documents
+
+
+class StubLLMService:
+    """Заглушка LLMService: фиксированная задержка генерации."""
+
+    def __init__(self, setup_delay: float = 0.0, call_delay: float = 0.0):
+        time.sleep(setup_delay)
+        self.call_delay = call_delay
+
+    def generate_response(self, question: str, context: str, state: dict, prompt_template=None) -> str:
+        return "".join(self.stream_response(question, context, state, prompt_template))
+
+    def stream_response(self, question: str, context: str, state: dict, prompt_template=None):
+        words = f"Ответ на вопрос: {question}".split(" ")
+        for word in words:
+            time.sleep(self.call_delay / len(words))
+            yield word + " "
+
+    async def astream_response(self, question: str, context: str, state: dict, prompt_template=None):
+        words = f"Ответ на вопрос: {question}".split(" ")
+        for word in words:
+            await asyncio.sleep(self.call_delay / len(words))
+            yield word + " "
+
+    def get_chain(self, prompt_template=None):
+        return None
+
+
+class StubOCRService:
+    """Заглушка OCRService."""
+
+    def __init__(self, setup_delay: float = 0.0, call_delay: float = 0.0):
+        time.sleep(setup_delay)
+        self.call_delay = call_delay
+
+    def get_cached_text(self, image_id: str):
+        return None
+
+    def analyze_image(self, image_data, image_id: str = None) -> str:
+        time.sleep(self.call_delay)
+        return "Список акселераторов"
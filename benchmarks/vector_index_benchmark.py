@@ -0,0 +1,89 @@
+# benchmarks/vector_index_benchmark.py
+# Recall@k и задержка поиска: полный просмотр cosineDistance против HNSW-индекса vector_similarity.
+# Нужен запущенный ClickHouse (см. README); синтетический корпус генерируется на стороне сервера.
+# Запуск: python -m benchmarks.vector_index_benchmark
+import statistics
+import time
+
+import numpy as np
+
+from src.clickhouse_service import ClickHouseVectorStore
+
+CORPUS_SIZES = (100_000, 1_000_000)
+EMBEDDING_DIM = 256
+CLUSTERS = 997
+QUERIES = 50
+TOP_K = 10
+CANDIDATE_LIST_SIZES = (32, 128, 512)
+
+
+def fill_corpus(store: ClickHouseVectorStore, size: int):
+    """Кластеризованные синтетические эмбеддинги: CLUSTERS центров плюс гауссов шум."""
+    store.client.command(f"""
+        INSERT INTO {store.table_name}
+        SELECT
+            toString(number) AS chunk_id,
+            number AS task_id,
+            0 AS chunk_index,
+            '' AS text,
+            '' AS title,
+            '' AS url,
+            '' AS content_hash,
+            arrayMap(i -> toFloat32(sin((number % {CLUSTERS} + 1) * i) + randNormal(0, 0.3)), range({EMBEDDING_DIM}))
+        FROM numbers({size})
+    """)
+
+
+def sample_queries(store: ClickHouseVectorStore) -> list:
+    """Запросы — случайные векторы корпуса с дополнительным шумом."""
+    rows = store.client.query(
+        f"SELECT embedding FROM {store.table_name} ORDER BY rand() LIMIT {QUERIES}"
+    ).result_rows
+    rng = np.random.default_rng(42)
+    return [(np.array(row[0]) + rng.normal(0, 0.3, EMBEDDING_DIM)).tolist() for row in rows]
+
+
+def measure(store: ClickHouseVectorStore, queries: list, exact: bool) -> tuple:
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        found = store.search_similar(query, limit=TOP_K, exact=exact)
+        latencies.append(time.perf_counter() - start)
+        results.append({doc["chunk_id"] for doc in found})
+    return latencies, results
+
+
+def report(name: str, latencies: list, recall: float):
+    latencies_ms = sorted(latency * 1000 for latency in latencies)
+    p95 = latencies_ms[int(len(latencies_ms) * 0.95) - 1]
+    print(f"  {name:<24} p50={statistics.median(latencies_ms):8.1f} мс   "
+          f"p95={p95:8.1f} мс   recall@{TOP_K}={recall:.3f}")
+
+
+if __name__ == "__main__":
+    for size in CORPUS_SIZES:
+        print(f"\n📦 Корпус: {size} векторов, размерность {EMBEDDING_DIM}")
+
+        exact_store = ClickHouseVectorStore(table_name=f"bench_exact_{size}", embedding_dim=EMBEDDING_DIM)
+        exact_store.create_table()
+        fill_corpus(exact_store, size)
+
+        ann_store = ClickHouseVectorStore(table_name=f"bench_ann_{size}", embedding_dim=EMBEDDING_DIM)
+        ann_store.create_table(vector_index=True)
+        start = time.perf_counter()
+        ann_store.client.command(f"INSERT INTO {ann_store.table_name} SELECT * FROM {exact_store.table_name}")
+        ann_store.client.command(f"OPTIMIZE TABLE {ann_store.table_name} FINAL")
+        print(f"  Построение индекса: {time.perf_counter() - start:.1f} с")
+
+        queries = sample_queries(exact_store)
+        exact_latencies, truth = measure(exact_store, queries, exact=True)
+        report("Полный просмотр", exact_latencies, 1.0)
+
+        for candidates in CANDIDATE_LIST_SIZES:
+            ann_store.hnsw_candidate_list_size_for_search = candidates
+            ann_latencies, found = measure(ann_store, queries, exact=False)
+            recall = statistics.mean(len(f & t) / TOP_K for f, t in zip(found, truth))
+            report(f"HNSW, candidates={candidates}", ann_latencies, recall)
+
+        for store in (exact_store, ann_store):
+            store.client.command(f"DROP TABLE IF EXISTS {store.table_name}")
@@ -0,0 +1,89 @@
+# benchmarks/vector_store_benchmark.py
+# Задержка поиска top-k: локальный NumpyVectorStore (memmap + argpartition) против ClickHouseVectorStore.
+# ClickHouse необязателен: если сервер недоступен, измеряется только локальный индекс.
+# Запуск: python -m benchmarks.vector_store_benchmark
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from clickhouse_connect.driver.exceptions import Error as ClickHouseError
+
+from benchmarks.vector_index_benchmark import fill_corpus
+from src.clickhouse_service import ClickHouseVectorStore
+from src.numpy_vector_store import NumpyVectorStore
+
+CORPUS_SIZES = (10_000, 100_000, 1_000_000)
+EMBEDDING_DIM = 256
+QUERIES = 50
+TOP_K = 10
+BLOCK_SIZE = 50_000
+
+
+def synthetic_chunks(size: int):
+    """Случайные эмбеддинги с минимальными метаданными, блоками по BLOCK_SIZE."""
+    rng = np.random.default_rng(42)
+    for start in range(0, size, BLOCK_SIZE):
+        block = rng.standard_normal((min(BLOCK_SIZE, size - start), EMBEDDING_DIM), dtype=np.float32)
+        for offset, embedding in enumerate(block):
+            yield {"task_id": start + offset, "chunk_index": 0, "title": "", "url": "", "text": "",
+                   "content_hash": str(start + offset), "embedding": embedding}
+
+
+def measure(search, queries: list) -> list:
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(name: str, latencies: list):
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"  {name:<28} p50={statistics.median(latencies):8.2f} мс   p95={p95:8.2f} мс")
+
+
+def connect_clickhouse(size: int):
+    try:
+        store = ClickHouseVectorStore(table_name=f"bench_store_{size}", embedding_dim=EMBEDDING_DIM)
+        store.client.command("SELECT 1")
+        return store
+    except ClickHouseError as e:
+        print(f"  ⚠️ ClickHouse недоступен ({e.__class__.__name__}), измеряется только локальный индекс")
+        return None
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    queries = [rng.standard_normal(EMBEDDING_DIM).tolist() for _ in range(QUERIES)]
+
+    for size in CORPUS_SIZES:
+        print(f"\n📦 Корпус: {size} векторов, размерность {EMBEDDING_DIM}, top-{TOP_K}")
+
+        with tempfile.TemporaryDirectory() as path:
+            local = NumpyVectorStore(path=path, embedding_dim=EMBEDDING_DIM)
+            start = time.perf_counter()
+            local.replace_documents(synthetic_chunks(size), block_size=BLOCK_SIZE)
+            print(f"  Запись снимка .npy: {time.perf_counter() - start:.1f} с")
+
+            # Новый экземпляр — как процесс бота, открывающий готовый снимок
+            local = NumpyVectorStore(path=path, embedding_dim=EMBEDDING_DIM)
+            start = time.perf_counter()
+            local.search_similar(queries[0], limit=TOP_K)
+            print(f"  Открытие снимка и первый запрос: {(time.perf_counter() - start) * 1000:.0f} мс")
+            report("NumPy (memmap, argpartition)", measure(lambda q: local.search_similar(q, limit=TOP_K), queries))
+            del local
+
+        clickhouse = connect_clickhouse(size)
+        if clickhouse is None:
+            continue
+        clickhouse.create_table(vector_index=True)
+        fill_corpus(clickhouse, size)
+        clickhouse.client.command(f"OPTIMIZE TABLE {clickhouse.table_name} FINAL")
+        report("ClickHouse, полный просмотр",
+               measure(lambda q: clickhouse.search_similar(q, limit=TOP_K, exact=True), queries))
+        report("ClickHouse, HNSW",
+               measure(lambda q: clickhouse.search_similar(q, limit=TOP_K), queries))
+        clickhouse.client.command(f"DROP TABLE IF EXISTS {clickhouse.table_name}")
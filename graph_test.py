@@ -1,6 +1,5 @@
 # text_query_test.py
 # Проверка работы тестовых запроса с использованием langgraph и early stopping
-import base64
 import os
 
 from src.graph_service import GraphService, GraphState
@@ -16,15 +15,15 @@ if __name__ == "__main__":
         raise FileNotFoundError(f"Файл не найден: {image_path}")
 
     with open(image_path, "rb") as image_file:
-        encoded_image = base64.b64encode(image_file.read()).decode("utf-8")
+        image_data = image_file.read()
 
     inputs: GraphState = {
         "query": query,
         "relevants": [],
         "context": "",
         "response": "",
-        #"image_data": "",
-         "image_data": f"data:image/png;base64,{encoded_image}",
+        #"image_data": b"",
+         "image_data": image_data,
         "prompt_template": None,
     }
 
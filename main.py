@@ -1,67 +1,79 @@
 # main.py
 # Точка входа: запуск бота, и передача данных в граф
 import os
-import base64
+import asyncio
 import time
-import requests
 import telebot
 from dotenv import load_dotenv
 
 from src.bot import keyboards
 from src.bot.structure import create_bot
 from src.graph_service import GraphService, GraphState
+from src.polling_service import PollingService
+from src.metrics_service import metrics
+from src.service_container import get_container
 
 load_dotenv()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 
+# Потоковая выдача ответа: сообщение-заглушка редактируется по мере генерации,
+# не чаще одного раза в STREAM_EDIT_INTERVAL секунд (ограничения Telegram на редактирование)
+STREAMING = os.getenv("BOT_STREAMING", "1") == "1"
+STREAM_EDIT_INTERVAL = float(os.getenv("BOT_STREAM_EDIT_INTERVAL", "1.0"))
+STREAM_ERROR_MESSAGE = "⚠️ Не удалось подготовить ответ, попробуйте ещё раз."
+
+# Бот, сервисы и скомпилированный граф создаются один раз на процесс
+bot = create_bot(BOT_TOKEN)
+services = get_container()
+graph_service = GraphService(services)
+
 
 def handler(event, _):
     try:
         message = telebot.types.Update.de_json(event["body"])
 
         if message.message.from_user.username == 'dmitry_plus':
-            bot = create_bot(BOT_TOKEN)
-
             inputs: GraphState = {
                 "query": "",
                 "relevants": [],
                 "context": "",
                 "response": "",
-                "image_data": "",
+                "image_data": b"",
+                "image_id": "",
                 "prompt_template": None,
             }
 
             #собираем стэйт для картинки
             if message.message.content_type == 'photo':
-                file_id = message.message.photo[-1].file_id
-                file_info = bot.get_file(file_id)
-                downloaded_file = bot.download_file(file_info.file_path)
-                image_data = base64.b64encode(downloaded_file).decode('utf-8')
-
-                inputs["image_data"] = f"data:image/png;base64,{image_data}"
-
-                graph_service = GraphService()
-
-                answer = graph_service.invoke(inputs)
-
-                result = answer["response"]
+                photo = message.message.photo[-1]
+                inputs["image_id"] = photo.file_unique_id
+
+                # Изображение уже распознавалось — не скачиваем его и не отправляем в OCR
+                cached_text = services.ocr_service.get_cached_text(photo.file_unique_id)
+                if cached_text:
+                    inputs["query"] = cached_text
+                else:
+                    with metrics.timer("telegram.download_file"):
+                        file_info = bot.get_file(photo.file_id)
+                        # Байты файла как есть: формат определяется по сигнатуре, base64 — только в запросе к OCR
+                        inputs["image_data"] = bot.download_file(file_info.file_path)
 
             # собираем стэйт для текста
             if message.message.content_type == 'text':
                 inputs["query"] = message.message.text
 
-                graph_service = GraphService()
-
+            if STREAMING:
+                send_streaming_answer(message.message.chat.id, inputs)
+            else:
                 answer = graph_service.invoke(inputs)
 
-                result = answer["response"]
-
-            bot.send_message(
-                message.message.chat.id,
-                result,
-                reply_markup=keyboards.EMPTY,
-            )
+                with metrics.timer("telegram.send_message"):
+                    bot.send_message(
+                        message.message.chat.id,
+                        answer["response"],
+                        reply_markup=keyboards.EMPTY,
+                    )
 
     finally:
         return {
@@ -69,28 +81,74 @@ def handler(event, _):
             "body": "!",
         }
 
-def get_updates(offset=0):
+def send_streaming_answer(chat_id: int, inputs: GraphState):
+    """Отправляет заглушку и редактирует её по мере генерации ответа, затем подставляет итоговый текст."""
+    start_time = time.time()
+    with metrics.timer("telegram.send_message"):
+        placeholder = bot.send_message(chat_id, "⏳ Готовлю ответ...", reply_markup=keyboards.EMPTY)
 
-    result = requests.get(f'https://api.telegram.org/bot{BOT_TOKEN}/getUpdates?offset={offset}').json()
+    text = ""
+    sent_text = ""
+    last_edit_time = 0.0
+    first_token_time = None
+    result = ""
 
-    return result['result']
+    try:
+        for kind, payload in graph_service.stream(inputs):
+            if kind == "token":
+                if first_token_time is None:
+                    first_token_time = time.time()
+                text += payload
+
+                if time.time() - last_edit_time >= STREAM_EDIT_INTERVAL and text.strip() and text != sent_text:
+                    with metrics.timer("telegram.edit_message_text"):
+                        bot.edit_message_text(text, chat_id, placeholder.message_id)
+                    sent_text = text
+                    last_edit_time = time.time()
+
+            elif kind == "final":
+                result = payload["response"]
+    except Exception as e:
+        # Без этого пользователь так и остался бы с заглушкой «Готовлю ответ...»
+        print(f"⚠️ Ошибка генерации ответа: {e}")
+        with metrics.timer("telegram.edit_message_text"):
+            bot.edit_message_text(STREAM_ERROR_MESSAGE, chat_id, placeholder.message_id)
+        raise
+
+    if result and result != sent_text:
+        with metrics.timer("telegram.edit_message_text"):
+            bot.edit_message_text(result, chat_id, placeholder.message_id)
+
+    total_duration = time.time() - start_time
+    ttft = (first_token_time - start_time) if first_token_time else total_duration
+    print(f"⏱️ Время до первого фрагмента: {ttft:.2f} с, полное время ответа: {total_duration:.2f} с")
+
+def handle_update(update: dict):
+    """Обработка одного обновления из getUpdates (вызывается из пула обработчиков)."""
+    handler({'body': update}, '')
 
 def run():
 
-    updates = get_updates()
-    update_id = updates[-1]['update_id'] # Присваиваем ID последнего отправленного сообщения боту
-
-    while True:
-        time.sleep(2)
-        messages = get_updates(update_id) # Получаем обновления
-        for message in messages:
+    services.warm_up()
+    # Эндпоинт /metrics (METRICS_PORT) и/или файл метрик (METRICS_FILE)
+    metrics.start()
 
-            if update_id < message['update_id']:
-                update_id = message['update_id']
+    polling_service = PollingService(
+        BOT_TOKEN,
+        handle_update,
+        max_concurrency=int(os.getenv("BOT_MAX_CONCURRENCY", "4")),
+        poll_timeout=int(os.getenv("BOT_POLL_TIMEOUT", "30")),
+        http_client=services.http_client,
+        journal_path=os.getenv("BOT_JOURNAL_FILE", ".cache/bot_updates.json"),
+    )
 
-                event = {'body': message}
-
-                handler(event, '')
+    try:
+        asyncio.run(polling_service.run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        services.shutdown()
+        metrics.stop()
 
 if __name__ == '__main__':
     run()
@@ -1,7 +1,6 @@
 # ocr_test.py
 # Проверка получения описания элементов на картинке
 
-import base64
 import os
 
 from src.ocr_service import OCRService
@@ -14,7 +13,7 @@ from src.prompt_service import PromptService
 rag_service = RAGService()
 llm_service = LLMService(model="yandexgpt-lite")
 
-def image_analyze(image_data: str) -> str:
+def image_analyze(image_data: bytes) -> str:
     ocr_service = OCRService()
     return ocr_service.analyze_image(image_data)
 
@@ -25,12 +24,12 @@ image_path = "img/users_count.png"
 if not os.path.exists(image_path):
     raise FileNotFoundError(f"Файл не найден: {image_path}. Убедитесь, что путь корректен.")
 
-# Чтение изображения и конвертация в base64
+# Чтение изображения: в OCR передаются байты файла
 with open(image_path, "rb") as image_file:
-    encoded_image = base64.b64encode(image_file.read()).decode("utf-8")
+    image_data = image_file.read()
 
 # Вызов функции распознавания
-recognized_text = image_analyze(encoded_image)
+recognized_text = image_analyze(image_data)
 
 print("Распознанный текст:")
 print(recognized_text)
@@ -1,14 +1,6 @@
 # rag_create.py
-import os
-import pandas as pd
-
-
-# Очищаем хранилище, создаем таблицу
-from src.clickhouse_service import ClickHouseVectorStore
-
-vector_store = ClickHouseVectorStore()
-vector_store.create_table()
-
+# Индексация задач: новая версия корпуса собирается в теневой таблице и подменяет текущую,
+# эмбеддинги неизменившихся чанков переиспользуются
 
 # Исходные документы
 documents = [
@@ -49,24 +41,17 @@ documents = [
     },
 ]
 
-# Добавляем context из .md файлов
-for doc in documents:
-    file_name = f"{doc['id']}.md"
-    file_path = os.path.join("tasks", file_name)
-
-    if os.path.exists(file_path):
-        with open(file_path, "r", encoding="utf-8") as f:
-            doc["context"] = f.read()
-    else:
-        doc["context"] = ""
-
-    doc["search"] = f"{doc['title']} {doc['context']}"
-
-# Преобразуем в DataFrame
-df = pd.DataFrame(documents)
+# Используем RAGService: задачи читаются из tasks/*.md по одной, чанки векторизуются
+# пачками и вставляются блоками — весь корпус в памяти не держится
+import os
+import sys
 
-# Используем RAGService
 from src.rag_service import RAGService
+from src.task_loader import iter_markdown_tasks
+
+# HNSW-индекс vector_similarity делает поиск приближённым и требует ClickHouse с его поддержкой,
+# поэтому включается явно: флагом --vector-index или RAG_VECTOR_INDEX=1
+vector_index = "--vector-index" in sys.argv[1:] or os.getenv("RAG_VECTOR_INDEX", "0") == "1"
 
 rag_service = RAGService(chunk_size=1000, chunk_overlap=0)
-rag_service.ingest(df)
\ No newline at end of file
+rag_service.ingest_stream(iter_markdown_tasks("tasks", documents), vector_index=vector_index)
@@ -24,7 +24,7 @@ print(f"🎯 Найдено {len(results)} результата(ов):\n")
 # Форматированный вывод
 for i, doc in enumerate(results, start=1):
     print(f"--- Результат {i} ---")
-    print(f"📌 ID:        {doc['id']}")
+    print(f"📌 Чанк:      {doc['chunk_id']} (задача {doc['task_id']})")
     print(f"📄 Заголовок: {doc['title']}")
     print(f"🔗 Ссылка:    {doc['url']}")
     print(f"📝 Текст:     {doc['text'][:500]}...")  # Обрезаем длинный текст
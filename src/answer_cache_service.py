@@ -0,0 +1,173 @@
+# src/answer_cache_service.py
+# Семантический кэш ответов: похожий вопрос к той же базе знаний получает готовый ответ
+import threading
+import time
+from collections import OrderedDict
+from itertools import count
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from src.metrics_service import metrics
+from src.vector_store import lexical_tokens
+
+
+class AnswerCache:
+    """
+    Кэш ответов графа, ключ — эмбеддинг вопроса.
+
+    Ответ считается подходящим, если косинусное сходство вопросов не ниже similarity_threshold,
+    а версия шаблона промпта и версия корпуса совпадают с теми, с которыми ответ был получен.
+    Числа из вопроса (номера задач, коды ошибок) тоже должны совпадать: эмбеддинги вопросов
+    «задача 196677» и «задача 196678» почти одинаковы, а ответы на них — разные.
+    Записи живут не дольше ttl_seconds, при переполнении вытесняются давно не использовавшиеся (LRU).
+
+    Версия корпуса запрашивается через corpus_version_provider не чаще раза в corpus_version_ttl секунд:
+    после переиндексации (rag_create.py) старые ответы перестают находиться.
+
+    Попадания, промахи и сэкономленное время публикуются в метрики (answer_cache.hits, .misses,
+    .saved_seconds), доля попаданий и число ответов — как текущие значения (answer_cache.hit_ratio, .entries).
+    """
+
+    def __init__(self,
+                 similarity_threshold: float = 0.95,
+                 ttl_seconds: float = 3600,
+                 max_entries: int = 1000,
+                 corpus_version_provider: Callable[[], str] = None,
+                 corpus_version_ttl: float = 30
+                 ):
+        """
+        :param similarity_threshold: Минимальное косинусное сходство вопросов для попадания в кэш.
+        :param ttl_seconds: Время жизни ответа, секунды.
+        :param max_entries: Максимум ответов в кэше.
+        :param corpus_version_provider: Функция, возвращающая текущую версию корпуса документов.
+        :param corpus_version_ttl: Как часто перепроверять версию корпуса, секунды.
+        """
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.corpus_version_provider = corpus_version_provider
+        self.corpus_version_ttl = corpus_version_ttl
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._ids = count()
+        self._corpus_version = None
+        self._corpus_version_checked_at = 0.0
+
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def corpus_version(self) -> Optional[str]:
+        """Текущая версия корпуса (с кэшированием на corpus_version_ttl секунд)."""
+        if self.corpus_version_provider is None:
+            return None
+
+        now = time.monotonic()
+        if now - self._corpus_version_checked_at >= self.corpus_version_ttl:
+            version = self.corpus_version_provider()
+            with self._lock:
+                if version != self._corpus_version:
+                    # Корпус переиндексирован — все ответы устарели
+                    self._entries.clear()
+                    metrics.set_gauge("answer_cache.entries", 0)
+                    self._corpus_version = version
+                self._corpus_version_checked_at = now
+        return self._corpus_version
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    @staticmethod
+    def _numbers(query_text: str) -> Tuple[str, ...]:
+        """Числа вопроса без учёта порядка — часть ключа кэша."""
+        return tuple(sorted(token for token in lexical_tokens(query_text) if token.isdigit()))
+
+    def _count(self, hit: bool, latency: float = 0.0):
+        if hit:
+            self.hits += 1
+            self.saved_seconds += latency
+            metrics.inc("answer_cache.hits")
+            metrics.inc("answer_cache.saved_seconds", latency)
+        else:
+            self.misses += 1
+            metrics.inc("answer_cache.misses")
+        metrics.set_gauge("answer_cache.hit_ratio", self.hits / (self.hits + self.misses))
+        metrics.set_gauge("answer_cache.entries", len(self._entries))
+
+    def lookup(self, query_embedding: List[float], template_version: str, query_text: str = "") -> Optional[str]:
+        """
+        Ищет ответ на похожий вопрос. Возвращает текст ответа или None.
+
+        :param query_text: Текст вопроса: ответ подходит, только если числа в вопросах совпадают.
+        """
+        corpus_version = self.corpus_version()
+        numbers = self._numbers(query_text)
+        query = self._normalize(query_embedding)
+        now = time.monotonic()
+
+        with self._lock:
+            expired = [key for key, entry in self._entries.items() if now - entry["created_at"] > self.ttl_seconds]
+            for key in expired:
+                del self._entries[key]
+
+            candidates = [
+                (key, entry) for key, entry in self._entries.items()
+                if entry["template_version"] == template_version and entry["corpus_version"] == corpus_version
+                and entry["numbers"] == numbers
+            ]
+            if candidates:
+                similarities = np.stack([entry["embedding"] for _, entry in candidates]) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    key, entry = candidates[best]
+                    self._entries.move_to_end(key)
+                    self._count(hit=True, latency=entry["latency"])
+                    return entry["response"]
+
+            self._count(hit=False)
+            return None
+
+    def store(self, query_embedding: List[float], template_version: str, response: str, latency: float,
+              query_text: str = ""):
+        """
+        Сохраняет ответ.
+
+        :param latency: Сколько секунд заняло получение ответа (для оценки сэкономленного времени).
+        :param query_text: Текст вопроса (числа из него входят в ключ).
+        """
+        entry = {
+            "embedding": self._normalize(query_embedding),
+            "numbers": self._numbers(query_text),
+            "template_version": template_version,
+            "corpus_version": self.corpus_version(),
+            "response": response,
+            "latency": latency,
+            "created_at": time.monotonic(),
+        }
+
+        with self._lock:
+            self._entries[next(self._ids)] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            metrics.set_gauge("answer_cache.entries", len(self._entries))
+
+    def invalidate(self):
+        """Удаляет все ответы."""
+        with self._lock:
+            self._entries.clear()
+            metrics.set_gauge("answer_cache.entries", 0)
+
+    def stats(self) -> dict:
+        """Доля попаданий и сэкономленное время."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "saved_seconds": self.saved_seconds,
+            "entries": len(self._entries),
+        }
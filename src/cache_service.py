@@ -0,0 +1,145 @@
+# src/cache_service.py
+# Дисковый кэш с LRU-вытеснением и горячим слоем в памяти
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from src.metrics_service import metrics
+
+
+class DiskLRUCache:
+    """
+    Кэш «ключ → байты» поверх SQLite с LRU-слоем в памяти.
+
+    - В памяти держится не больше memory_entries последних записей.
+    - На диске — не больше max_entries записей: при переполнении удаляются
+      давно не использовавшиеся (по времени последнего обращения).
+    - Счётчики hits/misses позволяют оценить пользу кэша; они же и размер кэша публикуются
+      в метрики как cache.<name>.memory_hits, .disk_hits, .misses, .memory_entries, .disk_entries.
+    """
+
+    def __init__(self, path: str, max_entries: int = 100_000, memory_entries: int = 10_000, name: str = None):
+        """
+        :param path: Путь к файлу SQLite (каталог создаётся автоматически).
+        :param max_entries: Максимум записей на диске.
+        :param memory_entries: Максимум записей в памяти.
+        :param name: Имя кэша в метриках. По умолчанию — имя файла без расширения.
+        """
+        self.path = Path(path)
+        self.name = name or self.path.stem
+        self._metric = f"cache.{self.name}."
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._connection.execute("CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)")
+        self._connection.commit()
+        self._disk_entries = self._connection.execute("SELECT count(*) FROM cache").fetchone()[0]
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._publish_size()
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    def _publish_size(self):
+        metrics.set_gauge(self._metric + "memory_entries", len(self._memory))
+        metrics.set_gauge(self._metric + "disk_entries", self._disk_entries)
+
+    def _remember(self, key: str, value: bytes):
+        """Кладёт запись в память, вытесняя самую старую при переполнении."""
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Возвращает значение или None, если ключа нет."""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                metrics.inc(self._metric + "memory_hits")
+                return value
+
+            row = self._connection.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                metrics.inc(self._metric + "misses")
+                return None
+
+            self._connection.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._connection.commit()
+            self._remember(key, row[0])
+            self.disk_hits += 1
+            metrics.inc(self._metric + "disk_hits")
+            self._publish_size()
+            return row[0]
+
+    def set(self, key: str, value: bytes):
+        """Сохраняет значение в память и на диск."""
+        with self._lock:
+            self._remember(key, value)
+            exists = self._connection.execute("SELECT 1 FROM cache WHERE key = ?", (key,)).fetchone()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, accessed_at) VALUES (?, ?, ?)",
+                (key, value, time.time())
+            )
+            self._connection.commit()
+            if not exists:
+                self._disk_entries += 1
+
+            if self._disk_entries > self.max_entries:
+                self._evict()
+            self._publish_size()
+
+    def _evict(self):
+        """Удаляет с диска давно не использовавшиеся записи (с запасом 10%, чтобы не чистить на каждой вставке)."""
+        keep = int(self.max_entries * 0.9)
+        self._connection.execute("""
+            DELETE FROM cache WHERE key IN (
+                SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (keep,))
+        self._connection.commit()
+        self._disk_entries = self._connection.execute("SELECT count(*) FROM cache").fetchone()[0]
+
+    def clear(self):
+        """Полностью очищает кэш."""
+        with self._lock:
+            self._memory.clear()
+            self._connection.execute("DELETE FROM cache")
+            self._connection.commit()
+            self._disk_entries = 0
+            self._publish_size()
+
+    def stats(self) -> dict:
+        """Счётчики обращений и размер кэша."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_entries": self._disk_entries,
+        }
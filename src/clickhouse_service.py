@@ -1,16 +1,39 @@
 # src/clickhouse_service.py
 
+import re
+import uuid
+
 import clickhouse_connect
-from typing import List, Dict
+from clickhouse_connect.driver.exceptions import DatabaseError
+from typing import Dict, Iterable, List, Set
+
+from src.metrics_service import timed
+from src.vector_store import COLLAPSE_MODES, VectorStore, content_hash, lexical_tokens, make_chunk_id
+
+# Допустимое имя таблицы: идентификатор или database.table без кавычек
+TABLE_NAME_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)?$")
 
+# Колонки таблицы в порядке вставки
+COLUMNS = ["chunk_id", "task_id", "chunk_index", "text", "title", "url", "content_hash", "embedding"]
 
-class ClickHouseVectorStore:
+# Текст, по которому идёт лексический поиск (заголовок есть только в первом чанке задачи, поэтому добавляем его).
+# hasToken делит текст только по ASCII-разделителям, поэтому «ёлочки», тире и прочая пунктуация
+# заменяются пробелами — токены совпадают с TOKEN_PATTERN
+LEXICAL_EXPRESSION = r"lowerUTF8(replaceRegexpAll(concat(title, ' ', text), '[^\\p{L}\\p{N}]+', ' '))"
+
+
+class ClickHouseVectorStore(VectorStore):
     def __init__(
         self,
         host: str = "localhost",
         username: str = "default",
         password: str = "",
-        table_name: str = "tasks_clickhouse"
+        table_name: str = "tasks_clickhouse",
+        embedding_dim: int = 256,
+        index_quantization: str = "bf16",
+        hnsw_max_connections_per_layer: int = 32,
+        hnsw_candidate_list_size_for_construction: int = 128,
+        hnsw_candidate_list_size_for_search: int = None
     ):
         """
         Инициализация клиента ClickHouse и настройка имени таблицы.
@@ -20,62 +43,499 @@ class ClickHouseVectorStore:
             username (str): Имя пользователя.
             password (str): Пароль.
             table_name (str): Имя таблицы для хранения документов.
+            embedding_dim (int): Размерность эмбеддингов (для векторного индекса).
+            index_quantization (str): Квантование векторов в HNSW-индексе: f64, f32, f16, bf16, i8 или b1.
+            hnsw_max_connections_per_layer (int): Число связей вершины в графе HNSW (больше — выше recall, больше памяти).
+            hnsw_candidate_list_size_for_construction (int): Ширина поиска при построении индекса.
+            hnsw_candidate_list_size_for_search (int): Ширина поиска по индексу при запросе
+                (больше — выше recall и медленнее). None — значение сервера по умолчанию.
         """
+        # Имя таблицы подставляется в DDL как есть, поэтому проверяем его заранее
+        if not TABLE_NAME_PATTERN.match(table_name):
+            raise ValueError(f"Недопустимое имя таблицы: {table_name!r}")
+
         self.client = clickhouse_connect.get_client(host=host, username=username, password=password)
         self.table_name = table_name
+        self.embedding_dim = embedding_dim
+        self.index_quantization = index_quantization
+        self.hnsw_max_connections_per_layer = hnsw_max_connections_per_layer
+        self.hnsw_candidate_list_size_for_construction = hnsw_candidate_list_size_for_construction
+        self.hnsw_candidate_list_size_for_search = hnsw_candidate_list_size_for_search
+
+    @property
+    def shadow_table_name(self) -> str:
+        """Теневая таблица, в которую собирается новая версия корпуса перед подменой."""
+        return f"{self.table_name}_shadow"
+
+    def create_table(self, vector_index: bool = False, table_name: str = None):
+        """
+        Создаёт (пересоздаёт) таблицу для хранения документов и эмбеддингов.
+
+        Parameters:
+            vector_index (bool): Добавить HNSW-индекс vector_similarity для приближённого поиска
+                ближайших соседей вместо полного просмотра таблицы.
+            table_name (str): Имя таблицы, по умолчанию — основная таблица хранилища.
+        """
+        table_name = table_name or self.table_name
+        # Bloom-фильтр по токенам текста: лексический поиск (hasToken) пропускает гранулы без нужных слов
+        index = f""",
+            INDEX text_idx {LEXICAL_EXPRESSION} TYPE tokenbf_v1(32768, 3, 0) GRANULARITY 1"""
+        if vector_index:
+            index += f""",
+            INDEX embedding_idx embedding TYPE vector_similarity(
+                'hnsw', 'cosineDistance', {self.embedding_dim}, '{self.index_quantization}',
+                {self.hnsw_max_connections_per_layer}, {self.hnsw_candidate_list_size_for_construction}
+            ) GRANULARITY 100000000"""
 
-    def create_table(self):
-        """Создаёт таблицу для хранения документов и эмбеддингов."""
-        self.client.command(f"DROP TABLE IF EXISTS {self.table_name}")
+        self.client.command(f"DROP TABLE IF EXISTS {table_name}")
         self.client.command(f"""
-        CREATE TABLE {self.table_name} (
-            id UInt64,
+        CREATE TABLE {table_name} (
+            chunk_id String,
+            task_id UInt64,
+            chunk_index UInt32,
             text String,
             title String,
             url String,
-            embedding Array(Float32)
-        ) ENGINE = MergeTree() ORDER BY id
-        """)
+            content_hash String,
+            embedding Array(Float32){index}
+        ) ENGINE = MergeTree() ORDER BY (task_id, chunk_index)
+        COMMENT '{self._new_corpus_version()}'
+        """, settings={"allow_experimental_vector_similarity_index": 1} if vector_index else None)
 
-    def add_documents(self, documents: List[Dict]):
-        """Добавляет документы (уже с готовыми эмбеддингами)."""
+    def add_documents(self, documents: List[Dict], table_name: str = None):
+        """
+        Добавляет чанки (уже с готовыми эмбеддингами).
+        Каждый чанк — словарь с полями task_id, chunk_index, text, title, url, embedding
+        (chunk_id и content_hash вычисляются, если не заданы).
+        """
         rows = []
         for doc in documents:
             rows.append((
-                doc["id"],
+                doc.get("chunk_id") or make_chunk_id(doc["task_id"], doc["chunk_index"]),
+                doc["task_id"],
+                doc["chunk_index"],
                 doc["text"],
                 doc["title"],
                 doc["url"],
+                doc.get("content_hash") or content_hash(doc["text"]),
                 doc["embedding"]
             ))
-        self.client.insert(self.table_name, rows)
+        self.client.insert(table_name or self.table_name, rows, column_names=COLUMNS)
+        if table_name in (None, self.table_name):
+            self._bump_corpus_version()
+
+    @staticmethod
+    def _new_corpus_version() -> str:
+        return uuid.uuid4().hex
+
+    def _bump_corpus_version(self):
+        """Записывает новую версию корпуса в комментарий основной таблицы (см. get_corpus_version)."""
+        self.client.command(f"ALTER TABLE {self.table_name} MODIFY COMMENT '{self._new_corpus_version()}'")
+
+    @timed("clickhouse.get_embeddings_by_hash")
+    def get_embeddings_by_hash(self, hashes: List[str], batch_size: int = 1000) -> Dict[str, List[float]]:
+        """
+        Возвращает уже сохранённые эмбеддинги чанков по хэшам их текста.
+        Если таблицы ещё нет (или она старого формата без content_hash), возвращает пустой словарь.
+        """
+        embeddings = {}
+        for start in range(0, len(hashes), batch_size):
+            try:
+                result = self.client.query("""
+                    SELECT content_hash, embedding
+                    FROM {table:Identifier}
+                    WHERE content_hash IN {hashes:Array(String)}
+                    LIMIT 1 BY content_hash
+                """, parameters={"table": self.table_name, "hashes": hashes[start:start + batch_size]})
+            except DatabaseError:
+                return {}
+
+            embeddings.update({row[0]: row[1] for row in result.result_rows})
+        return embeddings
+
+    @timed("clickhouse.get_unchanged_chunk_ids")
+    def get_unchanged_chunk_ids(self, chunks: List[Dict]) -> Set[str]:
+        """
+        chunk_id чанков, которые уже есть в основной таблице с тем же content_hash, заголовком и ссылкой.
+        Читаются только метаданные (без эмбеддингов), условие по task_id использует первичный ключ.
+        Если таблицы ещё нет (или она старого формата без content_hash), возвращает пустое множество.
+        """
+        if not chunks:
+            return set()
+        try:
+            result = self.client.query("""
+                SELECT chunk_id, content_hash, title, url
+                FROM {table:Identifier}
+                WHERE task_id IN {task_ids:Array(UInt64)} AND chunk_id IN {chunk_ids:Array(String)}
+            """, parameters={
+                "table": self.table_name,
+                "task_ids": list({chunk["task_id"] for chunk in chunks}),
+                "chunk_ids": [chunk["chunk_id"] for chunk in chunks],
+            })
+        except DatabaseError:
+            return set()
 
-    def search_similar(self, query_embedding: List[float], limit: int = 2) -> List[Dict]:
+        stored = {row[0]: tuple(row[1:]) for row in result.result_rows}
+        return {
+            chunk["chunk_id"] for chunk in chunks
+            if stored.get(chunk["chunk_id"]) == (chunk["content_hash"], chunk["title"] or "", chunk["url"] or "")
+        }
+
+    def copy_documents(self, chunk_ids: List[str], task_ids: List[int], table_name: str):
+        """
+        Копирует чанки из основной таблицы в table_name на стороне сервера (INSERT ... SELECT):
+        эмбеддинги не передаются по сети.
+        """
+        columns = ", ".join(COLUMNS)
+        self.client.command(f"""
+            INSERT INTO {table_name} ({columns})
+            SELECT {columns}
+            FROM {self.table_name}
+            WHERE task_id IN {{task_ids:Array(UInt64)}} AND chunk_id IN {{chunk_ids:Array(String)}}
+        """, parameters={"task_ids": list(set(task_ids)), "chunk_ids": chunk_ids})
+
+    def replace_documents(self, documents: Iterable[Dict], vector_index: bool = False, block_size: int = 10_000):
+        """
+        Атомарно заменяет содержимое таблицы: документы записываются в теневую таблицу,
+        которая затем меняется местами с основной (EXCHANGE TABLES). Поиск по старой версии
+        работает всё время записи и не видит промежуточного состояния.
+
+        documents может быть генератором: документы читаются по мере записи и вставляются
+        блоками по block_size строк, поэтому весь корпус в памяти не держится.
+
+        Чанки с unchanged=True (см. get_unchanged_chunk_ids) не передаются из Python: они копируются
+        из основной таблицы в теневую запросом INSERT ... SELECT на сервере. Остальная стоимость
+        переиндексации по-прежнему пропорциональна размеру корпуса, но не пересылает его по сети:
+        чтение и нарезка всех документов на клиенте, один запрос метаданных на пачку чанков,
+        копирование неизменных строк внутри ClickHouse, построение индексов теневой таблицы и подмена.
+        """
+        shadow_table = self.shadow_table_name
+        self.create_table(vector_index=vector_index, table_name=shadow_table)
+
+        block, unchanged = [], []
+        for document in documents:
+            if document.get("unchanged"):
+                unchanged.append(document)
+                if len(unchanged) >= block_size:
+                    self._copy_block(unchanged, shadow_table)
+                    unchanged = []
+                continue
+            block.append(document)
+            if len(block) >= block_size:
+                self.add_documents(block, table_name=shadow_table)
+                block = []
+        if block:
+            self.add_documents(block, table_name=shadow_table)
+        if unchanged:
+            self._copy_block(unchanged, shadow_table)
+
+        table_exists = self.client.command(f"EXISTS TABLE {self.table_name}")
+        if int(table_exists):
+            self.client.command(f"EXCHANGE TABLES {self.table_name} AND {shadow_table}")
+            self.client.command(f"DROP TABLE IF EXISTS {shadow_table}")
+        else:
+            self.client.command(f"RENAME TABLE {shadow_table} TO {self.table_name}")
+
+    def _copy_block(self, documents: List[Dict], table_name: str):
+        self.copy_documents([doc["chunk_id"] for doc in documents], [doc["task_id"] for doc in documents], table_name)
+
+    @timed("clickhouse.get_corpus_version")
+    def get_corpus_version(self) -> str:
+        """
+        Версия корпуса: случайный идентификатор в комментарии таблицы. Он задаётся при создании
+        таблицы (новая версия из replace_documents приходит вместе с теневой таблицей) и меняется
+        при add_documents в основную таблицу. Фоновые слияния кусков ClickHouse версию не меняют,
+        поэтому кэши, зависящие от содержимого таблицы, сбрасываются только после записи.
+        """
+        database, _, table = self.table_name.rpartition(".")
+        result = self.client.query("""
+            SELECT comment
+            FROM system.tables
+            WHERE database = if({database:String} = '', currentDatabase(), {database:String})
+                AND name = {table:String}
+        """, parameters={"database": database, "table": table})
+
+        return result.result_rows[0][0] if result.result_rows else ""
+
+    def _search_settings(self, exact: bool) -> str:
+        """SETTINGS для поискового запроса: точный просмотр или параметры HNSW-поиска."""
+        if exact:
+            # Игнорируем векторный индекс — полный просмотр с точным результатом
+            return "SETTINGS use_skip_indexes = 0"
+        if self.hnsw_candidate_list_size_for_search:
+            return f"SETTINGS hnsw_candidate_list_size_for_search = {int(self.hnsw_candidate_list_size_for_search)}"
+        return ""
+
+    @staticmethod
+    def _similar_query(query_parameter: str, with_embeddings: bool, collapse: str) -> str:
+        """
+        SQL поиска ближайших чанков к вектору из параметра query_parameter.
+        Параметры запроса: table, candidates (сколько чанков отобрать) и limit (при свёртке по задачам).
+        """
+        # Вектор передаётся типизированным параметром: текст запроса не меняется от вызова к вызову,
+        # и серверу не нужно разбирать литерал из сотен чисел
+        query = f"""
+            SELECT chunk_id, task_id, chunk_index, title, url, text,
+                cosineDistance(embedding, {{{query_parameter}:Array(Float32)}}) AS dist
+                {", embedding" if with_embeddings else ""}
+            FROM {{table:Identifier}}
+            ORDER BY dist ASC
+            LIMIT {{candidates:UInt32}}
         """
-        Ищет ближайшие по косинусному расстоянию документы.
+        if collapse != "none":
+            # Кандидаты отбираются с запасом (по индексу), затем остаётся лучший чанк каждой задачи
+            query = f"""
+                SELECT * FROM ({query})
+                ORDER BY dist ASC
+                LIMIT 1 BY task_id
+                LIMIT {{limit:UInt32}}
+            """
+        return query
+
+    @timed("clickhouse.search_similar")
+    def search_similar(self, query_embedding: List[float], limit: int = 2, exact: bool = False,
+                       with_embeddings: bool = False, collapse: str = "none",
+                       neighbours: int = 1, overfetch: int = 5) -> List[Dict]:
+        """
+        Ищет ближайшие по косинусному расстоянию чанки.
+
+        Если таблица создана с векторным индексом, ClickHouse использует его для
+        ORDER BY cosineDistance(...) LIMIT N — поиск приближённый, но без полного просмотра.
 
         Parameters:
             query_embedding (List[float]): Вектор-эмбеддинг поискового запроса.
-            limit (int): Количество возвращаемых документов.
+            limit (int): Количество возвращаемых результатов (при свёртке — различных задач).
+            exact (bool): Не использовать векторный индекс (точный поиск полным просмотром).
+            with_embeddings (bool): Вернуть сохранённые эмбеддинги чанков (поле embedding).
+            collapse (str): Свёртка по задачам: "none" — чанки как есть (задача может повторяться),
+                "best" — лучший чанк каждой задачи, "merge" — лучший чанк, склеенный
+                с neighbours соседними чанками с каждой стороны.
+            neighbours (int): Сколько соседних чанков присоединять в режиме "merge".
+            overfetch (int): Во сколько раз больше чанков-кандидатов отбирать перед свёрткой.
 
         Returns:
-            List[Dict]: Список найденных документов с полями id, title, url, text.
+            List[Dict]: Список найденных документов с полями chunk_id, task_id, chunk_index,
+                title, url, text, score (и embedding, если запрошено). В режиме "merge"
+                text — склейка чанков, а chunk_indexes — номера вошедших в неё чанков.
         """
-        query_str = ",".join(map(str, query_embedding))
-        result = self.client.query(f"""
-            SELECT id, title, url, text, cosineDistance(embedding, [{query_str}]) AS dist
-            FROM {self.table_name}
-            ORDER BY dist ASC
-            LIMIT {limit}
-        """)
-
-        return [
-            {
-                "id": row[0],
-                "title": row[1],
-                "url": row[2],
-                "text": row[3],
-                "score": row[4]
+        if collapse not in COLLAPSE_MODES:
+            raise ValueError(f"Неизвестный режим свёртки: {collapse}. Допустимо: {COLLAPSE_MODES}")
+
+        result = self.client.query(
+            f"{self._similar_query('query_embedding', with_embeddings, collapse)} {self._search_settings(exact)}",
+            parameters={
+                "query_embedding": list(query_embedding),
+                "table": self.table_name,
+                "candidates": limit if collapse == "none" else limit * max(overfetch, 1),
+                "limit": limit,
+            }
+        )
+
+        documents = self._to_documents(result.result_rows, with_embeddings)
+        if collapse == "merge" and documents:
+            self._merge_neighbours(documents, neighbours)
+
+        return documents
+
+    @staticmethod
+    def _to_documents(rows: List[tuple], with_embeddings: bool) -> List[Dict]:
+        """Строки результата (chunk_id, task_id, chunk_index, title, url, text, dist[, embedding]) в словари."""
+        documents = []
+        for row in rows:
+            document = {
+                "chunk_id": row[0],
+                "task_id": row[1],
+                "chunk_index": row[2],
+                "title": row[3],
+                "url": row[4],
+                "text": row[5],
+                "score": row[6]
             }
-            for row in result.result_rows
-        ]
\ No newline at end of file
+            if with_embeddings:
+                document["embedding"] = row[7]
+            documents.append(document)
+        return documents
+
+    @timed("clickhouse.search_similar_batch")
+    def search_similar_batch(self, query_embeddings: List[List[float]], limit: int = 2, exact: bool = False,
+                             with_embeddings: bool = False, collapse: str = "none",
+                             neighbours: int = 1, overfetch: int = 5,
+                             queries_per_statement: int = 100) -> List[List[Dict]]:
+        """
+        Ищет ближайшие чанки сразу для нескольких запросов: один SQL-запрос (UNION ALL поисков
+        по каждому вектору) вместо запроса на каждый вектор. Подходит для оценочных прогонов
+        и расширения запроса несколькими формулировками.
+
+        Каждая часть UNION ALL — тот же ORDER BY cosineDistance(...) LIMIT N, что и в search_similar,
+        поэтому используется векторный индекс, а сервер выполняет части параллельно.
+        Вариант с ARRAY JOIN по массиву векторов и LIMIT BY query_index считает расстояния
+        лямбдой без векторизации и сортирует все строки: на 100k чанков он в 2–3 раза медленнее.
+
+        Parameters:
+            query_embeddings (List[List[float]]): Эмбеддинги запросов.
+            queries_per_statement (int): Максимум векторов в одном SQL-запросе (ограничение max_query_size).
+            Остальные параметры — как у search_similar; в режиме "merge" соседние чанки
+            догружаются отдельным запросом для каждого вектора.
+
+        Returns:
+            List[List[Dict]]: Результаты для каждого запроса в порядке query_embeddings.
+        """
+        if collapse not in COLLAPSE_MODES:
+            raise ValueError(f"Неизвестный режим свёртки: {collapse}. Допустимо: {COLLAPSE_MODES}")
+
+        groups = [[] for _ in query_embeddings]
+        for start in range(0, len(query_embeddings), queries_per_statement):
+            batch = query_embeddings[start:start + queries_per_statement]
+            query = " UNION ALL ".join(
+                f"SELECT {start + i} AS query_index, * FROM ({self._similar_query(f'query_{i}', with_embeddings, collapse)})"
+                for i in range(len(batch))
+            )
+            result = self.client.query(f"{query} {self._search_settings(exact)}", parameters={
+                **{f"query_{i}": list(query_embedding) for i, query_embedding in enumerate(batch)},
+                "table": self.table_name,
+                "candidates": limit if collapse == "none" else limit * max(overfetch, 1),
+                "limit": limit,
+            })
+
+            # Части UNION ALL приходят в произвольном порядке, внутри части — по возрастанию расстояния
+            for row in result.result_rows:
+                groups[row[0]].extend(self._to_documents([row[1:]], with_embeddings))
+
+        for documents in groups:
+            documents.sort(key=lambda document: document["score"])
+            if collapse == "merge" and documents:
+                self._merge_neighbours(documents, neighbours)
+
+        return groups
+
+    @timed("clickhouse.search_hybrid")
+    def search_hybrid(self, query_embedding: List[float], query_text: str, limit: int = 2,
+                      exact: bool = False, with_embeddings: bool = False, collapse: str = "none",
+                      neighbours: int = 1, overfetch: int = 5, rrf_k: int = 60) -> List[Dict]:
+        """
+        Гибридный поиск: векторный (cosineDistance) и лексический (hasToken по словам запроса)
+        выполняются одним SQL-запросом, списки объединяются reciprocal rank fusion:
+        rrf = Σ 1 / (rrf_k + ранг чанка в списке).
+
+        Лексический список находит то, что плохо ловят эмбеддинги: номера задач (совпадение с task_id),
+        названия полей, коды ошибок. Чанки в нём ранжируются по числу совпавших слов запроса,
+        при равенстве — по косинусному расстоянию. Кандидаты выбираются двумя ветвями, чтобы каждое
+        условие отбирало по индексу: hasToken по словам запроса (Bloom-фильтр tokenbf_v1 из create_table
+        пропускает гранулы без этих слов) и task_id IN (числа запроса) по первичному ключу.
+
+        Parameters:
+            query_embedding (List[float]): Вектор-эмбеддинг поискового запроса.
+            query_text (str): Текст запроса для лексического поиска.
+            rrf_k (int): Сглаживание RRF: чем больше, тем меньше вес первых мест каждого списка.
+            Остальные параметры — как у search_similar; каждый список берёт limit * overfetch кандидатов.
+
+        Returns:
+            List[Dict]: Документы как у search_similar (score — косинусное расстояние)
+                плюс rrf — итоговая оценка слияния.
+        """
+        if collapse not in COLLAPSE_MODES:
+            raise ValueError(f"Неизвестный режим свёртки: {collapse}. Допустимо: {COLLAPSE_MODES}")
+
+        tokens = lexical_tokens(query_text)
+        if not tokens:
+            return self.search_similar(query_embedding, limit=limit, exact=exact, with_embeddings=with_embeddings,
+                                       collapse=collapse, neighbours=neighbours, overfetch=overfetch)
+
+        # Каждый токен — отдельный параметр: hasToken принимает только константу
+        parameters = {f"token_{i}": token for i, token in enumerate(tokens)}
+        has_tokens = [f"hasToken({LEXICAL_EXPRESSION}, {{token_{i}:String}})" for i in range(len(tokens))]
+        # Числа запроса могут быть номерами задач; в сумму совпадений входит и совпадение с task_id
+        token_matches = [
+            f"({has_token} OR toString(task_id) = {{token_{i}:String}})" for i, has_token in enumerate(has_tokens)
+        ]
+        task_ids = [int(token) for token in tokens if token.isascii() and token.isdigit() and len(token) <= 19]
+
+        embedding_column = ", embedding" if with_embeddings else ""
+        columns = f"""chunk_id, task_id, chunk_index, title, url, text,
+                cosineDistance(embedding, {{query_embedding:Array(Float32)}}) AS dist{embedding_column}"""
+        lexical_columns = f"{columns}, {' + '.join(token_matches)} AS matches"
+        # Условие hasToken не смешивается с другими — иначе индекс text_idx не может пропустить гранулы
+        lexical_candidates = f"""
+                    SELECT {lexical_columns}
+                    FROM {{table:Identifier}}
+                    WHERE {" OR ".join(has_tokens)}"""
+        if task_ids:
+            lexical_candidates += f"""
+                    UNION ALL
+                    SELECT {lexical_columns}
+                    FROM {{table:Identifier}}
+                    WHERE task_id IN {{task_ids:Array(UInt64)}}"""
+            parameters["task_ids"] = task_ids
+
+        result = self.client.query(f"""
+            SELECT chunk_id, task_id, chunk_index, title, url, text, min(dist) AS distance
+                {", any(embedding)" if with_embeddings else ""},
+                sum(1 / ({{rrf_k:UInt32}} + rank)) AS rrf
+            FROM (
+                SELECT *, row_number() OVER (ORDER BY dist ASC) AS rank
+                FROM (
+                    SELECT {columns}
+                    FROM {{table:Identifier}}
+                    ORDER BY dist ASC
+                    LIMIT {{candidates:UInt32}}
+                )
+                UNION ALL
+                SELECT * EXCEPT (matches), row_number() OVER (ORDER BY matches DESC, dist ASC) AS rank
+                FROM (
+                    SELECT *
+                    FROM ({lexical_candidates}
+                    )
+                    ORDER BY matches DESC, dist ASC
+                    LIMIT 1 BY chunk_id
+                    LIMIT {{candidates:UInt32}}
+                )
+            )
+            GROUP BY chunk_id, task_id, chunk_index, title, url, text
+            ORDER BY rrf DESC, distance ASC
+            {"LIMIT 1 BY task_id" if collapse != "none" else ""}
+            LIMIT {{limit:UInt32}}
+            {self._search_settings(exact)}
+        """, parameters={
+            **parameters,
+            "query_embedding": list(query_embedding),
+            "table": self.table_name,
+            "candidates": limit * max(overfetch, 1),
+            "limit": limit,
+            "rrf_k": rrf_k,
+        })
+
+        documents = self._to_documents(result.result_rows, with_embeddings)
+        for document, row in zip(documents, result.result_rows):
+            document["rrf"] = row[-1]
+
+        if collapse == "merge" and documents:
+            self._merge_neighbours(documents, neighbours)
+
+        return documents
+
+    def _merge_neighbours(self, documents: List[Dict], neighbours: int):
+        """Заменяет текст лучшего чанка каждой задачи склейкой с соседними чанками (по порядку)."""
+        task_ids = [doc["task_id"] for doc in documents]
+        result = self.client.query("""
+            SELECT task_id, chunk_index, text
+            FROM {table:Identifier}
+            WHERE task_id IN {task_ids:Array(UInt64)}
+                AND abs(toInt64(chunk_index)
+                    - toInt64(transform(task_id, {task_ids:Array(UInt64)}, {chunk_indexes:Array(UInt32)}, 0)))
+                    <= {neighbours:UInt32}
+            ORDER BY task_id, chunk_index
+        """, parameters={
+            "table": self.table_name,
+            "task_ids": task_ids,
+            "chunk_indexes": [doc["chunk_index"] for doc in documents],
+            "neighbours": neighbours,
+        })
+
+        chunks = {}
+        for task_id, chunk_index, text in result.result_rows:
+            chunks.setdefault(task_id, []).append((chunk_index, text))
+
+        for doc in documents:
+            parts = chunks.get(doc["task_id"]) or [(doc["chunk_index"], doc["text"])]
+            doc["chunk_indexes"] = [chunk_index for chunk_index, _ in parts]
+            doc["text"] = "\n".join(text for _, text in parts)
@@ -0,0 +1,139 @@
+# src/context_builder.py
+# Сборка контекста для LLM: бюджет токенов, удаление почти одинаковых фрагментов, обрезка по предложениям
+import math
+import os
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Tuple
+
+# Части слов и знаки препинания: грубая, но стабильная модель токенизатора YandexGPT
+TOKEN_PIECE_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+# Граница предложения: знак конца предложения с пробелом или перевод строки (пункты списков, заголовки)
+SENTENCE_BOUNDARY_PATTERN = re.compile(r"(?<=[.!?…])\s+|\n+")
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=10_000)
+def estimate_tokens(text: str, chars_per_token: float = 4.0) -> int:
+    """
+    Оценка числа токенов без обращения к API: слово длиной n — ceil(n / chars_per_token) токенов,
+    знак препинания — один токен. Результат кэшируется: тексты чанков повторяются от запроса к запросу.
+    """
+    return sum(
+        math.ceil(len(piece) / chars_per_token) if piece[0].isalnum() or piece[0] == "_" else 1
+        for piece in TOKEN_PIECE_PATTERN.findall(text)
+    )
+
+
+def shingles(text: str, size: int = 3) -> frozenset:
+    """Множество последовательностей из size слов (в нижнем регистре) — для сравнения фрагментов."""
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < size:
+        return frozenset([tuple(words)])
+    return frozenset(tuple(words[i:i + size]) for i in range(len(words) - size + 1))
+
+
+class ContextBuilder:
+    """
+    Собирает контекст промпта из найденных чанков.
+
+    - Чанки берутся в порядке релевантности (как их вернул поиск).
+    - Почти одинаковые фрагменты (доля общих триграмм слов не ниже duplicate_threshold) отбрасываются:
+      одна и та же инструкция часто повторяется в нескольких задачах.
+    - Контекст не превышает max_tokens: чанк, который не помещается целиком, обрезается по границе предложения,
+      остальные отбрасываются.
+
+    Переменные окружения:
+    - RAG_CONTEXT_TOKENS (2000) — бюджет токенов контекста
+    """
+
+    SEPARATOR = "\n\n"
+
+    def __init__(self,
+                 max_tokens: int = None,
+                 duplicate_threshold: float = 0.8,
+                 min_fragment_tokens: int = 30,
+                 token_counter: Callable[[str], int] = None
+                 ):
+        """
+        :param max_tokens: Бюджет токенов контекста.
+        :param duplicate_threshold: Коэффициент Жаккара триграмм слов, начиная с которого фрагмент — дубликат.
+        :param min_fragment_tokens: Обрезанный чанк короче этого не добавляется (обрывок без смысла).
+        :param token_counter: Функция подсчёта токенов (например, токенизатор модели); по умолчанию — estimate_tokens.
+        """
+        self.max_tokens = max_tokens or int(os.getenv("RAG_CONTEXT_TOKENS", "2000"))
+        if self.max_tokens <= 0:
+            raise ValueError("RAG_CONTEXT_TOKENS должен быть положительным.")
+        if not 0 < duplicate_threshold <= 1:
+            raise ValueError("duplicate_threshold должен быть в диапазоне (0, 1].")
+
+        self.duplicate_threshold = duplicate_threshold
+        self.min_fragment_tokens = min_fragment_tokens
+        self.count_tokens = token_counter or estimate_tokens
+        self.separator_tokens = self.count_tokens(self.SEPARATOR)
+
+        self.requests = 0
+        self.saved_tokens = 0
+
+    def is_duplicate(self, candidate: frozenset, selected: List[frozenset]) -> bool:
+        for other in selected:
+            union = len(candidate | other)
+            if union and len(candidate & other) / union >= self.duplicate_threshold:
+                return True
+        return False
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Начало текста из целых предложений, укладывающееся в max_tokens (пустая строка, если не влезает ни одно)."""
+        sentences = SENTENCE_BOUNDARY_PATTERN.split(text)
+        boundaries = [match.group() for match in SENTENCE_BOUNDARY_PATTERN.finditer(text)] + [""]
+
+        parts, used = [], 0
+        for sentence, boundary in zip(sentences, boundaries):
+            tokens = self.count_tokens(sentence)
+            if used + tokens > max_tokens:
+                break
+            parts.append(sentence + boundary)
+            used += tokens + self.count_tokens(boundary)
+        return "".join(parts).rstrip()
+
+    def build(self, documents: List[Dict[str, Any]]) -> Tuple[str, Dict[str, int]]:
+        """
+        Контекст из документов (в порядке релевантности).
+
+        :return: Текст контекста и статистика: tokens_before, tokens_after, duplicates, truncated, dropped.
+        """
+        stats = {"tokens_before": 0, "tokens_after": 0, "duplicates": 0, "truncated": 0, "dropped": 0}
+        passages, selected_shingles = [], []
+        budget = self.max_tokens
+
+        for doc in documents:
+            text = doc["text"].strip()
+            tokens = self.count_tokens(text)
+            stats["tokens_before"] += tokens + (self.separator_tokens if stats["tokens_before"] else 0)
+
+            doc_shingles = shingles(text)
+            if self.is_duplicate(doc_shingles, selected_shingles):
+                stats["duplicates"] += 1
+                continue
+
+            separator = self.separator_tokens if passages else 0
+            if tokens + separator > budget:
+                text = self.truncate(text, budget - separator)
+                tokens = self.count_tokens(text)
+                if tokens < self.min_fragment_tokens:
+                    stats["dropped"] += 1
+                    continue
+                stats["truncated"] += 1
+
+            passages.append(text)
+            selected_shingles.append(doc_shingles)
+            budget -= tokens + separator
+
+        context = self.SEPARATOR.join(passages)
+        stats["tokens_after"] = self.max_tokens - budget
+
+        self.requests += 1
+        self.saved_tokens += stats["tokens_before"] - stats["tokens_after"]
+        return context, stats
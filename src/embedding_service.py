@@ -1,14 +1,26 @@
 from yandex_cloud_ml_sdk import YCloudML
-from typing import List
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+import hashlib
 import os
+import random
+import threading
+import time
 from dotenv import load_dotenv
 from pathlib import Path
 
+from src.cache_service import DiskLRUCache
+from src.metrics_service import timed
+
 
 # Загружаем переменные из .env файла
 env_path = Path(__file__).parent.parent / ".env"
 load_dotenv(dotenv_path=env_path)
 
+# Кэш эмбеддингов по умолчанию; пустая переменная EMBEDDING_CACHE_PATH отключает кэш
+DEFAULT_CACHE_PATH = str(Path(__file__).parent.parent / ".cache" / "embeddings.sqlite")
+
 
 class YandexEmbeddingService:
     """
@@ -16,9 +28,35 @@ class YandexEmbeddingService:
     Переменные окружения берутся из .env файла в корне проекта:
     - FOLDER_ID
     - IAM_TOKEN
+    - EMBEDDING_CACHE_PATH (необязательно) — файл кэша эмбеддингов, пустое значение отключает кэш
+
+    Эмбеддинги кэшируются по (модель, doc/query, sha256 текста): повторная векторизация
+    того же текста не обращается к API.
     """
 
-    def __init__(self, folder_id: str = None, iam_token: str = None):
+    # Коды ошибок, после которых запрос имеет смысл повторить
+    RETRYABLE_ERRORS = ("RESOURCE_EXHAUSTED", "UNAVAILABLE", "DEADLINE_EXCEEDED", "429", "Too Many Requests")
+
+    def __init__(self,
+                 folder_id: str = None,
+                 iam_token: str = None,
+                 max_workers: int = 8,
+                 max_retries: int = 5,
+                 retry_backoff: float = 0.5,
+                 max_retry_backoff: float = 30.0,
+                 cache: Optional[DiskLRUCache] = None,
+                 use_cache: bool = True
+                 ):
+        """
+        :param folder_id: Идентификатор каталога в Yandex Cloud.
+        :param iam_token: Токен доступа.
+        :param max_workers: Максимум одновременных запросов в embed_texts.
+        :param max_retries: Число повторов при превышении лимита запросов и временных ошибках.
+        :param retry_backoff: Начальная пауза перед повтором, секунды (удваивается с каждой попыткой).
+        :param max_retry_backoff: Максимальная пауза перед повтором, секунды.
+        :param cache: Кэш эмбеддингов. По умолчанию — файл из EMBEDDING_CACHE_PATH.
+        :param use_cache: False отключает кэш.
+        """
         # Позволяет передать значения вручную (для тестов), иначе берёт из .env
         self.folder_id = folder_id or os.getenv("FOLDER_ID")
         self.iam_token = iam_token or os.getenv("IAM_TOKEN")
@@ -32,10 +70,113 @@ class YandexEmbeddingService:
         self.doc_model = self.sdk.models.text_embeddings("doc")
         self.query_model = self.sdk.models.text_embeddings("query")
 
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+
+        if cache is None and use_cache:
+            cache_path = os.getenv("EMBEDDING_CACHE_PATH", DEFAULT_CACHE_PATH)
+            cache = DiskLRUCache(cache_path, name="embedding") if cache_path else None
+        self.cache = cache
+        self.api_calls = 0
+        self._api_calls_lock = threading.Lock()
+
+    @staticmethod
+    def _cache_key(model, text: str) -> str:
+        """Ключ кэша: URI модели (включает doc/query) и хэш текста."""
+        model_name = getattr(model, "uri", None) or str(model)
+        return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _encode(embedding: List[float]) -> bytes:
+        return array("f", embedding).tobytes()
+
+    @staticmethod
+    def _decode(value: bytes) -> List[float]:
+        embedding = array("f")
+        embedding.frombytes(value)
+        return embedding.tolist()
+
+    def _is_retryable(self, error: Exception) -> bool:
+        """Проверяет, что ошибка временная (лимит запросов, недоступность сервиса)."""
+        code = getattr(error, "code", None)
+        if callable(code):
+            try:
+                code = code()
+            except Exception:
+                code = None
+        description = f"{getattr(code, 'name', code)} {error}"
+        return any(marker in description for marker in self.RETRYABLE_ERRORS)
+
+    def _run_with_retry(self, model, text: str) -> List[float]:
+        """Вызывает модель, повторяя запрос с экспоненциальной паузой и случайным разбросом."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self._api_calls_lock:
+                    self.api_calls += 1
+                return model.run(text).embedding
+            except Exception as e:
+                if attempt == self.max_retries or not self._is_retryable(e):
+                    raise
+                delay = min(self.max_retry_backoff, self.retry_backoff * 2 ** attempt)
+                time.sleep(delay * random.uniform(0.5, 1.0))
+
+    @timed("embedding.embed_texts")
+    def embed_texts(self, texts: List[str], query: bool = False) -> List[List[float]]:
+        """
+        Генерирует эмбеддинги для списка текстов параллельно (не более max_workers запросов сразу).
+        Порядок результатов совпадает с порядком texts.
+
+        :param texts: Тексты для векторизации.
+        :param query: Использовать query-модель вместо doc-модели.
+        """
+        if not texts:
+            return []
+
+        model = self.query_model if query else self.doc_model
+
+        embeddings = {}
+        missing = []
+        for text in dict.fromkeys(texts):
+            cached = self._get_cached(model, text)
+            if cached is not None:
+                embeddings[text] = cached
+            else:
+                missing.append(text)
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing))) as executor:
+                for text, embedding in zip(missing, executor.map(lambda t: self._run_with_retry(model, t), missing)):
+                    embeddings[text] = embedding
+                    self._set_cached(model, text, embedding)
+
+        return [embeddings[text] for text in texts]
+
+    def _get_cached(self, model, text: str) -> Optional[List[float]]:
+        if self.cache is None:
+            return None
+        value = self.cache.get(self._cache_key(model, text))
+        return self._decode(value) if value is not None else None
+
+    def _set_cached(self, model, text: str, embedding: List[float]):
+        if self.cache is not None:
+            self.cache.set(self._cache_key(model, text), self._encode(embedding))
+
+    def _embed(self, model, text: str) -> List[float]:
+        """Эмбеддинг одного текста: из кэша или через API."""
+        embedding = self._get_cached(model, text)
+        if embedding is None:
+            embedding = self._run_with_retry(model, text)
+            self._set_cached(model, text, embedding)
+        return embedding
+
+    @timed("embedding.embed_text")
     def embed_text(self, text: str) -> List[float]:
         """Генерирует эмбеддинг для документа."""
-        return self.doc_model.run(text).embedding
+        return self._embed(self.doc_model, text)
 
+    @timed("embedding.embed_query")
     def embed_query(self, query: str) -> List[float]:
         """Генерирует эмбеддинг для поискового запроса."""
-        return self.query_model.run(query).embedding
\ No newline at end of file
+        return self._embed(self.query_model, query)
\ No newline at end of file
@@ -0,0 +1,182 @@
+# src/evaluation_service.py
+# Фоновая очередь для оценки ответов и отправки телеметрии после ответа пользователю
+import atexit
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+from src.metrics_service import metrics
+
+
+class EvaluationQueue:
+    """
+    Ограниченная очередь задач, выполняемых фоновыми потоками.
+
+    Используется для работы, которая не нужна для ответа пользователю: оценка семантического
+    покрытия, обновление трасс Langfuse. Ответ отправляется сразу, задача выполняется позже.
+
+    Политики при переполнении (overflow_policy):
+    - "drop_new" — новая задача отбрасывается;
+    - "drop_oldest" — отбрасывается самая старая задача из очереди;
+    - "block" — вызывающий ждёт освобождения места не дольше block_timeout, затем задача отбрасывается.
+
+    Метрики: счётчики evaluation.submitted, .processed, .failed, .dropped и текущие значения
+    evaluation.queue_size, .lag_p50_seconds, .lag_max_seconds (задержка от постановки до начала выполнения
+    по последним lag_window задачам). При остановке итоговая статистика печатается в лог.
+    """
+
+    POLICIES = ("drop_new", "drop_oldest", "block")
+
+    def __init__(self,
+                 workers: int = 1,
+                 max_size: int = 100,
+                 overflow_policy: str = "drop_oldest",
+                 block_timeout: float = 1.0,
+                 lag_window: int = 1000
+                 ):
+        """
+        :param workers: Число фоновых потоков.
+        :param max_size: Максимальная длина очереди.
+        :param overflow_policy: Что делать при переполнении: drop_new, drop_oldest или block.
+        :param block_timeout: Максимальное ожидание места в очереди для политики block, секунды.
+        :param lag_window: Сколько последних задержек хранить для статистики.
+        """
+        if overflow_policy not in self.POLICIES:
+            raise ValueError(f"Неизвестная политика переполнения: {overflow_policy}. Допустимо: {self.POLICIES}")
+
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+        self._queue = queue.Queue(maxsize=max_size)
+        self._lags = deque(maxlen=lag_window)
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self.submitted = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"evaluation-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+        atexit.register(self.shutdown)
+
+    def submit(self, job: Callable, *args, **kwargs) -> bool:
+        """
+        Ставит задачу в очередь. Возвращает False, если задача отброшена.
+        Задача вызывается с дополнительным аргументом queue_lag — сколько секунд она ждала в очереди.
+        """
+        if self._closed:
+            return False
+
+        item = (time.monotonic(), job, args, kwargs)
+        with self._lock:
+            self.submitted += 1
+        metrics.inc("evaluation.submitted")
+
+        try:
+            if self.overflow_policy == "block":
+                self._queue.put(item, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(item)
+            metrics.set_gauge("evaluation.queue_size", self._queue.qsize())
+            return True
+        except queue.Full:
+            pass
+
+        if self.overflow_policy == "drop_oldest":
+            try:
+                self._queue.get_nowait()
+                self._queue.task_done()
+                self._count_dropped()
+                self._queue.put_nowait(item)
+                metrics.set_gauge("evaluation.queue_size", self._queue.qsize())
+                return True
+            except (queue.Empty, queue.Full):
+                pass
+
+        self._count_dropped()
+        return False
+
+    def _count_dropped(self):
+        with self._lock:
+            self.dropped += 1
+        metrics.inc("evaluation.dropped")
+        print("⚠️ Очередь оценки переполнена, задача отброшена")
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+
+            submitted_at, job, args, kwargs = item
+            lag = time.monotonic() - submitted_at
+            try:
+                job(*args, queue_lag=lag, **kwargs)
+                with self._lock:
+                    self.processed += 1
+                metrics.inc("evaluation.processed")
+            except Exception as e:
+                with self._lock:
+                    self.failed += 1
+                metrics.inc("evaluation.failed")
+                print(f"⚠️ Ошибка фоновой оценки: {e}")
+            finally:
+                with self._lock:
+                    self._lags.append(lag)
+                self._publish_lag()
+                self._queue.task_done()
+
+    def _publish_lag(self):
+        """Длина очереди и задержка задач в метрики (квантили считаются в фоновом потоке, после задачи)."""
+        if not metrics.enabled:
+            return
+        stats = self.stats()
+        metrics.set_gauge("evaluation.queue_size", stats["queue_size"])
+        metrics.set_gauge("evaluation.lag_p50_seconds", stats["lag_p50_seconds"])
+        metrics.set_gauge("evaluation.lag_max_seconds", stats["lag_max_seconds"])
+
+    def flush(self):
+        """Ждёт выполнения всех задач, поставленных в очередь."""
+        self._queue.join()
+
+    def shutdown(self):
+        """Дорабатывает очередь и останавливает потоки. Новые задачи после этого не принимаются."""
+        if self._closed:
+            return
+        self._closed = True
+
+        self.flush()
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+
+        stats = self.stats()
+        print(f"📊 Очередь оценки: выполнено {stats['processed']}, ошибок {stats['failed']}, "
+              f"отброшено {stats['dropped']}, задержка p50 {stats['lag_p50_seconds']:.2f} с, "
+              f"max {stats['lag_max_seconds']:.2f} с")
+
+    def stats(self) -> dict:
+        """Счётчики и задержка от постановки задачи до начала её выполнения."""
+        with self._lock:
+            lags = sorted(self._lags)
+            counters = {
+                "submitted": self.submitted,
+                "processed": self.processed,
+                "failed": self.failed,
+                "dropped": self.dropped,
+            }
+
+        counters["queue_size"] = self._queue.qsize()
+        counters["lag_p50_seconds"] = lags[len(lags) // 2] if lags else 0.0
+        counters["lag_max_seconds"] = lags[-1] if lags else 0.0
+        return counters
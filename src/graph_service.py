@@ -1,11 +1,19 @@
-from typing import TypedDict, Annotated
+import asyncio
+import time
+from functools import partial, wraps
+from typing import TypedDict, Annotated, AsyncIterator, Iterator, Tuple, Any
 from langchain_core.prompts import PromptTemplate
 from langgraph.graph import StateGraph, END
+from langgraph.types import StreamWriter
 
-from src.rag_service import RAGService
-from src.llm_service import LLMService
-from src.ocr_service import OCRService
-from src.prompt_service import PromptService
+from src.metrics_service import metrics
+from src.prompt_service import get_template_version as prompt_template_version
+from src.service_container import ServiceContainer, get_container
+
+
+def merge_timings(left: dict, right: dict) -> dict:
+    """Редьюсер времени узлов: параллельные ветви дописывают свои замеры, не затирая чужие."""
+    return {**(left or {}), **(right or {})}
 
 
 # --- Состояние графа ---
@@ -14,20 +22,114 @@ class GraphState(TypedDict):
     relevants: list
     context: str
     response: str
-    image_data: str
+    image_data: bytes
+    image_id: str
     prompt_template: PromptTemplate
+    query_embedding: list
+    started_at: float
+    timings: Annotated[dict, merge_timings]
+
+
+ANSWER_TEMPLATE_PATH = 'prompts/answer_from_documents.txt'
+IMAGE_TEMPLATE_PATH = 'prompts/text_from_image_to_query.txt'
+
+
+def select_template_path(state: GraphState) -> str:
+    """Шаблон промпта зависит только от того, пришло ли изображение (текст которого может быть уже в кэше OCR)."""
+    if state["image_data"] or state.get("image_id"):
+        return IMAGE_TEMPLATE_PATH
+    return ANSWER_TEMPLATE_PATH
+
+
+def get_template_version(state: GraphState, container: ServiceContainer) -> str:
+    """
+    Версия шаблона: путь и хэш текста — ответы, полученные с другим шаблоном, не переиспользуются.
+    Если шаблон уже выбран (init_prompt), берётся версия именно того шаблона, с которым генерировался ответ.
+    """
+    if state.get("prompt_template") is not None:
+        return prompt_template_version(state["prompt_template"])
+    return container.prompt_registry.version(select_template_path(state))
+
+
+def timed_node(name: str):
+    """
+    Декоратор асинхронного узла: добавляет в обновление состояния время его выполнения (timings[name])
+    и записывает время и ошибки узла в метрики (операция node.<name>).
+    """
+    def decorator(node):
+        @wraps(node)
+        async def wrapper(state: GraphState, *args, **kwargs) -> dict:
+            start = time.perf_counter()
+            with metrics.timer(f"node.{name}"):
+                update = await node(state, *args, **kwargs)
+            return {**(update or {}), "timings": {name: time.perf_counter() - start}}
+        return wrapper
+    return decorator
 
 
 # --- Узлы графа ---
-def retrieve_rag_node(state: GraphState) -> dict:
+# Узлы асинхронные: блокирующие вызовы SDK и HTTP-клиентов уходят в поток (asyncio.to_thread),
+# поэтому ветви графа выполняются одновременно
+@timed_node("cache_lookup")
+async def cache_lookup_node(state: GraphState, container: ServiceContainer) -> dict:
+    """Поиск готового ответа на похожий вопрос в семантическом кэше."""
+    if state["response"] or not state["query"]:
+        return {}
+
+    # Эмбеддинг запроса считается один раз: он же используется для поиска документов.
+    # Версия корпуса (запрос к ClickHouse раз в corpus_version_ttl секунд) проверяется одновременно с ним
+    query_embedding, _ = await asyncio.gather(
+        asyncio.to_thread(container.embedding_service.embed_query, state["query"]),
+        asyncio.to_thread(container.answer_cache.corpus_version),
+    )
+    response = container.answer_cache.lookup(query_embedding, get_template_version(state, container), state["query"])
+
+    if response is not None:
+        stats = container.answer_cache.stats()
+        print(f"⚡ Ответ найден в кэше (попаданий {stats['hit_ratio']:.0%}, сэкономлено {stats['saved_seconds']:.1f} с)")
+        return {"response": response, "query_embedding": query_embedding}
+
+    return {"query_embedding": query_embedding, "started_at": time.time()}
+
+
+def decide_to_retrieve(state: GraphState) -> str:
+    """Завершает граф, если ответ уже есть (из кэша или сообщение об ошибке)."""
+    if state["response"]:
+        return "end"
+    return "retrieve"
+
+
+@timed_node("cache_store")
+async def cache_store_node(state: GraphState, container: ServiceContainer) -> dict:
+    """Сохранение ответа в семантический кэш (ответ-ошибка поиска без документов не сохраняется)."""
+    if state.get("query_embedding") and state["response"] and state["relevants"]:
+        container.answer_cache.store(
+            state["query_embedding"],
+            get_template_version(state, container),
+            state["response"],
+            latency=time.time() - state.get("started_at", time.time()),
+            query_text=state["query"]
+        )
+    return {}
+
+
+@timed_node("retrieve")
+async def retrieve_rag_node(state: GraphState, container: ServiceContainer) -> dict:
     """Поиск релевантных документов с помощью RAG."""
     print("🔍 Поиск релевантных документов...")
 
     if not state["query"]:
         return {"response": "❌ Запрос пуст. Невозможно выполнить поиск."}
 
-    rag_service = RAGService()
-    relevants = rag_service.search_relevant_documents(state["query"], top_k=3)
+    rag_service = container.rag_service
+    # Эмбеддинги чанков нужны для оценки покрытия ответа — берём сохранённые, а не векторизуем заново
+    relevants = await asyncio.to_thread(
+        rag_service.search_relevant_documents,
+        state["query"],
+        top_k=3,
+        with_embeddings=True,
+        query_embedding=state.get("query_embedding")
+    )
 
     if not relevants:
         return {"response": "❌ Релевантные документы не найдены."}
@@ -40,23 +142,34 @@ def retrieve_rag_node(state: GraphState) -> dict:
     }
 
 
-def decide_to_generate(state: GraphState) -> str:
-    """Решает, переходить ли к генерации или завершить граф."""
-    if state["response"]:
-        return "end"
-    return "generate"
-
-
-def generate_node(state: GraphState) -> dict:
+@timed_node("generate")
+async def generate_node(state: GraphState, container: ServiceContainer, writer: StreamWriter) -> dict:
     """Генерация ответа с помощью LLM и добавление информации 'Подробнее в задачах'."""
 
+    # Поиск завершился сообщением об ошибке — генерировать нечего
+    if state["response"]:
+        return {}
+
     if "prompt_template" not in state or state["prompt_template"] is None:
         return {"response": "❌ Не удалось сгенерировать ответ: отсутствует шаблон запроса."}
 
     print("🧠 Генерация ответа...")
 
-    llm_service = LLMService(model="yandexgpt-lite", prompt_template=state["prompt_template"])
-    response = llm_service.generate_response(question=state["query"], context=state["context"], state=state).strip()
+    llm_service = container.llm_service
+
+    # Фрагменты ответа передаются наружу по мере генерации (GraphService.stream);
+    # при обычном invoke writer ничего не делает
+    chunks = []
+    async for chunk in llm_service.astream_response(
+        question=state["query"],
+        context=state["context"],
+        state=state,
+        prompt_template=state["prompt_template"]
+    ):
+        chunks.append(chunk)
+        writer({"token": chunk})
+
+    response = "".join(chunks).strip()
 
     full_response = response
     if state["relevants"]:
@@ -70,17 +183,20 @@ def generate_node(state: GraphState) -> dict:
     return {"response": full_response}
 
 
-def ocr_image_node(state: GraphState) -> dict:
+@timed_node("ocr")
+async def ocr_image_node(state: GraphState, container: ServiceContainer) -> dict:
     """Распознавание текста на изображении и сохранение в query."""
     if not state["image_data"]:
         return {}
 
     print("🖼️ Распознавание текста на изображении...")
-    ocr_service = OCRService()
+    ocr_service = container.ocr_service
 
     try:
-        base64_data = state["image_data"].split(",")[1] if state["image_data"].startswith("data:image") else state["image_data"]
-        recognized_text = ocr_service.analyze_image(base64_data)
+        # Изображение передаётся байтами: в base64 оно кодируется один раз, при отправке в OCR
+        recognized_text = await asyncio.to_thread(
+            ocr_service.analyze_image, state["image_data"], image_id=state.get("image_id")
+        )
 
         if not recognized_text or not recognized_text.strip():
             return {"response": "⚠️ Не удалось распознать текст на изображении."}
@@ -91,66 +207,130 @@ def ocr_image_node(state: GraphState) -> dict:
         return {"response": f"⚠️ Ошибка при распознавании изображения: {e}"}
 
 
-def route_image_or_query(state: GraphState) -> str:
-    """Решает, нужно ли обрабатывать изображение или сразу переходить к поиску."""
+def route_image_or_query(state: GraphState) -> list:
+    """
+    Решает, нужно ли обрабатывать изображение или сразу переходить к поиску.
+    Подготовка промпта от поиска не зависит и запускается параллельной ветвью.
+    """
     if state["image_data"]:
-        return "ocr"
-    return "retrieve"
-
+        return ["ocr", "init_prompt"]
+    return ["cache_lookup", "init_prompt"]
 
-def init_prompt_template_node(state: GraphState) -> dict:
-    """Инициализация prompt_template в зависимости от наличия изображения."""
-    template_path = 'prompts/answer_from_documents.txt'
-    if state["image_data"]:
-        template_path = 'prompts/text_from_image_to_query.txt'
 
-    prompt_service = PromptService(template_path=template_path)
-    prompt_template = prompt_service.get_prompt_template()
+@timed_node("init_prompt")
+async def init_prompt_template_node(state: GraphState, container: ServiceContainer) -> dict:
+    """
+    Инициализация prompt_template в зависимости от наличия изображения и сборка цепочки промпт → LLM.
+    Выполняется параллельно с OCR и поиском; на первом запросе процесса здесь же создаётся LLM-клиент.
+    """
+    prompt_template = container.get_prompt_template(select_template_path(state))
+    await asyncio.to_thread(lambda: container.llm_service.get_chain(prompt_template))
 
     print("📝 Инициализация шаблона подстановки...")
     return {"prompt_template": prompt_template}
 
 
+def report_timings(timings: dict, wall_seconds: float):
+    """Печатает время узлов и сколько времени сэкономило параллельное выполнение ветвей; время графа — в метрики."""
+    metrics.observe("graph", wall_seconds)
+    if not timings:
+        return
+    total = sum(timings.values())
+    nodes = ", ".join(f"{name} {seconds * 1000:.0f} мс" for name, seconds in timings.items())
+    print(f"⏱️ Узлы: {nodes}; сумма {total * 1000:.0f} мс, граф {wall_seconds * 1000:.0f} мс "
+          f"(параллельно сэкономлено {max(total - wall_seconds, 0) * 1000:.0f} мс)")
+
+
 # --- Построение графа ---
 class GraphService:
-    def __init__(self):
+    def __init__(self, container: ServiceContainer = None):
+        """
+        :param container: Контейнер сервисов. По умолчанию — общий для процесса (get_container()).
+        """
+        self.container = container or get_container()
         self.app = self._compile_graph()
 
     def _compile_graph(self):
         workflow = StateGraph(GraphState)
 
-        workflow.add_node("ocr", ocr_image_node)
-        workflow.add_node("retrieve", retrieve_rag_node)
-        workflow.add_node("init_prompt", init_prompt_template_node)
-        workflow.add_node("generate", generate_node)
+        # Узлы получают сервисы из контейнера, а не создают клиентов на каждый запрос
+        workflow.add_node("ocr", partial(ocr_image_node, container=self.container))
+        workflow.add_node("cache_lookup", partial(cache_lookup_node, container=self.container))
+        workflow.add_node("retrieve", partial(retrieve_rag_node, container=self.container))
+        workflow.add_node("init_prompt", partial(init_prompt_template_node, container=self.container))
+        workflow.add_node("generate", partial(generate_node, container=self.container))
+        workflow.add_node("cache_store", partial(cache_store_node, container=self.container))
 
+        # Ветвление: поиск (с OCR для изображений) и подготовка промпта выполняются одновременно
         workflow.set_conditional_entry_point(
             route_image_or_query,
             {
                 "ocr": "ocr",
-                "retrieve": "retrieve"
+                "cache_lookup": "cache_lookup",
+                "init_prompt": "init_prompt"
             }
         )
 
-        workflow.add_edge("ocr", "retrieve")
+        workflow.add_edge("ocr", "cache_lookup")
 
         workflow.add_conditional_edges(
-            "retrieve",
-            decide_to_generate,
+            "cache_lookup",
+            decide_to_retrieve,
             {
-                "generate": "init_prompt",
+                "retrieve": "retrieve",
                 "end": END
             }
         )
 
-        workflow.add_edge("init_prompt", "generate")
-        workflow.add_edge("generate", END)
+        # Слияние: генерация ждёт обе ветви. При попадании в кэш ответов ветвь поиска завершается раньше,
+        # и генерация не запускается
+        workflow.add_edge(["retrieve", "init_prompt"], "generate")
+        workflow.add_edge("generate", "cache_store")
+        workflow.add_edge("cache_store", END)
 
         return workflow.compile()
 
+    async def ainvoke(self, inputs: dict) -> dict:
+        """Асинхронный запуск графа с переданными входными данными."""
+        start = time.perf_counter()
+        result = await self.app.ainvoke(inputs)
+        report_timings(result.get("timings", {}), time.perf_counter() - start)
+        return result
+
     def invoke(self, inputs: dict) -> dict:
-        """Запуск графа с переданными входными данными."""
-        return self.app.invoke(inputs)
+        """Запуск графа с переданными входными данными (в собственном цикле событий вызывающего потока)."""
+        return asyncio.run(self.ainvoke(inputs))
+
+    async def astream(self, inputs: dict) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Асинхронный запуск графа с потоковой выдачей ответа. Возвращает события:
+        - ("token", str) — очередной фрагмент ответа LLM;
+        - ("final", dict) — итоговое состояние графа (последнее событие).
+        """
+        start = time.perf_counter()
+        final_state = inputs
+        async for mode, payload in self.app.astream(inputs, stream_mode=["custom", "values"]):
+            if mode == "custom" and "token" in payload:
+                yield "token", payload["token"]
+            elif mode == "values":
+                final_state = payload
+        report_timings(final_state.get("timings", {}), time.perf_counter() - start)
+        yield "final", final_state
+
+    def stream(self, inputs: dict) -> Iterator[Tuple[str, Any]]:
+        """Синхронная обёртка над astream для обработчиков бота, работающих в пуле потоков."""
+        loop = asyncio.new_event_loop()
+        events = self.astream(inputs)
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(events.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            loop.run_until_complete(events.aclose())
+            loop.run_until_complete(loop.shutdown_default_executor())
+            loop.close()
 
     def get_mermaid_code(self) -> str:
         """Возвращает Mermaid-код для визуализации графа (можно вставить в VS Code или Mermaid Live Editor)."""
@@ -0,0 +1,175 @@
+# src/http_service.py
+# Общий HTTP-клиент: пул keep-alive соединений, таймауты, повторы с джиттером и необязательный HTTP/2
+import email.utils
+import os
+import random
+import time
+from typing import Optional, Tuple, Union
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.metrics_service import metrics
+
+try:
+    import httpx
+except ImportError:  # HTTP/2 необязателен: без httpx клиент работает через requests
+    httpx = None
+
+# HTTP-коды, после которых запрос имеет смысл повторить
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Ошибки транспорта обоих бэкендов (requests и httpx) — их перехватывают вызывающие сервисы
+HTTP_ERRORS = (requests.RequestException,) + ((httpx.HTTPError,) if httpx is not None else ())
+
+Timeout = Union[float, Tuple[float, float]]
+
+
+class HTTPClient:
+    """
+    HTTP-клиент, общий для сервисов процесса (OCR, long-polling Telegram).
+
+    - Соединения переиспользуются (keep-alive): TCP и TLS-рукопожатие выполняются один раз на соединение пула.
+    - У каждого запроса есть таймауты на подключение и чтение (по умолчанию — из переменных окружения).
+    - Ответы 429 и 5xx повторяются с экспоненциальной паузой и джиттером, заголовок Retry-After учитывается.
+    - HTTP/2 (мультиплексирование запросов в одном соединении) включается через httpx, если он установлен.
+
+    Переменные окружения:
+    - HTTP_CONNECT_TIMEOUT (5 с), HTTP_READ_TIMEOUT (30 с)
+    - HTTP_POOL_MAXSIZE (20) — максимум соединений к одному хосту
+    - HTTP_MAX_RETRIES (3)
+    - HTTP2 — «1» включает HTTP/2
+    """
+
+    def __init__(self,
+                 connect_timeout: float = None,
+                 read_timeout: float = None,
+                 pool_connections: int = 10,
+                 pool_maxsize: int = None,
+                 max_retries: int = None,
+                 retry_backoff: float = 0.5,
+                 max_retry_backoff: float = 10.0,
+                 http2: bool = None
+                 ):
+        """
+        :param connect_timeout: Таймаут подключения, секунды.
+        :param read_timeout: Таймаут чтения ответа, секунды.
+        :param pool_connections: Число хостов, для которых хранятся пулы соединений.
+        :param pool_maxsize: Максимум соединений к одному хосту.
+        :param max_retries: Число повторов при ответах 429 и 5xx.
+        :param retry_backoff: Начальная пауза перед повтором, секунды (удваивается с каждой попыткой).
+        :param max_retry_backoff: Максимальная пауза перед повтором, секунды.
+        :param http2: Использовать HTTP/2 (нужны httpx и h2).
+        """
+        self.connect_timeout = connect_timeout or float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+        self.read_timeout = read_timeout or float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+        self.pool_maxsize = pool_maxsize or int(os.getenv("HTTP_POOL_MAXSIZE", "20"))
+        self.max_retries = int(os.getenv("HTTP_MAX_RETRIES", "3")) if max_retries is None else max_retries
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+
+        if self.connect_timeout <= 0 or self.read_timeout <= 0:
+            raise ValueError("Таймауты HTTP должны быть положительными.")
+        if self.max_retries < 0:
+            raise ValueError("HTTP_MAX_RETRIES не может быть отрицательным.")
+
+        if http2 is None:
+            http2 = os.getenv("HTTP2", "0") == "1"
+        self.http2 = http2 and self._http2_available()
+
+        if self.http2:
+            self.session = httpx.Client(
+                http2=True,
+                limits=httpx.Limits(max_connections=self.pool_maxsize, max_keepalive_connections=self.pool_maxsize),
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+            )
+        else:
+            self.session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=self.pool_maxsize)
+            self.session.mount("https://", adapter)
+            self.session.mount("http://", adapter)
+
+        self.retries = 0
+
+    @staticmethod
+    def _http2_available() -> bool:
+        """HTTP/2 требует httpx с пакетом h2; без них клиент остаётся на HTTP/1.1."""
+        if httpx is None:
+            print("⚠️ HTTP/2 недоступен: не установлен httpx, используется HTTP/1.1")
+            return False
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            print("⚠️ HTTP/2 недоступен: не установлен h2 (pip install httpx[http2]), используется HTTP/1.1")
+            return False
+        return True
+
+    def _timeout(self, timeout: Optional[Timeout]):
+        """Таймаут запроса в формате бэкенда: число задаёт только таймаут чтения."""
+        if timeout is None:
+            connect, read = self.connect_timeout, self.read_timeout
+        elif isinstance(timeout, tuple):
+            connect, read = timeout
+        else:
+            connect, read = self.connect_timeout, timeout
+
+        if self.http2:
+            return httpx.Timeout(read, connect=connect)
+        return connect, read
+
+    def _retry_delay(self, attempt: int, retry_after: Optional[str]) -> float:
+        """Пауза перед повтором: Retry-After сервера или экспоненциальная пауза с джиттером."""
+        if retry_after:
+            if retry_after.isdigit():
+                return min(self.max_retry_backoff, float(retry_after))
+            try:
+                retry_at = email.utils.parsedate_to_datetime(retry_after)
+            except (TypeError, ValueError):
+                retry_at = None
+            if retry_at is not None:
+                return min(self.max_retry_backoff, max(0.0, retry_at.timestamp() - time.time()))
+
+        delay = min(self.max_retry_backoff, self.retry_backoff * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.0)
+
+    def request(self, method: str, url: str, timeout: Optional[Timeout] = None, **kwargs):
+        """
+        Выполняет запрос через общий пул соединений.
+
+        :param method: HTTP-метод.
+        :param url: Адрес.
+        :param timeout: Таймаут чтения или пара (подключение, чтение); по умолчанию — таймауты клиента.
+        :param kwargs: Параметры запроса (params, headers, json, data — байты готового тела).
+        :return: Ответ (после исчерпания повторов — последний ответ 429/5xx, проверяйте raise_for_status).
+        """
+        timeout = self._timeout(timeout)
+        if self.http2 and isinstance(kwargs.get("data"), bytes):
+            # httpx принимает готовое тело запроса в content, а не в data
+            kwargs["content"] = kwargs.pop("data")
+
+        # Время каждой попытки пишется в метрики по хосту (http.ocr.api.cloud.yandex.net, http.api.telegram.org)
+        operation = f"http.{urlparse(url).hostname}"
+        for attempt in range(self.max_retries + 1):
+            with metrics.timer(operation):
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+            if response.status_code not in RETRYABLE_STATUSES or attempt == self.max_retries:
+                return response
+
+            delay = self._retry_delay(attempt, response.headers.get("Retry-After"))
+            response.close()
+            self.retries += 1
+            # В лог попадает только хост: в пути запросов к Bot API есть токен бота
+            print(f"⚠️ HTTP {response.status_code} от {urlparse(url).netloc}, "
+                  f"повтор {attempt + 1}/{self.max_retries} через {delay:.1f} с")
+            time.sleep(delay)
+
+    def get(self, url: str, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        """Закрывает соединения пула."""
+        self.session.close()
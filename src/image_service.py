@@ -0,0 +1,181 @@
+# src/image_service.py
+# Подготовка изображений к OCR: настоящий формат по сигнатуре, уменьшение, оттенки серого и пересжатие
+import io
+import os
+from typing import Dict
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow необязателен: без него изображение отправляется как есть
+    Image = None
+
+# Сигнатуры (magic bytes) форматов, которые присылают пользователи
+MAGIC_NUMBERS = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"%PDF", "application/pdf"),
+)
+
+# Наибольшая сторона страницы A4 в дюймах: по ней target_dpi переводится в пиксели
+A4_LONG_SIDE_INCHES = 11.69
+
+# Тег EXIF Orientation: 1 — кадр уже в правильной ориентации
+EXIF_ORIENTATION = 0x0112
+
+# Размер уменьшенной копии, по которой определяется тип изображения (скриншот или фотография)
+DESCRIBE_SIZE = 256
+
+
+def detect_mime_type(data: bytes) -> str:
+    """MIME-тип по сигнатуре файла (а не по имени или заявленному типу)."""
+    for magic, mime_type in MAGIC_NUMBERS:
+        if data.startswith(magic):
+            return mime_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+def perceptual_hash(image, hash_size: int = 16) -> str:
+    """
+    dHash: знаки разностей яркости соседних клеток изображения, уменьшенного до (hash_size + 1) × hash_size.
+    Не меняется при повторном сжатии и масштабировании, но и мелкие правки (цифра в тексте) его часто не меняют.
+    """
+    cells = image.convert("L").resize((hash_size + 1, hash_size), Image.BOX).tobytes()
+    bits = 0
+    for y in range(hash_size):
+        row = cells[y * (hash_size + 1):(y + 1) * (hash_size + 1)]
+        for x in range(hash_size):
+            bits = (bits << 1) | (row[x] > row[x + 1])
+    return f"{bits:0{hash_size * hash_size // 4}x}"
+
+
+class ImagePreprocessor:
+    """
+    Готовит изображение к отправке в OCR:
+
+    - определяет настоящий формат по сигнатуре;
+    - отличает скриншоты от фотографий: у скриншота несколько цветов (фон, текст, рамки) занимают большую часть кадра;
+    - если файл в формате, который принимает OCR, не больше страницы A4 при target_dpi и не повёрнут через EXIF,
+      отправляет его как есть: пересжатие такого файла стоит десятки-сотни миллисекунд CPU, а экономит мало;
+    - иначе уменьшает так, чтобы наибольшая сторона соответствовала странице A4 при target_dpi
+      (больше точек OCR не нужно, а размер запроса и время распознавания растут), переводит в оттенки серого
+      и пересжимает: скриншоты — в PNG с быстрым сжатием (ровный фон сжимается без потерь), JPEG и фотографии — в JPEG.
+
+    Если результат не меньше исходного файла в поддерживаемом OCR формате, отправляется исходный файл.
+    Без Pillow изображение не изменяется, определяется только формат.
+
+    Переменные окружения:
+    - OCR_TARGET_DPI (200)
+    - OCR_JPEG_QUALITY (85)
+    - OCR_CACHE_PERCEPTUAL (0) — считать перцептивный хэш (нужен только кэшу OCR с тем же параметром)
+    """
+
+    # Форматы, которые принимает Yandex Cloud OCR
+    OCR_MIME_TYPES = ("image/jpeg", "image/png", "application/pdf")
+
+    def __init__(self,
+                 target_dpi: int = None,
+                 jpeg_quality: int = None,
+                 grayscale: bool = True,
+                 screenshot_threshold: float = 0.5,
+                 png_compress_level: int = 1,
+                 perceptual_hash: bool = None
+                 ):
+        """
+        :param target_dpi: Целевое разрешение: наибольшая сторона — A4 при этом DPI (200 DPI → 2338 px).
+        :param jpeg_quality: Качество JPEG при пересжатии фотографий.
+        :param grayscale: Переводить изображение в оттенки серого.
+        :param screenshot_threshold: Доля кадра, занятая 8 самыми частыми цветами, начиная с которой изображение — скриншот.
+        :param png_compress_level: Уровень сжатия PNG (0-9): уровни выше 1-3 заметно дольше при почти том же размере.
+        :param perceptual_hash: Считать перцептивный хэш (см. OCRCache.perceptual). По умолчанию — OCR_CACHE_PERCEPTUAL.
+        """
+        self.target_dpi = target_dpi or int(os.getenv("OCR_TARGET_DPI", "200"))
+        self.jpeg_quality = jpeg_quality or int(os.getenv("OCR_JPEG_QUALITY", "85"))
+        self.grayscale = grayscale
+        self.screenshot_threshold = screenshot_threshold
+        self.png_compress_level = png_compress_level
+        if perceptual_hash is None:
+            perceptual_hash = os.getenv("OCR_CACHE_PERCEPTUAL", "0") == "1"
+        self.perceptual_hash = perceptual_hash
+
+        if self.target_dpi <= 0:
+            raise ValueError("OCR_TARGET_DPI должен быть положительным.")
+        if not 1 <= self.jpeg_quality <= 95:
+            raise ValueError("OCR_JPEG_QUALITY должен быть от 1 до 95.")
+
+        self.max_side = round(A4_LONG_SIDE_INCHES * self.target_dpi)
+
+        if Image is None:
+            print("⚠️ Pillow не установлен: изображения отправляются в OCR без предобработки")
+
+    def prepare(self, data: bytes) -> Dict:
+        """
+        Подготавливает изображение.
+
+        :param data: Исходный файл изображения.
+        :return: Словарь с полями data, mime_type, screenshot, perceptual_hash (None, если не считается),
+            original_size, size.
+        """
+        mime_type = detect_mime_type(data)
+        result = {
+            "data": data,
+            "mime_type": mime_type,
+            "screenshot": False,
+            "perceptual_hash": None,
+            "original_size": len(data),
+            "size": len(data),
+        }
+        if Image is None or mime_type == "application/pdf":
+            return result
+
+        image = Image.open(io.BytesIO(data))
+        downscale = max(image.size) > self.max_side
+        # Фотографии с телефона хранят поворот в EXIF — OCR нужен кадр в правильной ориентации
+        rotated = image.getexif().get(EXIF_ORIENTATION, 1) != 1
+        if not downscale and not rotated and mime_type in self.OCR_MIME_TYPES:
+            # Файл подходит OCR как есть. JPEG для определения типа декодируется сразу уменьшенным (в 2-8 раз)
+            image.draft(image.mode, (DESCRIBE_SIZE, DESCRIBE_SIZE))
+            self._describe(image, result)
+            return result
+
+        image = ImageOps.exif_transpose(image)
+        self._describe(image, result)
+
+        image = image.convert("L" if self.grayscale else "RGB")
+        if downscale:
+            # BICUBIC при уменьшении в 1-2 раза для текста не хуже LANCZOS и примерно на треть быстрее
+            image.thumbnail((self.max_side, self.max_side), Image.BICUBIC)
+
+        buffer = io.BytesIO()
+        if result["screenshot"] and mime_type != "image/jpeg":
+            # Уровень 6 и optimize=True дают на 10-20% меньший файл, но кодируют в 1.5-7 раз дольше
+            image.save(buffer, "PNG", compress_level=self.png_compress_level)
+        else:
+            # Шум JPEG-сжатия в PNG почти не сжимается, поэтому уже сжатые снимки остаются JPEG
+            image.save(buffer, "JPEG", quality=self.jpeg_quality, optimize=True)
+        prepared = buffer.getvalue()
+
+        if len(prepared) < len(data) or mime_type not in self.OCR_MIME_TYPES:
+            result.update(data=prepared, mime_type=detect_mime_type(prepared), size=len(prepared))
+        return result
+
+    def _describe(self, image, result: Dict):
+        """Тип изображения и (если включён) перцептивный хэш — по исходному кадру, до уменьшения и пересжатия."""
+        result["screenshot"] = self.is_screenshot(image)
+        if self.perceptual_hash:
+            result["perceptual_hash"] = perceptual_hash(image)
+
+    def is_screenshot(self, image) -> bool:
+        """Скриншот или фотография: доля кадра, занятая 8 самыми частыми цветами (цвета огрублены до 16 уровней)."""
+        thumbnail = image.convert("RGB")
+        thumbnail.thumbnail((DESCRIBE_SIZE, DESCRIBE_SIZE))
+        # Огрубление цветов убирает шум JPEG-сжатия, которым Telegram обрабатывает присланные фото
+        colors = thumbnail.point(lambda value: value & 0xF0).getcolors(256 * 256)
+        counts = sorted((count for count, _ in colors), reverse=True)
+        return sum(counts[:8]) / sum(counts) >= self.screenshot_threshold
@@ -1,18 +1,23 @@
 import json
 import os
 import time
+from contextlib import contextmanager
+from typing import AsyncIterator, Iterator
 
 from dotenv import load_dotenv
 from pathlib import Path
 
-from langchain_community.llms import YandexGPT
+from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import PromptTemplate
 from langchain_core.runnables import RunnableSequence
+from yandex_cloud_ml_sdk import YCloudML
 
 from langfuse import get_client, Langfuse
 from langfuse.langchain import CallbackHandler
 
-from src.prompt_service import PromptService
+from src.evaluation_service import EvaluationQueue
+from src.metrics_service import metrics
+from src.prompt_service import DEFAULT_TEMPLATE_PATH, PromptRegistry, get_template_version
 from src.semantic_coverage_service import SemanticCoverageService
 
 # Загружаем переменные из .env файла
@@ -30,8 +35,17 @@ class LLMService:
                  prompt_template: PromptTemplate = None,
                  langfuse_secret_key: str = None,
                  langfuse_public_key: str = None,
-                 langfuse_host: str = None
+                 langfuse_host: str = None,
+                 semantic_coverage_service: SemanticCoverageService = None,
+                 evaluation_queue: EvaluationQueue = None,
+                 prompt_registry: PromptRegistry = None
                  ):
+        """
+        :param prompt_template: Шаблон по умолчанию; если не указан — prompts/answer_from_documents.txt из реестра.
+        :param prompt_registry: Реестр шаблонов: скомпилированные шаблоны и кэш цепочек промпт → LLM.
+        :param evaluation_queue: Фоновая очередь оценки ответов. По умолчанию — общая очередь контейнера
+            сервисов процесса: отдельные потоки и atexit-обработчик на каждый LLMService не создаются.
+        """
 
         self.folder_id = folder_id or os.getenv("FOLDER_ID")
         self.iam_token = iam_token or os.getenv("IAM_TOKEN")
@@ -41,22 +55,19 @@ class LLMService:
         if not self.iam_token:
             raise ValueError("IAM_TOKEN не указан ни в .env, ни в аргументах.")
 
-        self.llm = YandexGPT(
-            folder_id=self.folder_id,
-            iam_token=self.iam_token,
-            model=model,
+        self.model = model
+        self.temperature = temperature
+        # LangChain-модель из yandex_cloud_ml_sdk умеет потоковую выдачу (stream/astream отдают ответ по частям),
+        # в отличие от langchain_community.llms.YandexGPT, который возвращает ответ одним фрагментом
+        sdk = YCloudML(folder_id=self.folder_id, auth=self.iam_token)
+        self.llm = sdk.models.completions(model).configure(
             temperature=temperature,
             max_tokens=max_tokens
-        )
+        ).langchain() | StrOutputParser()
 
-        if not prompt_template:
-            self.prompt_service = PromptService()
-            self.prompt_template = self.prompt_service.get_prompt_template()
-        else:
-            self.prompt_template = prompt_template
-
-        # Цепочка: промпт → LLM
-        self.chain: RunnableSequence = self.prompt_template | self.llm
+        # Шаблоны разбираются, а цепочки промпт → LLM собираются один раз на процесс
+        self.prompt_registry = prompt_registry or PromptRegistry()
+        self.prompt_template = prompt_template or self.prompt_registry.get(DEFAULT_TEMPLATE_PATH)
 
         # Настройка Langfuse
         self.langfuse = Langfuse(
@@ -65,12 +76,69 @@ class LLMService:
             host=langfuse_host or os.getenv("LANGFUSE_HOST"),
         )
 
-        self.semantic_coverage_service = SemanticCoverageService()
+        self.semantic_coverage_service = semantic_coverage_service or SemanticCoverageService()
+
+        # Фоновая очередь для оценки ответа и телеметрии (не задерживает ответ пользователю)
+        if evaluation_queue is None:
+            # Импорт здесь: контейнер сам создаёт LLMService
+            from src.service_container import get_container
+            evaluation_queue = get_container().evaluation_queue
+        self.evaluation_queue = evaluation_queue
 
-    def generate_response(self, question: str, context: str, state: dict) -> str:
+    @property
+    def chain(self) -> RunnableSequence:
+        """Цепочка промпт → LLM для шаблона по умолчанию."""
+        return self.get_chain()
+
+    def get_chain(self, prompt_template: PromptTemplate = None) -> RunnableSequence:
+        """Возвращает цепочку промпт → LLM для шаблона из кэша реестра (по шаблону, модели и температуре)."""
+        return self.prompt_registry.get_chain(prompt_template or self.prompt_template, self.llm,
+                                              self.model, self.temperature)
+
+    def generate_response(self, question: str, context: str, state: dict,
+                          prompt_template: PromptTemplate = None) -> str:
         """
         Генерирует ответ на вопрос с учётом контекста.
-        Добавляет мониторинг через Langfuse.
+        Добавляет мониторинг через Langfuse: оценка покрытия и итог трассы
+        отправляются из фоновой очереди после того, как ответ возвращён.
+
+        prompt_template позволяет одному экземпляру сервиса обслуживать запросы с разными шаблонами.
+        """
+        return "".join(self.stream_response(question, context, state, prompt_template))
+
+    def stream_response(self, question: str, context: str, state: dict,
+                        prompt_template: PromptTemplate = None) -> Iterator[str]:
+        """
+        Генерирует ответ по частям — фрагменты отдаются по мере поступления от LLM.
+        Время до первого фрагмента (ttft_seconds) и полное время генерации замеряются отдельно.
+        """
+        with self._traced_generation(question, context, state, prompt_template) as run:
+            for chunk in run["chain"].stream(run["input"], config=run["config"]):
+                self._record_chunk(run, chunk)
+                yield chunk
+
+    async def astream_response(self, question: str, context: str, state: dict,
+                               prompt_template: PromptTemplate = None) -> AsyncIterator[str]:
+        """
+        Асинхронный вариант stream_response для узлов графа: цепочка вызывается через astream,
+        цикл событий не блокируется на время генерации.
+        """
+        with self._traced_generation(question, context, state, prompt_template) as run:
+            async for chunk in run["chain"].astream(run["input"], config=run["config"]):
+                self._record_chunk(run, chunk)
+                yield chunk
+
+    @staticmethod
+    def _record_chunk(run: dict, chunk: str):
+        if run["first_chunk_time"] is None:
+            run["first_chunk_time"] = time.time()
+        run["chunks"].append(chunk)
+
+    @contextmanager
+    def _traced_generation(self, question: str, context: str, state: dict, prompt_template: PromptTemplate):
+        """
+        Трасса Langfuse вокруг генерации, общая для stream_response и astream_response.
+        Отдаёт цепочку с её входом и конфигом; фрагменты ответа складываются в run["chunks"].
         """
 
         langfuse = get_client()
@@ -84,6 +152,9 @@ class LLMService:
         # Отслеживание времени выполнения
         start_time = time.time()  # Начало всей операции
 
+        # Версия шаблона попадает в трассу: ответы разных версий промпта можно сравнивать
+        template_version = get_template_version(prompt_template or self.prompt_template)
+
         # Разделяем документы и оценки
         documents = state["relevants"]
         scores = [doc.get("score", 0.0) for doc in documents]
@@ -102,7 +173,8 @@ class LLMService:
                 "context": context,
                 "document_count": document_count,
                 "average_relevance": average_relevance,
-                "relevance_scores": scores
+                "relevance_scores": scores,
+                "template_version": template_version
             }
 
             print("\n" + "="*60)
@@ -115,48 +187,67 @@ class LLMService:
 
             # Замер времени начала выполнения LLM-цепочки
             llm_start_time = time.time()
-
-            response = self.chain.invoke(
-                {
+            llm_timer = metrics.timer("llm.generate")
+            run = {
+                "chain": self.get_chain(prompt_template),
+                "input": {
                     "question": question,
                     "context": context
                 },
-                config={
+                "config": {
                     "callbacks": [langfuse_handler],
                     "metadata": {
                         "langfuse_user_id": "random-user",
                         "langfuse_session_id": "random-session",
                         "langfuse_tags": ["random-tag-1", "random-tag-2"],
-                        "model_name": "yandexgpt"
+                        "model_name": self.model,
+                        "template_version": template_version
                     }
-                }
-            )
+                },
+                "chunks": [],
+                "first_chunk_time": None,
+            }
+
+            with llm_timer:
+                yield run
 
             # Замер времени окончания выполнения LLM-цепочки
             llm_end_time = time.time()
             llm_duration = llm_end_time - llm_start_time  # Время выполнения LLM
+            ttft = (run["first_chunk_time"] or llm_end_time) - llm_start_time  # Время до первого фрагмента
 
             # Общее время выполнения
             total_end_time = time.time()
             total_duration = total_end_time - start_time  # Общее время операции
-
-            semantic_coverage = self.semantic_coverage_service.calculate(context, response, documents)
-
-            output = {
-                "response": response,
-                "llm_duration_seconds": llm_duration,  # Время работы LLM
-                "total_duration_seconds": total_duration,
-                "document_count": document_count,
-                "relevance_scores": scores,
-                "average_relevance": average_relevance,
-                "semantic_coverage": semantic_coverage
-            }
-
-            print("\n" + "🟩 OUTPUT:")
-            print("="*60)
-            print(json.dumps(output, ensure_ascii=False, indent=4))
-            print("="*60 + "\n")
-
-        span.update_trace(output=output, )
-
-        return response
+            metrics.observe("llm.ttft", ttft)
+
+        output = {
+            "response": "".join(run["chunks"]),
+            "ttft_seconds": ttft,
+            "llm_duration_seconds": llm_duration,  # Время работы LLM
+            "total_duration_seconds": total_duration,
+            "document_count": document_count,
+            "relevance_scores": scores,
+            "average_relevance": average_relevance,
+            "template_version": template_version,
+        }
+
+        # Оценка покрытия и отправка результата в Langfuse не нужны для ответа — выполняются в фоне
+        self.evaluation_queue.submit(self._evaluate_response, predefined_trace_id, context, documents, output)
+
+    def _evaluate_response(self, trace_id: str, context: str, documents: list, output: dict, queue_lag: float):
+        """Фоновая задача: считает семантическое покрытие ответа и дописывает результат в трассу Langfuse."""
+        output["semantic_coverage"] = self.semantic_coverage_service.calculate(context, output["response"], documents)
+        output["evaluation_lag_seconds"] = queue_lag
+
+        print("\n" + "🟩 OUTPUT:")
+        print("="*60)
+        print(json.dumps(output, ensure_ascii=False, indent=4))
+        print("="*60 + "\n")
+
+        with get_client().start_as_current_span(
+                name="evaluation",
+                trace_context={"trace_id": trace_id}
+        ) as span:
+            span.update(output=output)
+            span.update_trace(output=output)
@@ -0,0 +1,295 @@
+# src/metrics_service.py
+# Метрики: время и ошибки узлов графа и вызовов сервисов, счётчики и текущие значения кэшей и очередей,
+# выгрузка в формате Prometheus
+import functools
+import inspect
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class _Timer:
+    """Контекстный менеджер замера: записывает время блока и ошибку, если блок завершился исключением."""
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics: "Metrics", name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, error=exc_type is not None)
+        return False
+
+
+class _NoopTimer:
+    """Замер при выключенных метриках: ничего не делает."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+_NOOP_TIMER = _NoopTimer()
+
+
+class Metrics:
+    """
+    Счётчики вызовов, ошибок и время операций (узлов графа и вызовов внешних сервисов).
+
+    Для каждой операции хранятся число вызовов, число ошибок, суммарное время и последние window замеров,
+    по которым считаются p50/p95/p99. Кроме операций — счётчики событий (inc: попадания и промахи кэшей,
+    отброшенные задачи) и текущие значения (set_gauge: размер кэша, задержка очереди).
+    Выгрузка — текст в формате Prometheus (summary, counter и gauge):
+    HTTP-эндпоинт /metrics (METRICS_PORT) и/или файл для textfile-коллектора node_exporter (METRICS_FILE),
+    который перезаписывается раз в METRICS_FILE_INTERVAL секунд.
+
+    Выключенные метрики (METRICS_ENABLED=0) стоят одну проверку флага на вызов: timer() возвращает
+    общий пустой контекстный менеджер, декоратор timed() сразу вызывает функцию, inc() и set_gauge() ничего не делают.
+
+    Переменные окружения:
+    - METRICS_ENABLED (1) — собирать метрики
+    - METRICS_PORT — порт HTTP-эндпоинта /metrics (по умолчанию не запускается)
+    - METRICS_FILE — путь к файлу с метриками (по умолчанию не пишется)
+    - METRICS_FILE_INTERVAL (15) — как часто перезаписывать файл, секунды
+    """
+
+    def __init__(self, enabled: bool = None, window: int = 1024, prefix: str = "rag"):
+        """
+        :param enabled: Собирать ли метрики. По умолчанию — METRICS_ENABLED.
+        :param window: Сколько последних замеров операции хранить для квантилей.
+        :param prefix: Префикс имён метрик Prometheus.
+        """
+        if enabled is None:
+            enabled = os.getenv("METRICS_ENABLED", "1") == "1"
+        if window <= 0:
+            raise ValueError("window должен быть положительным.")
+
+        self.enabled = enabled
+        self.window = window
+        self.prefix = prefix
+
+        self._lock = threading.Lock()
+        self._operations: Dict[str, dict] = {}
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._file_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._path: Optional[Path] = None
+
+    def observe(self, name: str, seconds: float, error: bool = False):
+        """Записывает один замер операции name."""
+        if not self.enabled:
+            return
+        with self._lock:
+            operation = self._operations.get(name)
+            if operation is None:
+                operation = self._operations[name] = {
+                    "count": 0, "errors": 0, "sum": 0.0, "samples": deque(maxlen=self.window)
+                }
+            operation["count"] += 1
+            operation["errors"] += error
+            operation["sum"] += seconds
+            operation["samples"].append(seconds)
+
+    def inc(self, name: str, value: float = 1):
+        """Увеличивает счётчик name (попадания кэша, отброшенные задачи, сэкономленные секунды)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float):
+        """Записывает текущее значение name (размер кэша, длина и задержка очереди)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[name] = value
+
+    def counters(self) -> Dict[str, float]:
+        """Текущие значения счётчиков."""
+        with self._lock:
+            return dict(sorted(self._counters.items()))
+
+    def gauges(self) -> Dict[str, float]:
+        """Последние записанные значения gauge."""
+        with self._lock:
+            return dict(sorted(self._gauges.items()))
+
+    def timer(self, name: str):
+        """Контекстный менеджер: with metrics.timer("clickhouse.search_hybrid"): ..."""
+        if not self.enabled:
+            return _NOOP_TIMER
+        return _Timer(self, name)
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Сводка по операциям: count, errors, sum и квантили p50/p95/p99 (секунды)."""
+        with self._lock:
+            operations = {
+                name: (operation["count"], operation["errors"], operation["sum"], list(operation["samples"]))
+                for name, operation in self._operations.items()
+            }
+
+        result = {}
+        for name, (count, errors, total, samples) in sorted(operations.items()):
+            quantiles = np.quantile(samples, QUANTILES) if samples else [0.0] * len(QUANTILES)
+            result[name] = {
+                "count": count,
+                "errors": errors,
+                "sum": total,
+                **{f"p{round(q * 100)}": float(value) for q, value in zip(QUANTILES, quantiles)},
+            }
+        return result
+
+    def render(self) -> str:
+        """Метрики в текстовом формате Prometheus."""
+        seconds, errors = f"{self.prefix}_operation_seconds", f"{self.prefix}_operation_errors_total"
+        lines = [
+            f"# HELP {seconds} Время операций (узлов графа и вызовов сервисов), секунды.",
+            f"# TYPE {seconds} summary",
+        ]
+        snapshot = self.snapshot()
+        for name, stats in snapshot.items():
+            label = _escape(name)
+            for q in QUANTILES:
+                lines.append(f'{seconds}{{operation="{label}",quantile="{q}"}} {stats[f"p{round(q * 100)}"]:.6f}')
+            lines.append(f'{seconds}_sum{{operation="{label}"}} {stats["sum"]:.6f}')
+            lines.append(f'{seconds}_count{{operation="{label}"}} {stats["count"]}')
+
+        lines += [f"# HELP {errors} Число операций, завершившихся ошибкой.", f"# TYPE {errors} counter"]
+        for name, stats in snapshot.items():
+            lines.append(f'{errors}{{operation="{_escape(name)}"}} {stats["errors"]}')
+
+        counters, gauges = f"{self.prefix}_events_total", f"{self.prefix}_gauge"
+        lines += [f"# HELP {counters} Счётчики событий (попадания и промахи кэшей, отброшенные задачи).",
+                  f"# TYPE {counters} counter"]
+        for name, value in self.counters().items():
+            lines.append(f'{counters}{{name="{_escape(name)}"}} {value}')
+
+        lines += [f"# HELP {gauges} Текущие значения (размеры кэшей, задержка очереди).", f"# TYPE {gauges} gauge"]
+        for name, value in self.gauges().items():
+            lines.append(f'{gauges}{{name="{_escape(name)}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """Записывает метрики в файл атомарно (textfile-коллектор не увидит недописанный файл)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(path.name + ".tmp")
+        temporary.write_text(self.render(), encoding="utf-8")
+        os.replace(temporary, path)
+
+    def start(self, port: int = None, path: str = None, interval: float = None):
+        """
+        Запускает выгрузку: HTTP-эндпоинт /metrics на порту port и/или периодическую запись в файл path.
+        По умолчанию — METRICS_PORT, METRICS_FILE и METRICS_FILE_INTERVAL; если ни одно не задано, ничего не запускается.
+        """
+        if not self.enabled:
+            return
+        port = port or (int(os.getenv("METRICS_PORT")) if os.getenv("METRICS_PORT") else None)
+        path = path or os.getenv("METRICS_FILE")
+        interval = interval or float(os.getenv("METRICS_FILE_INTERVAL", "15"))
+
+        if port and self._server is None:
+            self._server = ThreadingHTTPServer(("0.0.0.0", port), _make_handler(self))
+            threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+            print(f"📈 Метрики: http://0.0.0.0:{port}/metrics")
+
+        if path and self._file_thread is None:
+            self._path = Path(path)
+            self._file_thread = threading.Thread(
+                target=self._write_periodically, args=(interval,), name="metrics-file", daemon=True
+            )
+            self._file_thread.start()
+            print(f"📈 Метрики: {self._path} (раз в {interval:g} с)")
+
+    def _write_periodically(self, interval: float):
+        while not self._stop.wait(interval):
+            self.write(str(self._path))
+
+    def stop(self):
+        """Останавливает выгрузку; файл метрик перезаписывается последний раз."""
+        self._stop.set()
+        if self._file_thread is not None:
+            self._file_thread.join()
+            self._file_thread = None
+            self.write(str(self._path))
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        self._stop.clear()
+
+    def reset(self):
+        """Удаляет все замеры, счётчики и значения."""
+        with self._lock:
+            self._operations.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _make_handler(metrics: Metrics):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MetricsHandler
+
+
+# Метрики процесса: декораторы сервисов и узлы графа пишут сюда
+metrics = Metrics()
+
+
+def timed(name: str):
+    """
+    Декоратор функции или метода (в том числе async): время и ошибки вызова записываются как операция name.
+    Флаг metrics.enabled проверяется при каждом вызове.
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not metrics.enabled:
+                    return await func(*args, **kwargs)
+                with _Timer(metrics, name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return func(*args, **kwargs)
+            with _Timer(metrics, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
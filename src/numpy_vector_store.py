@@ -0,0 +1,313 @@
+# src/numpy_vector_store.py
+# Локальный векторный индекс в памяти процесса: матрица эмбеддингов из .npy-снимка, поиск без сетевых запросов
+import json
+import os
+import shutil
+import threading
+import time
+from functools import cached_property
+from itertools import chain
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from src.metrics_service import timed
+from src.vector_store import (
+    COLLAPSE_MODES, TOKEN_PATTERN, VectorStore, content_hash, lexical_tokens, make_chunk_id
+)
+
+DEFAULT_PATH = ".cache/vectors"
+
+# Поля чанка, которые хранятся рядом с матрицей эмбеддингов (строка i файла chunks.jsonl — строка i матрицы)
+CHUNK_FIELDS = ("chunk_id", "task_id", "chunk_index", "title", "url", "text", "content_hash")
+
+
+class _Snapshot:
+    """Версия корпуса: матрица нормированных эмбеддингов (memmap) и метаданные чанков."""
+
+    def __init__(self, version: Optional[str], matrix: np.ndarray, chunks: List[Dict]):
+        self.version = version
+        self.matrix = matrix
+        self.chunks = chunks
+
+    @cached_property
+    def by_hash(self) -> Dict[str, int]:
+        return {chunk["content_hash"]: row for row, chunk in enumerate(self.chunks)}
+
+    @cached_property
+    def by_position(self) -> Dict[tuple, int]:
+        return {(chunk["task_id"], chunk["chunk_index"]): row for row, chunk in enumerate(self.chunks)}
+
+    @cached_property
+    def task_rows(self) -> Dict[int, np.ndarray]:
+        rows = {}
+        for row, chunk in enumerate(self.chunks):
+            rows.setdefault(chunk["task_id"], []).append(row)
+        return {task_id: np.array(task_rows) for task_id, task_rows in rows.items()}
+
+    @cached_property
+    def token_rows(self) -> Dict[str, np.ndarray]:
+        """Обратный индекс для лексического поиска: токен → строки, где он встречается."""
+        rows = {}
+        for row, chunk in enumerate(self.chunks):
+            for token in set(TOKEN_PATTERN.findall(f"{chunk['title']} {chunk['text']}".lower())):
+                rows.setdefault(token, []).append(row)
+        return {token: np.array(token_rows) for token, token_rows in rows.items()}
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Векторное хранилище внутри процесса — альтернатива ClickHouseVectorStore для небольших корпусов.
+
+    Эмбеддинги хранятся нормированными в непрерывной матрице float32 (снимок embeddings.npy
+    открывается через memmap), поиск top-k — одно произведение матрицы на вектор и argpartition.
+    Метаданные чанков лежат рядом в chunks.jsonl.
+
+    Каждая переиндексация пишет новый каталог-версию и атомарно переключает на него файл CURRENT,
+    поэтому другие процессы (бот) подхватывают новый корпус при следующем поиске.
+    Поиск всегда точный: параметры exact и vector_index принимаются для совместимости.
+    """
+
+    def __init__(self, path: str = None, embedding_dim: int = 256):
+        """
+        :param path: Каталог снимков (по умолчанию NUMPY_VECTOR_STORE_PATH или .cache/vectors).
+        :param embedding_dim: Размерность эмбеддингов пустого хранилища.
+        """
+        self.path = Path(path or os.getenv("NUMPY_VECTOR_STORE_PATH", DEFAULT_PATH))
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.embedding_dim = embedding_dim
+
+        self._lock = threading.Lock()
+        self._pointer_mtime = None
+        self._snapshot = _Snapshot(None, np.empty((0, embedding_dim), dtype=np.float32), [])
+
+    @property
+    def _pointer(self) -> Path:
+        return self.path / "CURRENT"
+
+    def _current(self) -> _Snapshot:
+        """Текущий снимок; перечитывается, если другой процесс переключил CURRENT."""
+        try:
+            mtime = self._pointer.stat().st_mtime_ns
+        except FileNotFoundError:
+            return self._snapshot
+        if mtime == self._pointer_mtime:
+            return self._snapshot
+
+        with self._lock:
+            if mtime != self._pointer_mtime:
+                version = self._pointer.read_text(encoding="utf-8").strip()
+                if version != self._snapshot.version:
+                    self._snapshot = self._load(version)
+                self._pointer_mtime = mtime
+            return self._snapshot
+
+    def _load(self, version: str) -> _Snapshot:
+        directory = self.path / version
+        matrix_path = directory / "embeddings.npy"
+        if matrix_path.exists():
+            matrix = np.load(matrix_path, mmap_mode="r")
+        else:
+            matrix = np.empty((0, self.embedding_dim), dtype=np.float32)
+        with open(directory / "chunks.jsonl", "r", encoding="utf-8") as f:
+            chunks = [json.loads(line) for line in f]
+        return _Snapshot(version, matrix, chunks)
+
+    def add_documents(self, documents: List[Dict]):
+        """Дописывает чанки к текущему корпусу (снимок пересобирается целиком)."""
+        snapshot = self._current()
+        existing = (
+            {**chunk, "embedding": snapshot.matrix[row]} for row, chunk in enumerate(snapshot.chunks)
+        )
+        self.replace_documents(chain(existing, documents))
+
+    def replace_documents(self, documents: Iterable[Dict], vector_index: bool = False, block_size: int = 10_000):
+        """
+        Записывает новую версию корпуса и переключает на неё CURRENT.
+        Эмбеддинги пишутся блоками по block_size строк, поэтому documents может быть генератором.
+        """
+        version = str(time.time_ns())
+        directory = self.path / version
+        directory.mkdir()
+        raw_path = directory / "embeddings.f32"
+
+        rows, dim = 0, self.embedding_dim
+        with open(raw_path, "wb") as vectors, open(directory / "chunks.jsonl", "w", encoding="utf-8") as chunks:
+            block = []
+            for document in chain(documents, [None]):
+                if document is not None:
+                    block.append(document)
+                if block and (document is None or len(block) >= block_size):
+                    matrix = np.asarray([doc["embedding"] for doc in block], dtype=np.float32)
+                    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+                    vectors.write(matrix.tobytes())
+                    for doc in block:
+                        chunk = {
+                            **doc,
+                            "chunk_id": doc.get("chunk_id") or make_chunk_id(doc["task_id"], doc["chunk_index"]),
+                            "content_hash": doc.get("content_hash") or content_hash(doc["text"]),
+                        }
+                        chunks.write(json.dumps({field: chunk[field] for field in CHUNK_FIELDS},
+                                                ensure_ascii=False) + "\n")
+                    rows += len(block)
+                    dim = matrix.shape[1]
+                    block = []
+
+        # Сырые строки → .npy-снимок, который открывается через memmap без чтения в память
+        if rows:
+            source = np.memmap(raw_path, dtype=np.float32, mode="r", shape=(rows, dim))
+            target = np.lib.format.open_memmap(directory / "embeddings.npy", mode="w+",
+                                               dtype=np.float32, shape=(rows, dim))
+            for start in range(0, rows, block_size):
+                target[start:start + block_size] = source[start:start + block_size]
+            target.flush()
+            del source, target
+        raw_path.unlink()
+
+        pointer_tmp = self.path / "CURRENT.tmp"
+        pointer_tmp.write_text(version, encoding="utf-8")
+        os.replace(pointer_tmp, self._pointer)
+
+        snapshot = self._current()
+        for old in self.path.iterdir():
+            if old.is_dir() and old.name != snapshot.version:
+                shutil.rmtree(old, ignore_errors=True)
+
+    def get_embeddings_by_hash(self, hashes: List[str], batch_size: int = 1000) -> Dict[str, List[float]]:
+        """Сохранённые (нормированные) эмбеддинги чанков по хэшам их текста."""
+        snapshot = self._current()
+        rows = {h: snapshot.by_hash[h] for h in hashes if h in snapshot.by_hash}
+        return {h: snapshot.matrix[row].tolist() for h, row in rows.items()}
+
+    @timed("numpy_store.get_corpus_version")
+    def get_corpus_version(self) -> str:
+        return self._current().version or ""
+
+    def _similarities(self, snapshot: _Snapshot, query_embedding: List[float]) -> np.ndarray:
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        return snapshot.matrix @ query
+
+    @staticmethod
+    def _top(similarities: np.ndarray, count: int) -> np.ndarray:
+        """Индексы count наибольших значений по убыванию: argpartition, затем сортировка только отобранных."""
+        count = min(count, len(similarities))
+        top = np.argpartition(-similarities, count - 1)[:count]
+        return top[np.argsort(-similarities[top])]
+
+    @timed("numpy_store.search_similar")
+    def search_similar(self, query_embedding: List[float], limit: int = 2, exact: bool = False,
+                       with_embeddings: bool = False, collapse: str = "none",
+                       neighbours: int = 1, overfetch: int = 5) -> List[Dict]:
+        """Ближайшие по косинусному расстоянию чанки; параметры — как у ClickHouseVectorStore.search_similar."""
+        if collapse not in COLLAPSE_MODES:
+            raise ValueError(f"Неизвестный режим свёртки: {collapse}. Допустимо: {COLLAPSE_MODES}")
+
+        snapshot = self._current()
+        if not snapshot.chunks:
+            return []
+
+        similarities = self._similarities(snapshot, query_embedding)
+        candidates = limit if collapse == "none" else limit * max(overfetch, 1)
+        order = self._top(similarities, candidates)
+        return self._collect(snapshot, order, similarities, limit, with_embeddings, collapse, neighbours)
+
+    @timed("numpy_store.search_similar_batch")
+    def search_similar_batch(self, query_embeddings: List[List[float]], limit: int = 2, exact: bool = False,
+                             with_embeddings: bool = False, collapse: str = "none",
+                             neighbours: int = 1, overfetch: int = 5) -> List[List[Dict]]:
+        """Поиск для нескольких запросов: одно произведение матрицы корпуса на матрицу запросов."""
+        if collapse not in COLLAPSE_MODES:
+            raise ValueError(f"Неизвестный режим свёртки: {collapse}. Допустимо: {COLLAPSE_MODES}")
+
+        snapshot = self._current()
+        if not snapshot.chunks or not len(query_embeddings):
+            return [[] for _ in query_embeddings]
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        similarities = snapshot.matrix @ queries.T
+        candidates = limit if collapse == "none" else limit * max(overfetch, 1)
+
+        return [
+            self._collect(snapshot, self._top(column, candidates), column, limit, with_embeddings, collapse, neighbours)
+            for column in similarities.T
+        ]
+
+    @timed("numpy_store.search_hybrid")
+    def search_hybrid(self, query_embedding: List[float], query_text: str, limit: int = 2,
+                      exact: bool = False, with_embeddings: bool = False, collapse: str = "none",
+                      neighbours: int = 1, overfetch: int = 5, rrf_k: int = 60) -> List[Dict]:
+        """
+        Векторный и лексический списки по limit * overfetch кандидатов, объединённые RRF —
+        как ClickHouseVectorStore.search_hybrid, лексический поиск — по обратному индексу токенов.
+        """
+        if collapse not in COLLAPSE_MODES:
+            raise ValueError(f"Неизвестный режим свёртки: {collapse}. Допустимо: {COLLAPSE_MODES}")
+
+        tokens = lexical_tokens(query_text)
+        snapshot = self._current()
+        if not tokens or not snapshot.chunks:
+            return self.search_similar(query_embedding, limit=limit, with_embeddings=with_embeddings,
+                                       collapse=collapse, neighbours=neighbours, overfetch=overfetch)
+
+        similarities = self._similarities(snapshot, query_embedding)
+        candidates = limit * max(overfetch, 1)
+
+        # Число совпавших токенов запроса: слово в тексте или номер задачи
+        matches = np.zeros(len(snapshot.chunks), dtype=np.int32)
+        for token in tokens:
+            hit = np.zeros(len(snapshot.chunks), dtype=bool)
+            hit[snapshot.token_rows.get(token, [])] = True
+            if token.isdigit():
+                hit[snapshot.task_rows.get(int(token), [])] = True
+            matches += hit
+
+        lexical = np.flatnonzero(matches)
+        lexical = lexical[np.lexsort((-similarities[lexical], -matches[lexical]))][:candidates]
+
+        rrf = {}
+        for ranking in (self._top(similarities, candidates), lexical):
+            for rank, row in enumerate(ranking, start=1):
+                rrf[int(row)] = rrf.get(int(row), 0.0) + 1 / (rrf_k + rank)
+        order = sorted(rrf, key=lambda row: (-rrf[row], -similarities[row]))
+
+        return self._collect(snapshot, order, similarities, limit, with_embeddings, collapse, neighbours, rrf)
+
+    def _collect(self, snapshot: _Snapshot, order, similarities: np.ndarray, limit: int,
+                 with_embeddings: bool, collapse: str, neighbours: int, rrf: Dict = None) -> List[Dict]:
+        """Документы результата в порядке order: со свёрткой по задачам и склейкой соседних чанков."""
+        documents, seen = [], set()
+        for row in order:
+            if len(documents) == limit:
+                break
+            chunk = snapshot.chunks[row]
+            if collapse != "none":
+                if chunk["task_id"] in seen:
+                    continue
+                seen.add(chunk["task_id"])
+
+            document = {
+                "chunk_id": chunk["chunk_id"],
+                "task_id": chunk["task_id"],
+                "chunk_index": chunk["chunk_index"],
+                "title": chunk["title"],
+                "url": chunk["url"],
+                "text": chunk["text"],
+                "score": float(1.0 - similarities[row]),
+            }
+            if collapse == "merge":
+                parts = [
+                    snapshot.by_position[(chunk["task_id"], chunk_index)]
+                    for chunk_index in range(chunk["chunk_index"] - neighbours, chunk["chunk_index"] + neighbours + 1)
+                    if (chunk["task_id"], chunk_index) in snapshot.by_position
+                ]
+                document["chunk_indexes"] = [snapshot.chunks[part]["chunk_index"] for part in parts]
+                document["text"] = "\n".join(snapshot.chunks[part]["text"] for part in parts)
+            if with_embeddings:
+                document["embedding"] = snapshot.matrix[row].tolist()
+            if rrf is not None:
+                document["rrf"] = rrf[row]
+            documents.append(document)
+        return documents
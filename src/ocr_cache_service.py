@@ -0,0 +1,132 @@
+# src/ocr_cache_service.py
+# Кэш результатов OCR: одинаковые изображения не скачиваются и не распознаются повторно
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+from src.cache_service import DiskLRUCache
+from src.metrics_service import metrics
+
+# Кэш OCR по умолчанию; пустая переменная OCR_CACHE_PATH отключает кэш
+DEFAULT_CACHE_PATH = str(Path(__file__).parent.parent / ".cache" / "ocr.sqlite")
+
+# Версия ключей: меняется, если меняется распознавание (модели, языки, предобработка)
+KEY_VERSION = "v1"
+
+
+class OCRCache:
+    """
+    Распознанный текст изображений на диске (DiskLRUCache, вытеснение по LRU).
+
+    Ключи одной записи:
+    - file_unique_id Telegram — повторно присланный файл находится до скачивания;
+    - sha256 содержимого — то же изображение, присланное заново или другим пользователем;
+    - перцептивный хэш (dHash) — то же изображение после повторного сжатия. Включается параметром perceptual
+      (OCR_CACHE_PERCEPTUAL=1): мелкая правка текста на скриншоте может не изменить хэш,
+      и тогда вернётся текст прежнего изображения.
+
+    Вместе с текстом хранится время распознавания: при попадании оно добавляется к saved_seconds.
+    Попадания по типам ключей, промахи и сэкономленное время публикуются в метрики (ocr_cache.*).
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = 50_000, perceptual: bool = None):
+        """
+        :param path: Файл SQLite кэша.
+        :param max_entries: Максимум записей на диске (у изображения до трёх записей — по числу ключей).
+        :param perceptual: Искать изображения и по перцептивному хэшу.
+        """
+        self.cache = DiskLRUCache(path, max_entries=max_entries, memory_entries=1000, name="ocr")
+        if perceptual is None:
+            perceptual = os.getenv("OCR_CACHE_PERCEPTUAL", "0") == "1"
+        self.perceptual = perceptual
+
+        self._lock = threading.Lock()
+        self.file_hits = 0
+        self.content_hits = 0
+        self.perceptual_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def file_key(file_unique_id: str) -> str:
+        return f"ocr:{KEY_VERSION}:file:{file_unique_id}"
+
+    @staticmethod
+    def content_key(data: bytes) -> str:
+        return f"ocr:{KEY_VERSION}:sha256:{hashlib.sha256(data).hexdigest()}"
+
+    @staticmethod
+    def perceptual_key(perceptual_hash: str) -> str:
+        return f"ocr:{KEY_VERSION}:dhash:{perceptual_hash}"
+
+    def _get(self, key: str) -> Optional[dict]:
+        value = self.cache.get(key)
+        return json.loads(value) if value is not None else None
+
+    def _hit(self, entry: dict, counter: str) -> dict:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+            self.saved_seconds += entry["latency"]
+        metrics.inc(f"ocr_cache.{counter}")
+        metrics.inc("ocr_cache.saved_seconds", entry["latency"])
+        return entry
+
+    # Поиск возвращает запись {"text", "latency"} или None
+
+    def lookup_file(self, file_unique_id: str) -> Optional[dict]:
+        """Поиск по file_unique_id Telegram (до скачивания файла). Промах не считается: дальше проверяется содержимое."""
+        if not file_unique_id:
+            return None
+        entry = self._get(self.file_key(file_unique_id))
+        return self._hit(entry, "file_hits") if entry is not None else None
+
+    def lookup_content(self, data: bytes) -> Optional[dict]:
+        """Поиск по sha256 содержимого. Промах не считается: дальше проверяется перцептивный хэш."""
+        entry = self._get(self.content_key(data))
+        return self._hit(entry, "content_hits") if entry is not None else None
+
+    def lookup_perceptual(self, perceptual_hash: Optional[str]) -> Optional[dict]:
+        """Поиск по перцептивному хэшу (если он включён); последняя проверка — промах считается здесь."""
+        entry = None
+        if self.perceptual and perceptual_hash:
+            entry = self._get(self.perceptual_key(perceptual_hash))
+        if entry is not None:
+            return self._hit(entry, "perceptual_hits")
+
+        with self._lock:
+            self.misses += 1
+        metrics.inc("ocr_cache.misses")
+        return None
+
+    def store(self, text: str, latency: float, data: bytes = None, file_unique_id: str = None,
+              perceptual_hash: str = None):
+        """
+        Сохраняет текст под всеми известными ключами изображения.
+
+        :param latency: Сколько секунд заняло распознавание (для оценки сэкономленного времени).
+        """
+        value = json.dumps({"text": text, "latency": latency}, ensure_ascii=False).encode("utf-8")
+        if file_unique_id:
+            self.cache.set(self.file_key(file_unique_id), value)
+        if data is not None:
+            self.cache.set(self.content_key(data), value)
+        if self.perceptual and perceptual_hash:
+            self.cache.set(self.perceptual_key(perceptual_hash), value)
+
+    def stats(self) -> dict:
+        """Доля попаданий (по типам ключей) и сэкономленное время."""
+        with self._lock:
+            hits = self.file_hits + self.content_hits + self.perceptual_hits
+            total = hits + self.misses
+            return {
+                "hits": hits,
+                "file_hits": self.file_hits,
+                "content_hits": self.content_hits,
+                "perceptual_hits": self.perceptual_hits,
+                "misses": self.misses,
+                "hit_ratio": hits / total if total else 0.0,
+                "saved_seconds": self.saved_seconds,
+            }
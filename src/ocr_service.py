@@ -1,19 +1,40 @@
+import base64
+import json
 import os
+import threading
+import time
 from dotenv import load_dotenv
 from pathlib import Path
-import requests
+from typing import List, Optional
+
+from src.http_service import HTTPClient
+from src.image_service import ImagePreprocessor
+from src.metrics_service import timed
+from src.ocr_cache_service import DEFAULT_CACHE_PATH, OCRCache
 
 # Загружаем переменные из .env файла
 env_path = Path(__file__).parent.parent / ".env"
 load_dotenv(dotenv_path=env_path)
 
 class OCRService:
-    def __init__(self, folder_id: str = None, iam_token: str = None,):
+    # Модели распознавания: печатный текст (скриншоты) дешевле и быстрее рукописного
+    PRINTED_MODEL = "page"
+    HANDWRITTEN_MODEL = "handwritten"
+
+    # MIME-тип изображения → значение mimeType в запросе к OCR
+    MIME_TYPES = {"image/jpeg": "JPEG", "image/png": "PNG", "application/pdf": "PDF"}
+
+    def __init__(self, folder_id: str = None, iam_token: str = None, http_client: HTTPClient = None,
+                 preprocessor: ImagePreprocessor = None, cache: Optional[OCRCache] = None, use_cache: bool = True):
         """
         Инициализация OCR-сервиса для распознавания текста с изображений через Yandex Cloud OCR.
 
         :param folder_id: Идентификатор каталога в Yandex Cloud (берётся из переменной окружения, если не передан).
         :param iam_token: API-ключ для Yandex Cloud (берётся из переменной окружения, если не передан).
+        :param http_client: Общий HTTP-клиент с пулом соединений (иначе создаётся собственный).
+        :param preprocessor: Подготовка изображений перед отправкой (уменьшение, оттенки серого, пересжатие).
+        :param cache: Кэш распознанного текста. По умолчанию — файл из OCR_CACHE_PATH (пустое значение отключает кэш).
+        :param use_cache: False отключает кэш.
         """
         self.folder_id = folder_id or os.getenv("FOLDER_ID")
         self.iam_token = iam_token or os.getenv("IAM_TOKEN")
@@ -24,35 +45,139 @@ class OCRService:
             raise ValueError("IAM_TOKEN не указан ни в .env, ни в аргументах.")
 
         self.vision_url = "https://ocr.api.cloud.yandex.net/ocr/v1/recognizeText"
+        self.http_client = http_client or HTTPClient()
+
+        if cache is None and use_cache:
+            cache_path = os.getenv("OCR_CACHE_PATH", DEFAULT_CACHE_PATH)
+            cache = OCRCache(cache_path) if cache_path else None
+        self.cache = cache
+
+        # Перцептивный хэш считается, только если кэш по нему ищет
+        self.preprocessor = preprocessor or ImagePreprocessor(
+            perceptual_hash=self.cache is not None and self.cache.perceptual
+        )
+
+        self._lock = threading.Lock()
+        self.images = 0
+        self.original_bytes = 0
+        self.uploaded_bytes = 0
+        self.ocr_seconds = 0.0
 
-    def analyze_image(self, image_data: str) -> str:
+    def get_cached_text(self, image_id: str) -> Optional[str]:
+        """Текст уже распознанного файла Telegram по file_unique_id — позволяет не скачивать изображение."""
+        if self.cache is None:
+            return None
+        entry = self.cache.lookup_file(image_id)
+        return self._cached(entry) if entry is not None else None
+
+    @timed("ocr.analyze_image")
+    def analyze_image(self, image_data: bytes, image_id: str = None) -> str:
         """
         Отправляет изображение в Yandex Cloud OCR и возвращает распознанный текст.
+        Изображения, распознанные раньше (то же содержимое), берутся из кэша без обращения к OCR.
 
-        :param image_data: Изображение в виде base64-строки.
-        :return: Распознанный текст.
+        :param image_data: Файл изображения (байты, как скачаны из Telegram).
+        :param image_id: file_unique_id Telegram — под ним текст сохраняется для get_cached_text.
+        :return: Распознанный текст: строки блока через перевод строки, блоки — через пустую строку.
         """
+        start_time = time.time()
+
+        if self.cache is not None:
+            entry = self.cache.lookup_content(image_data)
+            if entry is not None:
+                return self._cached(entry, image_id)
+
+        image = self.preprocessor.prepare(image_data)
+
+        if self.cache is not None:
+            entry = self.cache.lookup_perceptual(image["perceptual_hash"])
+            if entry is not None:
+                return self._cached(entry, image_id, image_data)
+
+        model = self.PRINTED_MODEL if image["screenshot"] else self.HANDWRITTEN_MODEL
         payload = {
-            "mimeType": "image",
+            "mimeType": self.MIME_TYPES.get(image["mime_type"], "image"),
             "languageCodes": ["ru", "en"],
-            "model": "handwritten",
-            "content": image_data
+            "model": model,
         }
+        body, content_size = self._request_body(payload, image["data"])
 
         headers = {
             "Authorization": f"Api-Key {self.iam_token}",
-            "x-folder-id": self.folder_id
+            "x-folder-id": self.folder_id,
+            "Content-Type": "application/json",
         }
 
-        response = requests.post(self.vision_url, headers=headers, json=payload)
+        response = self.http_client.post(self.vision_url, headers=headers, data=body)
         response.raise_for_status()  # Проверка на HTTP-ошибки
 
-        blocks = response.json().get("result", {}).get("textAnnotation", {}).get("blocks", [])
-        text = ""
-        for block in blocks:
-            for line in block.get("lines", []):
-                for word in line.get("words", []):
-                    text += word.get("text", "") + " "
-                text += "\n"
+        blocks = self.parse_blocks(response.json())
+        text = self.format_text(blocks)
+
+        duration = time.time() - start_time
+        # Исходный объём — то, что отправлялось бы без предобработки (тоже в base64)
+        original_size = (len(image_data) + 2) // 3 * 4
+        with self._lock:
+            self.images += 1
+            self.original_bytes += original_size
+            self.uploaded_bytes += content_size
+            self.ocr_seconds += duration
+        print(f"📤 OCR: {content_size / 1024:.0f} КБ (исходно {original_size / 1024:.0f} КБ), "
+              f"модель {model}, {duration:.2f} с")
+
+        if self.cache is not None:
+            self.cache.store(text, duration, data=image_data, file_unique_id=image_id,
+                             perceptual_hash=image["perceptual_hash"])
+        return text
+
+    @staticmethod
+    def _request_body(payload: dict, image: bytes) -> tuple:
+        """
+        Тело запроса в JSON: изображение кодируется в base64 один раз и вставляется байтами,
+        без промежуточной строки и повторного прохода json.dumps по мегабайтам base64.
+
+        :return: Тело запроса и размер поля content.
+        """
+        content = base64.b64encode(image)
+        head = json.dumps(payload)[:-1].encode("utf-8")
+        return b"".join((head, b', "content": "', content, b'"}')), len(content)
+
+    @staticmethod
+    def parse_blocks(result: dict) -> List[List[str]]:
+        """Текст ответа OCR по блокам: для каждого блока — список его строк."""
+        blocks = []
+        for block in result.get("result", {}).get("textAnnotation", {}).get("blocks", []):
+            lines = [
+                line.get("text") or " ".join(word.get("text", "") for word in line.get("words", []))
+                for line in block.get("lines", [])
+            ]
+            blocks.append([line for line in lines if line])
+        return [lines for lines in blocks if lines]
+
+    @staticmethod
+    def format_text(blocks: List[List[str]]) -> str:
+        """Текст из блоков: строки блока через перевод строки, блоки — через пустую строку."""
+        return "\n\n".join("\n".join(lines) for lines in blocks)
+
+    def _cached(self, entry: dict, image_id: str = None, data: bytes = None) -> str:
+        """Текст из кэша; запись дополняется ключами, под которыми её ещё не было (file_unique_id, содержимое)."""
+        if image_id or data is not None:
+            self.cache.store(entry["text"], entry["latency"], data=data, file_unique_id=image_id)
+
+        stats = self.cache.stats()
+        print(f"⚡ OCR из кэша (попаданий {stats['hit_ratio']:.0%}, сэкономлено {stats['saved_seconds']:.1f} с)")
+        return entry["text"]
 
-        return text.strip()
\ No newline at end of file
+    def stats(self) -> dict:
+        """Объём отправленных изображений, время распознавания и счётчики кэша."""
+        with self._lock:
+            stats = {
+                "images": self.images,
+                "original_bytes": self.original_bytes,
+                "uploaded_bytes": self.uploaded_bytes,
+                "avg_uploaded_bytes": self.uploaded_bytes / self.images if self.images else 0.0,
+                "avg_seconds": self.ocr_seconds / self.images if self.images else 0.0,
+            }
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        return stats
\ No newline at end of file
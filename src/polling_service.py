@@ -0,0 +1,227 @@
+# src/polling_service.py
+# Асинхронный long-polling Telegram с параллельной обработкой сообщений
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from src.http_service import HTTP_ERRORS, HTTPClient
+
+
+class PollingService:
+    """
+    Получает обновления Telegram через long-polling (getUpdates с параметром timeout)
+    и раздаёт их ограниченному пулу обработчиков.
+
+    - Сообщения одного чата обрабатываются строго по порядку, разные чаты — параллельно.
+    - Число одновременно работающих обработчиков ограничено max_concurrency.
+    - Число принятых, но ещё не обработанных обновлений ограничено max_pending:
+      при переполнении новые обновления не запрашиваются (backpressure).
+    - getUpdates всегда запрашивается с offset после последнего принятого обновления: это настоящий
+      long-polling и пока обработчики работают — новые сообщения приходят сразу, а запросы не повторяются.
+      Такой offset подтверждает в Telegram и обновления, которые ещё обрабатываются, поэтому повторную
+      доставку обеспечивает сам сервис: принятые, но не обработанные обновления записываются в журнал
+      journal_path и после перезапуска обрабатываются первыми. При остановке сервис дожидается обработчиков
+      и подтверждает offset до самого раннего необработанного обновления.
+    """
+
+    def __init__(self,
+                 bot_token: str,
+                 handler: Callable[[dict], None],
+                 max_concurrency: int = 4,
+                 max_pending: int = 50,
+                 poll_timeout: int = 30,
+                 skip_pending: bool = True,
+                 api_url: str = "https://api.telegram.org",
+                 http_client: HTTPClient = None,
+                 journal_path: str = None
+                 ):
+        """
+        :param bot_token: Токен бота.
+        :param handler: Синхронный обработчик одного обновления (словарь из getUpdates).
+        :param max_concurrency: Максимум одновременно обрабатываемых обновлений.
+        :param max_pending: Максимум принятых, но не обработанных обновлений (не больше 100 — лимита getUpdates).
+        :param poll_timeout: Таймаут long-polling в секундах.
+        :param skip_pending: Пропустить обновления, накопившиеся до запуска.
+        :param api_url: Адрес Bot API (для тестов можно указать локальный сервер).
+        :param http_client: Общий HTTP-клиент с пулом соединений (иначе создаётся собственный).
+        :param journal_path: Файл журнала принятых, но не обработанных обновлений (JSON). Если не указан,
+            обновления, обрабатывавшиеся в момент падения процесса, повторно не обрабатываются.
+        """
+        self.url = f"{api_url}/bot{bot_token}/getUpdates"
+        self.handler = handler
+        self.max_concurrency = max_concurrency
+        self.max_pending = min(max_pending, 100)
+        self.poll_timeout = poll_timeout
+        self.skip_pending = skip_pending
+        self.http_client = http_client or HTTPClient()
+        self.journal_path = Path(journal_path) if journal_path else None
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: Optional[asyncio.Semaphore] = None
+        self._stopped: Optional[asyncio.Event] = None
+        self._chats: Dict[int, List[dict]] = {}
+        self._workers = set()
+        self._in_flight: Dict[int, dict] = {}
+        self._last_seen = -1
+
+        self.processed = 0
+        self.failed = 0
+
+    def get_updates(self, offset: int = None, timeout: int = None) -> List[dict]:
+        """Запрашивает обновления у Bot API (блокирующий вызов, выполняется в отдельном потоке)."""
+        timeout = self.poll_timeout if timeout is None else timeout
+        params = {"timeout": timeout}
+        if offset is not None:
+            params["offset"] = offset
+
+        # Таймаут чтения больше таймаута long-polling: сервер держит запрос до timeout секунд
+        response = self.http_client.get(self.url, params=params, timeout=timeout + 10)
+        response.raise_for_status()
+
+        return response.json()["result"]
+
+    def _poll_offset(self) -> Optional[int]:
+        """Offset для long-polling: следующее после последнего принятого обновление."""
+        if self._last_seen < 0:
+            return None
+        return self._last_seen + 1
+
+    def _ack_offset(self) -> Optional[int]:
+        """Offset при остановке: всё, что раньше него, обработано и может быть подтверждено."""
+        if self._in_flight:
+            return min(self._in_flight)
+        return self._poll_offset()
+
+    def _load_journal(self) -> List[dict]:
+        """Обновления, не обработанные до прошлой остановки процесса (в порядке update_id)."""
+        if self.journal_path is None or not self.journal_path.exists():
+            return []
+        try:
+            updates = json.loads(self.journal_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Не удалось прочитать журнал обновлений: {e}")
+            return []
+        return sorted(updates, key=lambda update: update["update_id"])
+
+    def _write_journal(self):
+        """Записывает принятые, но не обработанные обновления атомарно (не больше max_pending записей)."""
+        if self.journal_path is None:
+            return
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.journal_path.with_name(self.journal_path.name + ".tmp")
+        temporary.write_text(json.dumps(list(self._in_flight.values()), ensure_ascii=False), encoding="utf-8")
+        os.replace(temporary, self.journal_path)
+
+    async def run(self):
+        """Основной цикл: long-polling без фиксированных пауз и раздача обновлений обработчикам."""
+        loop = asyncio.get_running_loop()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="bot-handler")
+        self._pending = asyncio.Semaphore(self.max_pending)
+        self._stopped = asyncio.Event()
+
+        restored = self._load_journal()
+        if restored:
+            self._last_seen = restored[-1]["update_id"]
+
+        if self.skip_pending:
+            # offset=-1 возвращает только последнее обновление — всё, что было до запуска, пропускаем
+            updates = await loop.run_in_executor(None, self.get_updates, -1, 0)
+            if updates:
+                self._last_seen = max(self._last_seen, updates[-1]["update_id"])
+
+        print(f"🤖 Бот запущен: до {self.max_concurrency} обработчиков одновременно")
+
+        try:
+            if restored:
+                print(f"🔁 Повторная обработка после перезапуска: {len(restored)} обновлений")
+            for update in restored:
+                await self._dispatch(update)
+
+            while not self._stopped.is_set():
+                # Не запрашиваем новые обновления, пока очередь переполнена
+                await self._pending.acquire()
+                self._pending.release()
+
+                try:
+                    updates = await loop.run_in_executor(None, self.get_updates, self._poll_offset())
+                except HTTP_ERRORS as e:
+                    print(f"⚠️ Ошибка getUpdates: {e}")
+                    await asyncio.sleep(1)
+                    continue
+
+                for update in updates:
+                    if update["update_id"] <= self._last_seen:
+                        continue  # уже принято (например, восстановлено из журнала)
+                    self._last_seen = update["update_id"]
+                    await self._dispatch(update)
+        finally:
+            await self._shutdown()
+
+    def stop(self):
+        """Останавливает получение обновлений; уже принятые будут обработаны."""
+        if self._stopped is not None:
+            self._stopped.set()
+
+    async def _dispatch(self, update: dict):
+        """Ставит обновление в очередь его чата и запускает обработчик чата, если он не работает."""
+        await self._pending.acquire()
+        self._in_flight[update["update_id"]] = update
+        self._write_journal()
+
+        chat_id = self._chat_id(update)
+        if chat_id in self._chats:
+            self._chats[chat_id].append(update)
+            return
+
+        self._chats[chat_id] = [update]
+        worker = asyncio.create_task(self._drain_chat(chat_id))
+        self._workers.add(worker)
+        worker.add_done_callback(self._workers.discard)
+
+    async def _drain_chat(self, chat_id: int):
+        """Последовательно обрабатывает очередь одного чата."""
+        loop = asyncio.get_running_loop()
+        queue = self._chats[chat_id]
+
+        while queue:
+            update = queue[0]
+            try:
+                await loop.run_in_executor(self._executor, self.handler, update)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"⚠️ Ошибка обработки обновления {update['update_id']}: {e}")
+            finally:
+                queue.pop(0)
+                self._in_flight.pop(update["update_id"], None)
+                self._write_journal()
+                self._pending.release()
+
+        del self._chats[chat_id]
+
+    async def _shutdown(self):
+        """Дожидается обработки принятых обновлений и подтверждает их в Telegram."""
+        if self._workers:
+            await asyncio.gather(*self._workers, return_exceptions=True)
+
+        if self._last_seen >= 0:
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(None, self.get_updates, self._ack_offset(), 0)
+            except HTTP_ERRORS as e:
+                print(f"⚠️ Не удалось подтвердить обновления: {e}")
+
+        self._executor.shutdown(wait=True)
+
+    @staticmethod
+    def _chat_id(update: dict) -> int:
+        """Идентификатор чата, к которому относится обновление (для сохранения порядка)."""
+        for key in ("message", "edited_message", "channel_post", "edited_channel_post"):
+            if key in update:
+                return update[key]["chat"]["id"]
+        if "callback_query" in update:
+            return update["callback_query"]["from"]["id"]
+        return 0
@@ -1,5 +1,29 @@
-from langchain_core.prompts import PromptTemplate
+# src/prompt_service.py
+# Шаблоны промптов: PromptService для одного шаблона, PromptRegistry — все шаблоны prompts/ с версиями и кэшем цепочек
+import hashlib
+import os
+import threading
+import time
 from pathlib import Path
+from typing import Any, Dict, Tuple
+
+from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import RunnableSequence
+
+from src.metrics_service import timed
+
+DEFAULT_TEMPLATE_PATH = 'prompts/answer_from_documents.txt'
+
+
+def make_template_version(name: str, template: str) -> str:
+    """Версия шаблона: имя и хэш текста — меняется при любой правке шаблона."""
+    return f"{name}:{hashlib.sha256(template.encode('utf-8')).hexdigest()[:12]}"
+
+
+def get_template_version(prompt_template: PromptTemplate) -> str:
+    """Версия шаблона из его метаданных (шаблоны из PromptRegistry) или по тексту (шаблоны, собранные вручную)."""
+    metadata = prompt_template.metadata or {}
+    return metadata.get("template_version") or make_template_version("inline", prompt_template.template)
 
 
 class PromptService:
@@ -9,7 +33,7 @@ class PromptService:
 
     def __init__(self,
                  prompt_template: str = None,
-                 template_path: str = 'prompts/answer_from_documents.txt'
+                 template_path: str = DEFAULT_TEMPLATE_PATH
                  ):
         """
         Инициализация сервиса промптов.
@@ -34,4 +58,130 @@ class PromptService:
         """
         Возвращает объект PromptTemplate — можно использовать в цепочках LangChain.
         """
-        return self.prompt_template
\ No newline at end of file
+        return self.prompt_template
+
+
+class PromptRegistry:
+    """
+    Все шаблоны из каталога prompts/, разобранные один раз.
+
+    - При создании читаются и компилируются все файлы *.txt каталога; файлы, появившиеся позже,
+      загружаются при первом обращении.
+    - Шаблон перечитывается, если изменилось время модификации файла (проверка не чаще раза
+      в reload_interval секунд) — правка промпта подхватывается без перезапуска бота.
+    - У каждого шаблона есть версия (путь и хэш текста, см. make_template_version); она же лежит
+      в PromptTemplate.metadata["template_version"] — по ней различают ответы в кэше и трассы Langfuse.
+    - Цепочки промпт → LLM кэшируются по (шаблон, модель, температура, клиент LLM) и пересобираются
+      только после изменения шаблона.
+
+    Переменные окружения:
+    - PROMPT_RELOAD_INTERVAL (2) — как часто проверять изменения файлов шаблонов, секунды; 0 — при каждом обращении
+    """
+
+    def __init__(self,
+                 directory: str = "prompts",
+                 reload_interval: float = None
+                 ):
+        """
+        :param directory: Каталог с шаблонами (*.txt).
+        :param reload_interval: Как часто проверять время модификации файлов, секунды.
+        """
+        if reload_interval is None:
+            reload_interval = float(os.getenv("PROMPT_RELOAD_INTERVAL", "2"))
+        if reload_interval < 0:
+            raise ValueError("PROMPT_RELOAD_INTERVAL не может быть отрицательным.")
+
+        self.directory = Path(directory)
+        self.reload_interval = reload_interval
+
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._chains: Dict[Tuple[str, str, float, int], Tuple[str, RunnableSequence]] = {}
+        self.reloads = 0
+
+        for template_file in sorted(self.directory.glob("*.txt")):
+            self.get(template_file.as_posix())
+
+    @timed("prompt.load")
+    def _load(self, template_path: str) -> Dict[str, Any]:
+        template_file = Path(template_path)
+        if not template_file.exists():
+            raise FileNotFoundError(f"Файл шаблона не найден: {template_file.resolve()}")
+        mtime = template_file.stat().st_mtime_ns
+        template = template_file.read_text(encoding="utf-8").strip()
+        version = make_template_version(template_path, template)
+        return {
+            "prompt_template": PromptTemplate.from_template(
+                template, metadata={"template_path": template_path, "template_version": version}
+            ),
+            "version": version,
+            "mtime": mtime,
+            "checked_at": time.monotonic(),
+        }
+
+    def get(self, template_path: str) -> PromptTemplate:
+        """Скомпилированный шаблон; файл перечитывается, только если он изменился."""
+        entry = self._entries.get(template_path)
+        if entry is None:
+            template_path = Path(template_path).as_posix()
+            entry = self._entries.get(template_path)
+        if entry is not None and time.monotonic() - entry["checked_at"] < self.reload_interval:
+            return entry["prompt_template"]
+
+        with self._lock:
+            entry = self._entries.get(template_path)
+            if entry is None:
+                entry = self._entries[template_path] = self._load(template_path)
+                return entry["prompt_template"]
+
+            entry["checked_at"] = time.monotonic()
+            try:
+                mtime = Path(template_path).stat().st_mtime_ns
+            except OSError:
+                # Файл удалён или недоступен — продолжаем работать с последней загруженной версией
+                return entry["prompt_template"]
+
+            if mtime != entry["mtime"]:
+                reloaded = self._load(template_path)
+                if reloaded["version"] != entry["version"]:
+                    self.reloads += 1
+                    print(f"🔄 Шаблон {template_path} перезагружен: {reloaded['version']}")
+                entry = self._entries[template_path] = reloaded
+            return entry["prompt_template"]
+
+    def version(self, template_path: str) -> str:
+        """Текущая версия шаблона."""
+        return get_template_version(self.get(template_path))
+
+    @timed("prompt.get_chain")
+    def get_chain(self, prompt_template: PromptTemplate, llm, model: str, temperature: float) -> RunnableSequence:
+        """
+        Цепочка промпт → LLM для (шаблон, модель, температура). Собирается при первом обращении
+        и после изменения шаблона; llm — клиент модели с этими параметрами.
+
+        Клиент входит в ключ кэша: у LLMService с той же моделью и температурой могут отличаться
+        max_tokens или клиент, и каждый получает цепочку со своим llm. Закэшированная цепочка
+        держит ссылку на llm, поэтому id(llm) не переиспользуется, пока запись жива.
+        """
+        metadata = prompt_template.metadata or {}
+        name = metadata.get("template_path") or get_template_version(prompt_template)
+        version = get_template_version(prompt_template)
+        key = (name, model, temperature, id(llm))
+
+        cached = self._chains.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        with self._lock:
+            cached = self._chains.get(key)
+            if cached is None or cached[0] != version:
+                cached = self._chains[key] = (version, prompt_template | llm)
+            return cached[1]
+
+    def versions(self) -> Dict[str, str]:
+        """Версии всех загруженных шаблонов по путям."""
+        return {path: entry["version"] for path, entry in self._entries.items()}
+
+    def stats(self) -> dict:
+        """Число шаблонов, собранных цепочек и перезагрузок."""
+        return {"templates": len(self._entries), "chains": len(self._chains), "reloads": self.reloads}
@@ -1,73 +1,265 @@
 # src/rag_service.py
-from typing import List, Dict, Any
+import os
+import time
+from typing import Any, Dict, Iterable, Iterator, List
 import pandas as pd
-from langchain_community.document_loaders import DataFrameLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+from src.context_builder import ContextBuilder
 from src.embedding_service import YandexEmbeddingService
+from src.metrics_service import metrics
 from src.clickhouse_service import ClickHouseVectorStore
+from src.numpy_vector_store import NumpyVectorStore
+from src.rerank_service import Reranker
+from src.vector_store import VectorStore, content_hash, make_chunk_id
+
+VECTOR_STORE_BACKENDS = ("clickhouse", "numpy")
+
+
+def create_vector_store(backend: str = None) -> VectorStore:
+    """
+    Создаёт векторное хранилище: "clickhouse" — ClickHouseVectorStore, "numpy" — локальный NumpyVectorStore.
+    По умолчанию — переменная окружения VECTOR_STORE_BACKEND или "clickhouse".
+    """
+    backend = backend or os.getenv("VECTOR_STORE_BACKEND", "clickhouse")
+    if backend == "clickhouse":
+        return ClickHouseVectorStore()
+    if backend == "numpy":
+        return NumpyVectorStore()
+    raise ValueError(f"Неизвестное векторное хранилище: {backend}. Допустимо: {VECTOR_STORE_BACKENDS}")
 
 
 class RAGService:
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 0):
+    SEARCH_MODES = ("vector", "hybrid")
+
+    def __init__(self,
+                 chunk_size: int = 1000,
+                 chunk_overlap: int = 0,
+                 embedding_service: YandexEmbeddingService = None,
+                 vector_store: VectorStore = None,
+                 collapse: str = "best",
+                 search_mode: str = None,
+                 vector_store_backend: str = None,
+                 context_builder: ContextBuilder = None,
+                 reranker: Reranker = None,
+                 rerank_candidates: int = None
+                 ):
+        """
+        :param collapse: Свёртка результатов поиска по задачам (см. ClickHouseVectorStore.search_similar):
+            по умолчанию "best" — top_k различных задач, каждая своим лучшим чанком.
+        :param search_mode: "vector" — только косинусное расстояние, "hybrid" — векторный и лексический
+            поиск с объединением через RRF (ClickHouseVectorStore.search_hybrid).
+            По умолчанию — переменная окружения RAG_SEARCH_MODE или "hybrid".
+        :param vector_store_backend: Какое хранилище создать, если vector_store не передан:
+            "clickhouse" или "numpy" (см. create_vector_store).
+        :param context_builder: Сборка контекста промпта (бюджет токенов, дубликаты).
+            По умолчанию — ContextBuilder с бюджетом из RAG_CONTEXT_TOKENS.
+        :param reranker: Переранжирование кандидатов поиска (см. Reranker). По умолчанию — Reranker().
+        :param rerank_candidates: Сколько кандидатов запрашивать у хранилища для переранжирования.
+            По умолчанию — переменная окружения RAG_RERANK_CANDIDATES или 30; 0 отключает переранжирование.
+        """
+        search_mode = search_mode or os.getenv("RAG_SEARCH_MODE", "hybrid")
+        if search_mode not in self.SEARCH_MODES:
+            raise ValueError(f"Неизвестный режим поиска: {search_mode}. Допустимо: {self.SEARCH_MODES}")
+        if rerank_candidates is None:
+            rerank_candidates = int(os.getenv("RAG_RERANK_CANDIDATES", "30"))
+        if rerank_candidates < 0:
+            raise ValueError("RAG_RERANK_CANDIDATES не может быть отрицательным.")
+
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=self.chunk_size,
             chunk_overlap=self.chunk_overlap
         )
-        self.embedding_service = YandexEmbeddingService()
-        self.vector_store = ClickHouseVectorStore()
+        # Клиенты можно передать готовыми, чтобы не создавать их на каждый запрос
+        self.embedding_service = embedding_service or YandexEmbeddingService()
+        self.vector_store = vector_store or create_vector_store(vector_store_backend)
+        self.collapse = collapse
+        self.search_mode = search_mode
+        self.context_builder = context_builder or ContextBuilder()
+        self.reranker = reranker or Reranker()
+        self.rerank_candidates = rerank_candidates
+
+    def iter_chunks(self, documents: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        Разбивает документы на чанки по одному документу за раз.
+        Документ — словарь с полями id, title, url и search (текст для поиска).
+        """
+        for document in documents:
+            for chunk_index, text in enumerate(self.text_splitter.split_text(document["search"])):
+                yield {
+                    "chunk_id": make_chunk_id(document["id"], chunk_index),
+                    "task_id": document["id"],
+                    "chunk_index": chunk_index,
+                    "title": document.get("title"),
+                    "url": document.get("url"),
+                    "text": text,
+                    "content_hash": content_hash(text),
+                }
+
+    def iter_embedded_chunks(self, documents: Iterable[Dict[str, Any]],
+                             batch_size: int = 256,
+                             stats: Dict[str, int] = None,
+                             copy_unchanged: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Чанки с эмбеддингами. Эмбеддинги запрашиваются пачками по batch_size чанков,
+        поэтому в памяти одновременно находится не больше одной пачки.
+
+        :param stats: Словарь, в который накапливаются счётчики chunks, copied, reused и generated.
+        :param copy_unchanged: Не загружать эмбеддинги чанков, которые уже сохранены в хранилище без изменений
+            (см. VectorStore.get_unchanged_chunk_ids): они помечаются unchanged=True и копируются
+            хранилищем в replace_documents.
+        """
+        if stats is None:
+            stats = {}
+        for key in ("chunks", "copied", "reused", "generated"):
+            stats.setdefault(key, 0)
+
+        batch = []
+        for chunk in self.iter_chunks(documents):
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                yield from self._embed_batch(batch, stats, copy_unchanged)
+                batch = []
+        if batch:
+            yield from self._embed_batch(batch, stats, copy_unchanged)
+
+    def _embed_batch(self, batch: List[Dict[str, Any]], stats: Dict[str, int],
+                     copy_unchanged: bool = False) -> List[Dict[str, Any]]:
+        pending = batch
+        if copy_unchanged:
+            unchanged = self.vector_store.get_unchanged_chunk_ids(batch)
+            pending = []
+            for chunk in batch:
+                if chunk["chunk_id"] in unchanged:
+                    chunk["unchanged"] = True
+                else:
+                    pending.append(chunk)
+
+        generated = self._attach_embeddings(pending) if pending else 0
+        stats["chunks"] += len(batch)
+        stats["copied"] += len(batch) - len(pending)
+        stats["generated"] += generated
+        stats["reused"] += len(pending) - generated
+        return batch
 
     def prepare_documents(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
         """
         Загружает документы из DataFrame, разбивает на чанки и генерирует эмбеддинги.
         Возвращает список словарей с метаданными и эмбеддингами.
+
+        Эмбеддинги чанков, текст которых не изменился с прошлой индексации, берутся из хранилища
+        по хэшу текста — через API векторизуются только новые и изменённые чанки.
+        Для больших корпусов используйте ingest_stream: он не держит все чанки в памяти.
         """
-        # Загружаем документы
-        loader = DataFrameLoader(df, page_content_column='search')
-        docs = loader.load()
+        stats = {}
+        start_time = time.time()
+        embeddings_data = list(self.iter_embedded_chunks(df.to_dict("records"), stats=stats))
+        self._report(stats, time.time() - start_time)
 
-        # Разбиваем на чанки
-        texts = self.text_splitter.split_documents(docs)
+        return embeddings_data
 
-        embeddings_data = []
-        for doc in texts:
-            text = doc.page_content
-            metadata = doc.metadata
-            embedding = self.embedding_service.embed_text(text)
+    def _attach_embeddings(self, chunks: List[Dict[str, Any]]) -> int:
+        """
+        Добавляет чанкам эмбеддинги: сохранённые — из хранилища, недостающие — через API.
+        Возвращает число эмбеддингов, полученных через API.
+        """
+        known = self.vector_store.get_embeddings_by_hash(list({chunk["content_hash"] for chunk in chunks}))
 
-            embeddings_data.append({
-                "id": metadata.get("id"),
-                "title": metadata.get("title"),
-                "url": metadata.get("url"),
-                "text": text,
-                "embedding": embedding
-            })
+        # Эмбеддинги новых чанков запрашиваются параллельно, порядок сохраняется
+        missing = list(dict.fromkeys(chunk["text"] for chunk in chunks if chunk["content_hash"] not in known))
+        embeddings = self.embedding_service.embed_texts(missing)
 
-            print(f"✅ Эмбеддинг для документа {metadata.get('id')} сгенерирован. Длина: {len(embedding)}")
+        for text, embedding in zip(missing, embeddings):
+            known[content_hash(text)] = embedding
 
-        return embeddings_data
+        for chunk in chunks:
+            chunk["embedding"] = known[chunk["content_hash"]]
 
-    def ingest(self, df: pd.DataFrame):
+        return len(missing)
+
+    @staticmethod
+    def _report(stats: Dict[str, int], duration: float):
+        if stats.get("copied"):
+            print(f"📋 Скопировано без изменений: {stats['copied']}")
+        print(f"♻️ Переиспользовано эмбеддингов: {stats['reused']}")
+        print(f"✅ Обработано {stats['chunks']} чанков за {duration:.1f} с "
+              f"({stats['chunks'] / max(duration, 1e-9):.1f} чанков/с), "
+              f"сгенерировано эмбеддингов: {stats['generated']}")
+
+    def ingest_stream(self, documents: Iterable[Dict[str, Any]],
+                      vector_index: bool = False,
+                      batch_size: int = 256,
+                      block_size: int = 10_000):
         """
-        Полный процесс: подготовка документов и сохранение в ClickHouse.
+        Потоковая индексация: документы читаются лениво (см. src/task_loader.py), режутся на чанки,
+        векторизуются пачками по batch_size и вставляются в теневую таблицу блоками по block_size строк.
+        Пиковая память не зависит от размера корпуса.
+
+        Новая версия корпуса атомарно подменяет основную таблицу: удалённые задачи исчезают
+        из поиска, а поиск работает всё время переиндексации.
+
+        Неизменённые чанки (тот же текст, заголовок и ссылка) не векторизуются и не пересылаются:
+        хранилище копирует их из текущей версии само (см. ClickHouseVectorStore.replace_documents).
         """
-        documents_with_embeddings = self.prepare_documents(df)
-        self.vector_store.add_documents(documents_with_embeddings)
-        print(f"✅ Векторизация и сохранение завершены. Загружено {len(documents_with_embeddings)} чанков.")
+        stats = {}
+        start_time = time.time()
+        chunks = self.iter_embedded_chunks(documents, batch_size=batch_size, stats=stats, copy_unchanged=True)
+        self.vector_store.replace_documents(chunks, vector_index=vector_index, block_size=block_size)
+        self._report(stats, time.time() - start_time)
+        print(f"✅ Векторизация и сохранение завершены. Загружено {stats['chunks']} чанков.")
 
-    def search_relevant_documents(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+    def ingest(self, df: pd.DataFrame, vector_index: bool = False):
+        """Полный процесс для документов из DataFrame: подготовка и сохранение в ClickHouse."""
+        self.ingest_stream(df.to_dict("records"), vector_index=vector_index)
+
+    def search_relevant_documents(self, query: str, top_k: int = 3,
+                                  with_embeddings: bool = False,
+                                  query_embedding: List[float] = None) -> List[Dict[str, Any]]:
         """
-        Ищет релевантные документы по запросу.
+        Ищет релевантные документы по запросу: top_k различных задач (если свёртка не отключена),
+        в режиме hybrid — с учётом точных совпадений слов и номеров задач.
+        Если rerank_candidates больше top_k, у хранилища запрашивается rerank_candidates кандидатов,
+        из которых Reranker выбирает top_k релевантных и непохожих друг на друга.
+        with_embeddings=True добавляет к документам сохранённые эмбеддинги чанков.
+        query_embedding — уже посчитанный эмбеддинг запроса (чтобы не векторизовать его повторно).
         """
-        query_embedding = self.embedding_service.embed_query(query)
-        results = self.vector_store.search_similar(query_embedding, limit=top_k)
+        if query_embedding is None:
+            query_embedding = self.embedding_service.embed_query(query)
+
+        rerank = self.rerank_candidates > top_k
+        limit = self.rerank_candidates if rerank else top_k
+        # Для переранжирования нужны эмбеддинги кандидатов
+        fetch_embeddings = with_embeddings or rerank
+        if self.search_mode == "hybrid":
+            results = self.vector_store.search_hybrid(query_embedding, query, limit=limit,
+                                                      with_embeddings=fetch_embeddings, collapse=self.collapse)
+        else:
+            results = self.vector_store.search_similar(query_embedding, limit=limit,
+                                                       with_embeddings=fetch_embeddings, collapse=self.collapse)
+        if not rerank:
+            return results
+
+        results, stats = self.reranker.rerank(query, query_embedding, results, top_k=top_k)
+        metrics.observe("rag.rerank", stats["latency_ms"] / 1000)
+        print(f"🔀 Переранжирование: {stats['candidates']} → {stats['selected']} "
+              f"за {stats['latency_ms']:.1f} мс" + (" (бюджет превышен)" if stats["over_budget"] else ""))
+        if not with_embeddings:
+            for doc in results:
+                doc.pop("embedding", None)
         return results
 
     def format_context(self, relevant_docs: List[Dict[str, Any]]) -> str:
         """
-        Формирует строку контекста из списка релевантных документов.
+        Формирует строку контекста из списка релевантных документов (в порядке релевантности):
+        без почти одинаковых фрагментов и в пределах бюджета токенов (см. ContextBuilder).
         """
-        return "\n\n".join([doc['text'] for doc in relevant_docs])
+        with metrics.timer("rag.format_context"):
+            context, stats = self.context_builder.build(relevant_docs)
+        saved = stats["tokens_before"] - stats["tokens_after"]
+        print(f"✂️ Контекст: {stats['tokens_after']} токенов из {stats['tokens_before']} "
+              f"(сэкономлено {saved}, дубликатов {stats['duplicates']}, обрезано {stats['truncated']}, "
+              f"отброшено {stats['dropped']})")
+        return context
 
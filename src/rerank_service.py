@@ -0,0 +1,152 @@
+# src/rerank_service.py
+# Переранжирование кандидатов поиска без LLM: близость к запросу, совпадение слов и разнообразие (MMR)
+import os
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from src.vector_store import TOKEN_PATTERN, lexical_tokens
+
+
+class Reranker:
+    """
+    Выбирает из кандидатов поиска (например, 30 лучших по расстоянию) несколько чанков для генерации.
+
+    Релевантность кандидата — смесь косинусного сходства с запросом (по сохранённым эмбеддингам)
+    и доли слов запроса, встречающихся в заголовке и тексте чанка (lexical_weight).
+    Затем чанки выбираются жадно по MMR:
+    mmr_lambda · релевантность − (1 − mmr_lambda) · максимальное сходство с уже выбранными —
+    так в контекст не попадают несколько пересказов одного и того же.
+
+    У шага есть бюджет времени: если он исчерпан, оставшиеся места заполняются по релевантности без MMR.
+    Время каждого вызова пишется в лог, сводка — stats().
+
+    Переменные окружения:
+    - RERANK_BUDGET_MS (20) — бюджет времени на переранжирование, миллисекунды
+    """
+
+    def __init__(self,
+                 mmr_lambda: float = 0.7,
+                 lexical_weight: float = 0.3,
+                 budget_ms: float = None
+                 ):
+        """
+        :param mmr_lambda: Вес релевантности в MMR (1 — только релевантность, 0 — только разнообразие).
+        :param lexical_weight: Вес совпадения слов запроса в релевантности (остальное — косинусное сходство).
+        :param budget_ms: Бюджет времени на переранжирование, миллисекунды. 0 — MMR не выполняется
+            (выбор только по релевантности), float("inf") — без ограничения. По умолчанию — RERANK_BUDGET_MS.
+        """
+        if not 0 <= mmr_lambda <= 1:
+            raise ValueError("mmr_lambda должен быть в диапазоне [0, 1].")
+        if not 0 <= lexical_weight <= 1:
+            raise ValueError("lexical_weight должен быть в диапазоне [0, 1].")
+
+        self.mmr_lambda = mmr_lambda
+        self.lexical_weight = lexical_weight
+        self.budget_ms = budget_ms if budget_ms is not None else float(os.getenv("RERANK_BUDGET_MS", "20"))
+        if self.budget_ms < 0:
+            raise ValueError("RERANK_BUDGET_MS не может быть отрицательным.")
+
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.over_budget = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+    @staticmethod
+    def lexical_overlap(query_text: str, documents: List[Dict[str, Any]]) -> np.ndarray:
+        """Доля слов запроса (без стоп-слов), встречающихся в заголовке или тексте каждого документа."""
+        tokens = lexical_tokens(query_text)
+        if not tokens:
+            return np.zeros(len(documents), dtype=np.float32)
+
+        overlap = np.empty(len(documents), dtype=np.float32)
+        for i, doc in enumerate(documents):
+            words = set(TOKEN_PATTERN.findall(f"{doc.get('title') or ''} {doc['text']}".lower()))
+            words.add(str(doc.get("task_id")))
+            overlap[i] = sum(token in words for token in tokens) / len(tokens)
+        return overlap
+
+    def rerank(self, query_text: str, query_embedding: List[float], candidates: List[Dict[str, Any]],
+               top_k: int = 3) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Лучшие top_k кандидатов с учётом разнообразия.
+
+        :param candidates: Результаты поиска с эмбеддингами (with_embeddings=True), в порядке поиска.
+        :return: Выбранные документы (с полем rerank_score) и статистика вызова:
+            candidates, selected, latency_ms, over_budget.
+        """
+        start = time.perf_counter()
+        deadline = start + self.budget_ms / 1000
+
+        if len(candidates) <= 1 or any("embedding" not in doc for doc in candidates):
+            selected = candidates[:top_k]
+            return selected, self._record(start, len(candidates), len(selected), over_budget=False)
+
+        embeddings = self._normalize(np.asarray([doc["embedding"] for doc in candidates], dtype=np.float32))
+        query = self._normalize(np.asarray(query_embedding, dtype=np.float32))
+
+        relevance = (1 - self.lexical_weight) * (embeddings @ query)
+        if self.lexical_weight:
+            relevance += self.lexical_weight * self.lexical_overlap(query_text, candidates)
+
+        # Сходство кандидатов между собой считается одним умножением матриц
+        similarity = embeddings @ embeddings.T
+        max_similarity = np.full(len(candidates), -np.inf, dtype=np.float32)
+        available = np.ones(len(candidates), dtype=bool)
+        order, scores = [], []
+        over_budget = False
+
+        while len(order) < min(top_k, len(candidates)):
+            if time.perf_counter() > deadline:
+                over_budget = True
+                break
+            mmr = np.where(
+                np.isfinite(max_similarity),
+                self.mmr_lambda * relevance - (1 - self.mmr_lambda) * max_similarity,
+                relevance,
+            )
+            best = int(np.argmax(np.where(available, mmr, -np.inf)))
+            order.append(best)
+            scores.append(float(mmr[best]))
+            available[best] = False
+            max_similarity = np.maximum(max_similarity, similarity[best])
+
+        if over_budget:
+            # Бюджет исчерпан: оставшиеся места — по релевантности
+            for index in np.argsort(-relevance):
+                if len(order) >= top_k:
+                    break
+                if available[index]:
+                    order.append(int(index))
+                    scores.append(float(relevance[index]))
+
+        selected = [{**candidates[index], "rerank_score": score} for index, score in zip(order, scores)]
+        return selected, self._record(start, len(candidates), len(selected), over_budget)
+
+    def _record(self, start: float, candidates: int, selected: int, over_budget: bool) -> Dict[str, Any]:
+        latency_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.calls += 1
+            self.total_ms += latency_ms
+            self.max_ms = max(self.max_ms, latency_ms)
+            self.over_budget += over_budget
+        return {"candidates": candidates, "selected": selected, "latency_ms": latency_ms, "over_budget": over_budget}
+
+    def stats(self) -> dict:
+        """Число вызовов, среднее и максимальное время, число превышений бюджета."""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "avg_ms": self.total_ms / self.calls if self.calls else 0.0,
+                "max_ms": self.max_ms,
+                "over_budget": self.over_budget,
+                "budget_ms": self.budget_ms,
+            }
@@ -11,9 +11,9 @@ env_path = Path(__file__).parent.parent / ".env"
 load_dotenv(dotenv_path=env_path)
 
 class SemanticCoverageService:
-    def __init__(self):
+    def __init__(self, embedding_service: YandexEmbeddingService = None):
 
-        self.embedding_service = YandexEmbeddingService()
+        self.embedding_service = embedding_service or YandexEmbeddingService()
 
 
     def _get_embedding(self, text: str) -> List[float]:
@@ -31,35 +31,39 @@ class SemanticCoverageService:
     def calculate(self, context: str, response: str, relevant_docs: List[dict]) -> float:
         """
         Рассчитывает семантическое покрытие ответа:
-        - Усредняет эмбеддинги релевантных документов → context_embedding
+        - Нормирует эмбеддинги релевантных документов и усредняет их → context_embedding
         - Получает эмбеддинг ответа → response_embedding
         - Возвращает косинусное сходство.
+
+        Эмбеддинги документов берутся из поля embedding (сохранены в ClickHouse при индексации);
+        векторизуются заново только документы без него. Через API всегда проходит только ответ.
         """
         if not relevant_docs or not response.strip():
             return 0.0
 
-
         # Собираем эмбеддинги всех релевантных чанков
-        doc_embeddings = []
-        for doc in relevant_docs:
+        doc_embeddings = [doc["embedding"] for doc in relevant_docs if doc.get("embedding")]
+        missing_texts = [doc["text"] for doc in relevant_docs if not doc.get("embedding")]
+        if missing_texts:
             try:
-                emb = self.embedding_service.embed_text(doc["text"])
-                doc_embeddings.append(emb)
-            except:
-                continue
+                doc_embeddings.extend(self.embedding_service.embed_texts(missing_texts))
+            except Exception:
+                pass
 
         if not doc_embeddings:
             return 0.0
 
-        # Усреднённый вектор контекста
-        context_embedding = np.mean(np.array(doc_embeddings), axis=0)
+        # Нормируем все векторы одной операцией и усредняем → вектор контекста
+        doc_matrix = np.asarray(doc_embeddings, dtype=np.float32)
+        doc_matrix /= np.maximum(np.linalg.norm(doc_matrix, axis=1, keepdims=True), 1e-12)
+        context_embedding = doc_matrix.mean(axis=0)
 
         # Эмбеддинг ответа
         try:
             response_embedding = np.array(self.embedding_service.embed_query(response))
-        except:
+        except Exception:
             return 0.0
 
         # Косинусное сходство
         similarity = self._cosine_similarity(context_embedding, response_embedding)
-        return float(similarity)  # от -1 до 1, но обычно ~ от 0 до 1
\ No newline at end of file
+        return float(similarity)  # от -1 до 1, но обычно ~ от 0 до 1
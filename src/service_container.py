@@ -0,0 +1,180 @@
+# src/service_container.py
+# Контейнер сервисов уровня процесса: тяжёлые клиенты создаются один раз
+import threading
+
+from src.answer_cache_service import AnswerCache
+from src.embedding_service import YandexEmbeddingService
+from src.evaluation_service import EvaluationQueue
+from src.http_service import HTTPClient
+from src.llm_service import LLMService
+from src.ocr_service import OCRService
+from src.prompt_service import PromptRegistry
+from src.rag_service import RAGService, create_vector_store
+from src.semantic_coverage_service import SemanticCoverageService
+from src.vector_store import VectorStore
+
+
+class ServiceContainer:
+    """
+    Контейнер сервисов, общий для всех запросов процесса.
+
+    Клиенты ClickHouse, Yandex Cloud ML, YandexGPT и Langfuse создаются лениво при первом
+    обращении (или заранее через warm_up) и дальше переиспользуются узлами графа.
+    Любой сервис можно передать готовым экземпляром — это удобно для тестов и бенчмарков.
+    """
+
+    def __init__(self,
+                 embedding_service: YandexEmbeddingService = None,
+                 vector_store: VectorStore = None,
+                 rag_service: RAGService = None,
+                 semantic_coverage_service: SemanticCoverageService = None,
+                 llm_service: LLMService = None,
+                 ocr_service: OCRService = None,
+                 evaluation_queue: EvaluationQueue = None,
+                 answer_cache: AnswerCache = None,
+                 http_client: HTTPClient = None,
+                 prompt_registry: PromptRegistry = None,
+                 llm_model: str = "yandexgpt-lite"
+                 ):
+        """
+        :param embedding_service: Готовый сервис эмбеддингов (иначе создаётся при первом обращении).
+        :param vector_store: Готовое векторное хранилище (иначе выбирается по VECTOR_STORE_BACKEND).
+        :param rag_service: Готовый RAG-сервис.
+        :param semantic_coverage_service: Готовый сервис оценки покрытия.
+        :param llm_service: Готовый LLM-сервис.
+        :param ocr_service: Готовый OCR-сервис.
+        :param evaluation_queue: Готовая фоновая очередь оценки ответов.
+        :param answer_cache: Готовый семантический кэш ответов.
+        :param http_client: Готовый HTTP-клиент (общий пул соединений OCR и Telegram).
+        :param prompt_registry: Готовый реестр шаблонов промптов.
+        :param llm_model: Модель YandexGPT для LLM-сервиса по умолчанию.
+        """
+        self._lock = threading.RLock()
+        self._services = {
+            "embedding_service": embedding_service,
+            "vector_store": vector_store,
+            "rag_service": rag_service,
+            "semantic_coverage_service": semantic_coverage_service,
+            "llm_service": llm_service,
+            "ocr_service": ocr_service,
+            "evaluation_queue": evaluation_queue,
+            "answer_cache": answer_cache,
+            "http_client": http_client,
+            "prompt_registry": prompt_registry,
+        }
+        self.llm_model = llm_model
+
+    def _get_or_create(self, name: str, factory):
+        """Возвращает сервис по имени, создавая его один раз (потокобезопасно)."""
+        service = self._services.get(name)
+        if service is not None:
+            return service
+
+        with self._lock:
+            if self._services.get(name) is None:
+                self._services[name] = factory()
+            return self._services[name]
+
+    @property
+    def embedding_service(self) -> YandexEmbeddingService:
+        return self._get_or_create("embedding_service", YandexEmbeddingService)
+
+    @property
+    def vector_store(self) -> VectorStore:
+        # ClickHouse или локальный NumPy-индекс — по переменной окружения VECTOR_STORE_BACKEND
+        return self._get_or_create("vector_store", create_vector_store)
+
+    @property
+    def rag_service(self) -> RAGService:
+        return self._get_or_create(
+            "rag_service",
+            lambda: RAGService(embedding_service=self.embedding_service, vector_store=self.vector_store)
+        )
+
+    @property
+    def semantic_coverage_service(self) -> SemanticCoverageService:
+        return self._get_or_create(
+            "semantic_coverage_service",
+            lambda: SemanticCoverageService(embedding_service=self.embedding_service)
+        )
+
+    @property
+    def evaluation_queue(self) -> EvaluationQueue:
+        return self._get_or_create("evaluation_queue", EvaluationQueue)
+
+    @property
+    def llm_service(self) -> LLMService:
+        return self._get_or_create(
+            "llm_service",
+            lambda: LLMService(
+                model=self.llm_model,
+                semantic_coverage_service=self.semantic_coverage_service,
+                evaluation_queue=self.evaluation_queue,
+                prompt_registry=self.prompt_registry
+            )
+        )
+
+    @property
+    def answer_cache(self) -> AnswerCache:
+        return self._get_or_create(
+            "answer_cache",
+            lambda: AnswerCache(corpus_version_provider=self.vector_store.get_corpus_version)
+        )
+
+    @property
+    def http_client(self) -> HTTPClient:
+        # Один пул keep-alive соединений на процесс: OCR и long-polling Telegram
+        return self._get_or_create("http_client", HTTPClient)
+
+    @property
+    def ocr_service(self) -> OCRService:
+        return self._get_or_create("ocr_service", lambda: OCRService(http_client=self.http_client))
+
+    @property
+    def prompt_registry(self) -> PromptRegistry:
+        # Все шаблоны prompts/ разбираются один раз и перечитываются только после правки файла
+        return self._get_or_create("prompt_registry", PromptRegistry)
+
+    def get_prompt_template(self, template_path: str):
+        """Возвращает скомпилированный PromptTemplate для файла шаблона (см. PromptRegistry)."""
+        return self.prompt_registry.get(template_path)
+
+    def warm_up(self, template_paths: tuple = (
+            "prompts/answer_from_documents.txt",
+            "prompts/text_from_image_to_query.txt",
+    )):
+        """Создаёт все сервисы заранее, чтобы первый запрос не платил за инициализацию."""
+        self.rag_service
+        self.llm_service
+        self.ocr_service
+        self.answer_cache
+
+        for template_path in template_paths:
+            self.get_prompt_template(template_path)
+
+        print("🔥 Сервисы инициализированы")
+
+    def shutdown(self):
+        """Дожидается фоновых задач (оценка ответов, телеметрия) перед завершением процесса."""
+        evaluation_queue = self._services.get("evaluation_queue")
+        if evaluation_queue is not None:
+            evaluation_queue.shutdown()
+
+        http_client = self._services.get("http_client")
+        if http_client is not None:
+            http_client.close()
+
+
+_container = None
+_container_lock = threading.Lock()
+
+
+def get_container() -> ServiceContainer:
+    """Возвращает общий для процесса контейнер сервисов."""
+    global _container
+
+    if _container is None:
+        with _container_lock:
+            if _container is None:
+                _container = ServiceContainer()
+    return _container
@@ -0,0 +1,49 @@
+# src/task_loader.py
+# Ленивое чтение задач для индексации: по одной задаче за раз, без загрузки всего корпуса в память
+import csv
+import json
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional
+
+
+def _task(task_id, title: str, url: str, context: str) -> Dict:
+    """Задача в формате, который ожидает RAGService: текст для поиска — заголовок и описание."""
+    return {
+        "id": int(task_id),
+        "title": title,
+        "url": url,
+        "search": f"{title} {context}",
+    }
+
+
+def iter_markdown_tasks(tasks_dir: str = "tasks", metadata: Optional[Iterable[Dict]] = None) -> Iterator[Dict]:
+    """
+    Читает задачи из файлов <id>.md.
+
+    :param tasks_dir: Каталог с файлами задач.
+    :param metadata: Описания задач (id, title, url). Если задано — читаются только эти задачи
+        (для отсутствующих файлов описание пустое), иначе — все *.md из каталога.
+    """
+    if metadata is None:
+        metadata = ({"id": int(path.stem), "title": "", "url": ""} for path in sorted(Path(tasks_dir).glob("*.md")))
+
+    for task in metadata:
+        file_path = Path(tasks_dir) / f"{task['id']}.md"
+        context = file_path.read_text(encoding="utf-8") if file_path.exists() else ""
+        yield _task(task["id"], task.get("title", ""), task.get("url", ""), context)
+
+
+def iter_csv_tasks(path: str) -> Iterator[Dict]:
+    """Читает задачи из CSV-выгрузки с колонками id, title, url, context."""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            yield _task(row["id"], row.get("title", ""), row.get("url", ""), row.get("context", ""))
+
+
+def iter_jsonl_tasks(path: str) -> Iterator[Dict]:
+    """Читает задачи из JSONL-выгрузки: по объекту с полями id, title, url, context на строку."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                yield _task(row["id"], row.get("title", ""), row.get("url", ""), row.get("context", ""))
@@ -0,0 +1,105 @@
+# src/vector_store.py
+# Общий интерфейс векторных хранилищ: ClickHouse и локальный NumPy-индекс взаимозаменяемы
+import hashlib
+import re
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Set
+
+# Режимы свёртки результатов поиска по задачам:
+# "none" — чанки как есть, "best" — лучший чанк задачи, "merge" — лучший чанк вместе с соседними
+COLLAPSE_MODES = ("none", "best", "merge")
+
+# Токены для лексического поиска: буквы и цифры (hasToken в ClickHouse не принимает разделители, в том числе «_»)
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+# Частые слова вопросов, которые совпадают почти с любым чанком
+STOP_WORDS = frozenset({
+    "что", "как", "где", "когда", "какой", "какая", "какие", "какое", "кто", "зачем", "почему",
+    "для", "при", "это", "так", "там", "или", "нужно", "надо", "можно", "есть", "был", "была",
+    "the", "and", "for", "what", "how",
+})
+
+
+def content_hash(text: str) -> str:
+    """Хэш текста чанка: по нему при переиндексации находятся уже посчитанные эмбеддинги."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def make_chunk_id(task_id: int, chunk_index: int) -> str:
+    """Уникальный идентификатор чанка: задача и порядковый номер чанка в ней."""
+    return f"{task_id}:{chunk_index}"
+
+
+def lexical_tokens(query: str, min_length: int = 3, max_tokens: int = 16) -> List[str]:
+    """
+    Токены запроса для лексического поиска: в нижнем регистре, без повторов.
+    Короткие и частые слова (предлоги, союзы, вопросительные) отбрасываются,
+    числа (номера задач, коды ошибок) остаются всегда.
+    """
+    tokens = [
+        token for token in TOKEN_PATTERN.findall(query.lower())
+        if (len(token) >= min_length and token not in STOP_WORDS) or token.isdigit()
+    ]
+    return list(dict.fromkeys(tokens))[:max_tokens]
+
+
+class VectorStore(ABC):
+    """
+    Хранилище чанков с эмбеддингами.
+
+    Чанк — словарь с полями chunk_id, task_id, chunk_index, title, url, text, content_hash, embedding.
+    Результаты поиска — такие же словари с полем score (косинусное расстояние) вместо эмбеддинга
+    (эмбеддинг добавляется при with_embeddings=True).
+    """
+
+    @abstractmethod
+    def add_documents(self, documents: List[Dict]):
+        """Добавляет чанки (уже с готовыми эмбеддингами)."""
+
+    @abstractmethod
+    def replace_documents(self, documents: Iterable[Dict], vector_index: bool = False, block_size: int = 10_000):
+        """
+        Атомарно заменяет содержимое хранилища. documents может быть генератором:
+        чанки записываются блоками по block_size, поиск до подмены видит старую версию.
+        """
+
+    @abstractmethod
+    def get_embeddings_by_hash(self, hashes: List[str], batch_size: int = 1000) -> Dict[str, List[float]]:
+        """Уже сохранённые эмбеддинги чанков по хэшам их текста (для инкрементальной индексации)."""
+
+    def get_unchanged_chunk_ids(self, chunks: List[Dict]) -> Set[str]:
+        """
+        chunk_id чанков, которые уже сохранены в хранилище с тем же текстом, заголовком и ссылкой.
+        replace_documents копирует такие чанки (помеченные unchanged=True, без эмбеддинга) из текущей
+        версии корпуса сам. Реализация по умолчанию ничего не копирует — все чанки передаются целиком.
+        """
+        return set()
+
+    @abstractmethod
+    def get_corpus_version(self) -> str:
+        """Версия корпуса: меняется при любой записи. Используется для сброса кэшей."""
+
+    @abstractmethod
+    def search_similar(self, query_embedding: List[float], limit: int = 2, exact: bool = False,
+                       with_embeddings: bool = False, collapse: str = "none",
+                       neighbours: int = 1, overfetch: int = 5) -> List[Dict]:
+        """Ближайшие по косинусному расстоянию чанки (с возможной свёрткой по задачам)."""
+
+    def search_similar_batch(self, query_embeddings: List[List[float]], limit: int = 2, exact: bool = False,
+                             with_embeddings: bool = False, collapse: str = "none",
+                             neighbours: int = 1, overfetch: int = 5) -> List[List[Dict]]:
+        """
+        Результаты search_similar для нескольких запросов (в порядке query_embeddings).
+        Реализация по умолчанию — по одному поиску на запрос; хранилища переопределяют её пакетной.
+        """
+        return [
+            self.search_similar(query_embedding, limit=limit, exact=exact, with_embeddings=with_embeddings,
+                                collapse=collapse, neighbours=neighbours, overfetch=overfetch)
+            for query_embedding in query_embeddings
+        ]
+
+    @abstractmethod
+    def search_hybrid(self, query_embedding: List[float], query_text: str, limit: int = 2,
+                      exact: bool = False, with_embeddings: bool = False, collapse: str = "none",
+                      neighbours: int = 1, overfetch: int = 5, rrf_k: int = 60) -> List[Dict]:
+        """Векторный и лексический поиск, объединённые reciprocal rank fusion."""